@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark coverage analytics against a per-origin haversine scan
+Times coverage_frame() for every group modality of synthetic registries
+over a large set of origins, and extrapolates the per-origin loop it
+replaces from a small sample.
+
+Run from the project root: python -m benchmarks.bench_coverage
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import synthetic_origins, synthetic_services
+from coverage_analytics import (ALL, DEFAULT_RADIUS_KM, coverage_frame, modality_rows, modality_terms,
+                                state_summary)
+from service_index import ServiceIndex, haversine_km
+
+
+def linear_coverage(index, lat, lon, modalities, radius_km):
+    """Baseline: scan every service of every modality for each origin"""
+    services = [modality_rows(index, modality) for modality in modalities]
+    for olat, olon in zip(lat, lon):
+        distances = haversine_km(olat, olon, index.lat, index.lon)
+        for rows in services:
+            if len(rows):
+                selected = distances[rows]
+                selected.min()
+                (selected <= radius_km).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[185, 10_000, 100_000])
+    parser.add_argument('--origins', type=int, default=1_000_000)
+    parser.add_argument('--baseline-origins', type=int, default=200,
+                        help='origins used for the (slow) linear-scan baseline')
+    parser.add_argument('--radius-km', type=float, default=DEFAULT_RADIUS_KM)
+    args = parser.parse_args()
+
+    lat, lon = synthetic_origins(args.origins)
+    origins = pd.DataFrame({'latitude': lat, 'longitude': lon,
+                            'state': np.where(lon < 129, 'WA', 'Other')})
+
+    print(f"🧭 Coverage benchmark: {args.origins:,} origins, {args.radius_km:g} km radius")
+    print("=" * 92)
+    print(f"{'services':>10} {'modalities':>11} {'coverage':>10} {'summary':>9} "
+          f"{'origin-mod/s':>14} {'linear est.':>12} {'speed-up':>9}")
+    print("-" * 92)
+    for n in args.sizes:
+        index = ServiceIndex(synthetic_services(n))
+        modalities = [ALL] + modality_terms(index, 'group')
+
+        start = time.perf_counter()
+        frame = coverage_frame(index, origins, modalities, args.radius_km)
+        coverage_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        state_summary(frame, modalities, args.radius_km)
+        summary_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        linear_coverage(index, lat[:args.baseline_origins], lon[:args.baseline_origins],
+                        modalities, args.radius_km)
+        linear = (time.perf_counter() - start) / args.baseline_origins * args.origins
+
+        print(f"{n:>10,} {len(modalities):>11} {coverage_seconds:>9.2f}s {summary_seconds:>8.2f}s "
+              f"{args.origins * len(modalities) / coverage_seconds:>14,.0f} {linear:>11.0f}s "
+              f"{linear / coverage_seconds:>8.0f}x")
+    print("-" * 92)
+    print("linear est. extrapolates the per-origin scan from --baseline-origins origins")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hedged provider chain against local stand-in servers
+Starts two mock servers: a Nominatim-style primary with a latency tail
+(a few requests hang for --slow-ms) and occasional 503s, and a Photon-style
+secondary that is slower on average but never hangs. The same addresses
+are geocoded with the primary alone, with the chain as a plain fallback,
+and with hedging, and per-lookup latency percentiles are reported.
+
+Run from the project root: python -m benchmarks.bench_provider_chain
+"""
+
+import argparse
+import time
+import geocoding
+from benchmarks import mock_nominatim
+from benchmarks.synthetic import synthetic_services
+from instrumentation import start_run
+from preprocess import prepare_addresses
+
+
+def register(name, server, geocoder, workers):
+    geocoding.PROVIDERS[name] = {
+        'geocoder': geocoder,
+        'domain': server.domain,
+        'scheme': 'http',
+        'rate_per_sec': 5000.0,
+        'burst': 5000,
+        'max_workers': workers
+    }
+
+
+def run(addresses, providers, hedge_after, workers):
+    """Geocode every address through a chain; returns (seconds, run summary)"""
+    collector = start_run('bench_provider_chain', path=None)
+    chain = geocoding.ProviderChain('integrative-oncology-benchmark', providers, hedge_after=hedge_after)
+    start = time.perf_counter()
+    geocoding.geocode_many(chain, addresses, max_workers=workers)
+    seconds = time.perf_counter() - start
+    chain.close()
+    return seconds, collector.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--addresses', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=32, help='lookups in flight')
+    parser.add_argument('--hedge-ms', type=float, default=250.0)
+    parser.add_argument('--latency-ms', type=float, default=30.0, help='primary mean latency')
+    parser.add_argument('--slow-rate', type=float, default=0.02,
+                        help='fraction of primary requests that hang for --slow-ms')
+    parser.add_argument('--slow-ms', type=float, default=8000.0)
+    parser.add_argument('--error-rate', type=float, default=0.01, help='primary 503 rate')
+    parser.add_argument('--secondary-latency-ms', type=float, default=80.0)
+    args = parser.parse_args()
+
+    primary = mock_nominatim.start_server(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 3,
+                                          slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+                                          error_rate=args.error_rate)
+    secondary = mock_nominatim.start_server(latency_ms=args.secondary_latency_ms,
+                                            jitter_ms=args.secondary_latency_ms / 3, seed=1)
+    register('mock_primary', primary, 'nominatim', args.workers)
+    register('mock_secondary', secondary, 'photon', args.workers)
+
+    df = synthetic_services(args.addresses, geocoded=False)
+    addresses = [f'{i} {address}' for i, address in
+                 enumerate(prepare_addresses(df)['full_address'])]
+
+    scenarios = [
+        ('primary only', ['mock_primary'], args.hedge_ms / 1000),
+        ('fallback chain', ['mock_primary', 'mock_secondary'], None),
+        (f'hedged {args.hedge_ms:g} ms', ['mock_primary', 'mock_secondary'], args.hedge_ms / 1000)
+    ]
+    print(f"🧪 Provider chain benchmark: {len(addresses):,} addresses, {args.workers} in flight")
+    print(f"   Primary: {args.latency_ms:g} ms, {args.slow_rate:.0%} hang {args.slow_ms:g} ms, "
+          f"{args.error_rate:.0%} errors; secondary: {args.secondary_latency_ms:g} ms")
+    rows = []
+    for label, providers, hedge_after in scenarios:
+        seconds, summary = run(addresses, providers, hedge_after, args.workers)
+        rows.append((label, seconds, summary))
+
+    print("=" * 100)
+    print(f"{'scenario':>18} {'wall':>8} {'lookups/s':>10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>9} "
+          f"{'max ms':>9} {'hedged':>7} {'fallback':>9} {'requests':>9}")
+    print("-" * 100)
+    for label, seconds, summary in rows:
+        latency = summary['histograms']['geocode.lookup_ms']
+        counters = summary['counters']
+        print(f"{label:>18} {seconds:>7.1f}s {len(addresses) / seconds:>10.0f} {latency['p50']:>8.1f} "
+              f"{latency['p90']:>8.1f} {latency['p99']:>9.1f} {latency['max']:>9.1f} "
+              f"{counters.get('geocode.hedged', 0):>7,} {counters.get('geocode.fallback', 0):>9,} "
+              f"{counters.get('geocode.requests', 0):>9,}")
+    print("-" * 100)
+    print("Latency is per unique address, from the first request to the accepted answer")
+    primary.shutdown()
+    secondary.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark "nearest by drive time" queries against a local OSRM stand-in
+Starts the mock routing server and answers the same stream of user
+queries (origins clustered around the capital cities, popular places asked
+about many times) four ways: one route request per user/service pair as
+APP_PLAN.md Phase 3 describes, one table request per query without a
+cache, tables through a cold route cache, and the same queries again
+through the cache reopened from disk. A last row routes every distinct
+origin in one batched call. Reports network requests, pairs routed and
+per-query latency.
+
+Run from the project root: python -m benchmarks.bench_routing
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import routing
+from benchmarks import mock_osrm
+from benchmarks.synthetic import CITIES, synthetic_services
+from instrumentation import start_run
+from service_index import ServiceIndex
+
+
+def synthetic_queries(n, places, seed=2, spread_deg=0.3):
+    """
+    n query origins drawn from `places` distinct spots around the capitals
+    Popular spots are asked about far more often (Zipf-like); repeat queries
+    land within a few metres of each other, as from one suburb's users
+    """
+    rng = np.random.default_rng(seed)
+    city = rng.integers(0, len(CITIES), places)
+    centres = np.array([(c[2], c[3]) for c in CITIES])[city]
+    spots = centres + rng.normal(0, spread_deg / 2, (places, 2))
+    weights = 1 / np.arange(1, places + 1)
+    pick = rng.choice(places, n, p=weights / weights.sum())
+    jitter = rng.uniform(-0.0002, 0.0002, (n, 2))
+    return spots[pick, 0] + jitter[:, 0], spots[pick, 1] + jitter[:, 1]
+
+
+def per_route(router, index, lat, lon, k, candidates):
+    """Baseline: rank each query's candidates with one route request per pair"""
+    for olat, olon in zip(lat, lon):
+        sub, _, rows, _, _ = index.nearest_rows(olat, olon, k=candidates)
+        durations = np.array([router.pairs(olat, olon, sub.lat[row], sub.lon[row])[0][0] for row in rows])
+        np.argsort(durations)[:k]
+
+
+def run(server, label, queries, work):
+    """Time work(); returns a result row with the server's request and pair counts"""
+    before = server.stats()
+    latencies = []
+    start = time.perf_counter()
+    results = work(latencies)
+    seconds = time.perf_counter() - start
+    after = server.stats()
+    return {
+        'label': label,
+        'requests': after['requests'] - before['requests'],
+        'pairs': after['pairs'] - before['pairs'],
+        'seconds': seconds,
+        'queries': queries,
+        'p50': np.percentile(latencies, 50) if latencies else None,
+        'p95': np.percentile(latencies, 95) if latencies else None
+    }, results
+
+
+def each_query(router, index, lat, lon, k, candidates):
+    """work() answering the queries one at a time, recording their latencies"""
+    def work(latencies):
+        results = []
+        for olat, olon in zip(lat, lon):
+            start = time.perf_counter()
+            sub, _, rows, _, _, _, _ = routing.nearest_by_time_rows(router, index, olat, olon, k,
+                                                                    candidates=candidates)
+            results.append(sub.df['Name'].to_numpy()[rows].tolist())
+            latencies.append((time.perf_counter() - start) * 1000)
+        return results
+    return work
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--services', type=int, default=10_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--places', type=int, default=400, help='distinct query origins')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--candidates', type=int, default=routing.DEFAULT_CANDIDATES)
+    parser.add_argument('--baseline-queries', type=int, default=50,
+                        help='queries used for the (slow) per-route baseline')
+    mock_osrm.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = mock_osrm.start_server(**mock_osrm.server_config(args))
+    routing.ROUTERS['bench'] = dict(routing.ROUTERS['osrm_local'], url=server.url,
+                                    rate_per_sec=10_000.0, burst=10_000,
+                                    max_coordinates=args.max_coordinates)
+    start_run('bench_routing', path=None)
+    index = ServiceIndex(synthetic_services(args.services))
+    lat, lon = synthetic_queries(args.queries, args.places)
+    cache_path = os.path.join(tempfile.mkdtemp(prefix='route-cache-'), 'route_cache.sqlite')
+
+    print(f"🚗 Routing benchmark: {args.queries:,} queries from {args.places} places, "
+          f"{args.services:,} services, k={args.k} of {args.candidates} candidates")
+    print(f"   mock OSRM: {args.latency_ms:g} ms per table + {args.cell_us:g} µs per pair, "
+          f"tables up to {args.max_coordinates} coordinates")
+    print("=" * 92)
+    print(f"{'strategy':<32} {'requests':>9} {'pairs':>9} {'seconds':>9} "
+          f"{'req/query':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    print("-" * 92)
+
+    def report(row, estimated=False):
+        scale = args.queries / row['queries']
+        requests, seconds = row['requests'] * scale, row['seconds'] * scale
+        p50 = f"{row['p50']:>8.1f}" if row['p50'] is not None else f"{'-':>8}"
+        p95 = f"{row['p95']:>8.1f}" if row['p95'] is not None else f"{'-':>8}"
+        print(f"{row['label']:<32} {requests:>9,.0f} {row['pairs'] * scale:>9,.0f} "
+              f"{seconds:>8.1f}{'*' if estimated else ' '} {requests / args.queries:>10.2f} {p50} {p95}")
+
+    router = routing.Router('bench', cache=None)
+    sample = slice(0, args.baseline_queries)
+    row, _ = run(server, 'route per pair (no cache)', args.baseline_queries,
+                 lambda latencies: per_route(router, index, lat[sample], lon[sample],
+                                             args.k, args.candidates))
+    report(row, estimated=True)
+    row, _ = run(server, 'table per query (no cache)', args.queries,
+                 each_query(router, index, lat, lon, args.k, args.candidates))
+    report(row)
+
+    router = routing.Router('bench', routing.RouteCache(cache_path))
+    row, cold = run(server, 'table per query, cold cache', args.queries,
+                    each_query(router, index, lat, lon, args.k, args.candidates))
+    report(row)
+    router.close()
+
+    router = routing.Router('bench', routing.RouteCache(cache_path))
+    row, warm = run(server, 'same queries, cache from disk', args.queries,
+                    each_query(router, index, lat, lon, args.k, args.candidates))
+    report(row)
+    stats = router.cache.stats()
+    router.close()
+
+    router = routing.Router('bench', routing.RouteCache(os.path.join(os.path.dirname(cache_path),
+                                                                     'batch.sqlite')))
+    places = np.unique(np.column_stack([lat, lon]).round(routing.CELL_DECIMALS), axis=0)
+    row, _ = run(server, f'{len(places)} origins in one batch', args.queries,
+                 lambda latencies: routing.nearest_by_time_rows(router, index, places[:, 0], places[:, 1],
+                                                                args.k, candidates=args.candidates))
+    report(row)
+    router.close()
+    print("-" * 92)
+    print(f"* extrapolated from {args.baseline_queries} queries")
+    same = cold == warm
+    print(f"warm cache: {stats['memory_hits'] + stats['disk_hits']:,} hits, {stats['misses']} misses; "
+          f"rankings {'identical' if same else 'DIFFER'} to the cold run")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
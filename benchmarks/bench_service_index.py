@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark the spatial index against a linear haversine scan
+Run from the project root: python -m benchmarks.bench_service_index
+"""
+
+import argparse
+import time
+import numpy as np
+from benchmarks.synthetic import synthetic_origins, synthetic_services
+from service_index import ServiceIndex, haversine_km
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def linear_nearest(lat, lon, origin_lat, origin_lon):
+    """Baseline: nearest service per origin by scanning every service"""
+    return np.array([
+        np.argmin(haversine_km(olat, olon, lat, lon))
+        for olat, olon in zip(origin_lat, origin_lon)
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[185, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--origins', type=int, default=10_000)
+    parser.add_argument('--baseline-origins', type=int, default=200,
+                        help='origins used for the (slow) linear-scan baseline')
+    args = parser.parse_args()
+
+    origin_lat, origin_lon = synthetic_origins(args.origins)
+
+    print("🗺️  Spatial index benchmark")
+    print("=" * 96)
+    print(f"{'services':>10} {'build':>9} {'kNN k=5':>10} {'radius 10km':>12} "
+          f"{'filtered kNN':>13} {'linear/origin':>14} {'index/origin':>13}")
+    print("-" * 96)
+
+    for n in args.sizes:
+        df = synthetic_services(n)
+        index, build = timed(ServiceIndex, df)
+        _, knn = timed(index.nearest, origin_lat, origin_lon, k=5)
+        _, radius = timed(index.within_radius, origin_lat, origin_lon, 10)
+        _, filtered = timed(index.nearest, origin_lat, origin_lon, k=5,
+                            state=['VIC', 'NSW'], modalities=['yoga'])
+
+        m = args.baseline_origins
+        expected, linear = timed(linear_nearest, index.lat, index.lon, origin_lat[:m], origin_lon[:m])
+        got = index.nearest(origin_lat[:m], origin_lon[:m], k=1)
+        got_rows = got['Name'].str.rsplit(' ', n=1).str[-1].astype(int).to_numpy()
+        assert np.array_equal(index.df['Name'].iloc[expected].str.rsplit(' ', n=1).str[-1]
+                              .astype(int).to_numpy(), got_rows), "index disagrees with linear scan"
+
+        print(f"{n:>10,} {build:>8.3f}s {knn:>9.3f}s {radius:>11.3f}s {filtered:>12.3f}s "
+              f"{linear / m * 1e6:>12.0f}µs {knn / args.origins * 1e6:>12.1f}µs")
+
+    print("-" * 96)
+    print(f"Batch queries use {args.origins:,} origins; per-origin columns compare one "
+          "linear haversine scan with one indexed kNN lookup")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Load test for query_service.py
+Starts the service in its own process (or targets --url), then drives it
+with many concurrent keep-alive connections for a fixed time per scenario
+and reports requests per second, p50/p99 latency and status codes.
+
+Run from the project root: python -m benchmarks.load_test_service
+Use --services N to serve an N-row synthetic registry instead of the real
+one, and --uncached to give every request a distinct origin so the
+response cache cannot answer it.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+import numpy as np
+from benchmarks.synthetic import CITIES, synthetic_origins, synthetic_services
+
+WORK_DIR = '.cache/load_test_service'
+
+SEARCH_QUERIES = ['wellnes centre', 'cancer council', 'onclogy', 'psychology clinic',
+                  'support group', 'flinders', 'redkite', 'canteen', 'yoga', 'hospice']
+
+
+def synthetic_registry(n, work_dir=WORK_DIR):
+    """Path of an n-row synthetic geocoded JSON, generated on first use"""
+    path = os.path.join(work_dir, f'synthetic-{n}.json')
+    if not os.path.exists(path):
+        os.makedirs(work_dir, exist_ok=True)
+        synthetic_services(n).to_json(path, orient='records')
+    return path
+
+
+def scenario_targets(name, n, uncached, seed=0):
+    """n request targets for a scenario; a small repeating set unless uncached"""
+    rng = np.random.default_rng(seed)
+    distinct = n if uncached else 50
+    lat, lon = synthetic_origins(distinct, seed=seed + 1)
+    city = rng.integers(0, len(CITIES), distinct)
+    # Origins near the capitals, where the services are
+    lat = np.array([CITIES[c][2] for c in city]) + (lat - lat.mean()) / 60
+    lon = np.array([CITIES[c][3] for c in city]) + (lon - lon.mean()) / 60
+    states = [CITIES[c][1] for c in city]
+
+    targets = []
+    for i in range(distinct):
+        if name == 'nearest':
+            targets.append(f'/nearest?lat={lat[i]:.5f}&lon={lon[i]:.5f}&k=10')
+        elif name == 'radius':
+            targets.append(f'/radius?lat={lat[i]:.5f}&lon={lon[i]:.5f}&km=5&limit=50')
+        elif name == 'filter':
+            targets.append(f'/filter?state={states[i]}&modality=yoga&limit=50&offset={i % 7}')
+        elif name == 'search':
+            suffix = f'+{i}' if uncached else ''
+            targets.append(f'/search?q={SEARCH_QUERIES[i % len(SEARCH_QUERIES)].replace(" ", "+")}'
+                           f'{suffix}&limit=10')
+    return [targets[i % distinct] for i in range(n)]
+
+
+async def _request(reader, writer, host, target, gzip_ok):
+    writer.write((f'GET {target} HTTP/1.1\r\nHost: {host}\r\n'
+                  + ('Accept-Encoding: gzip\r\n' if gzip_ok else '') + '\r\n').encode('latin-1'))
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    length = 0
+    for line in lines[1:]:
+        if line.lower().startswith('content-length:'):
+            length = int(line.split(':', 1)[1])
+    body = await reader.readexactly(length)
+    return status, len(body)
+
+
+async def run_scenario(host, port, targets, concurrency, duration, gzip_ok=True):
+    """Drive the service for duration seconds; returns (latencies ms, statuses, bytes, elapsed)"""
+    latencies = []
+    statuses = {}
+    received = [0]
+    deadline = time.perf_counter() + duration
+    next_target = [0]
+
+    async def worker():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                target = targets[next_target[0] % len(targets)]
+                next_target[0] += 1
+                start = time.perf_counter()
+                status, size = await _request(reader, writer, host, target, gzip_ok)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+                received[0] += size
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return np.array(latencies), statuses, received[0], time.perf_counter() - start
+
+
+def start_service(json_path, cache_size):
+    """Start query_service.py on a free port; returns (process, host, port)"""
+    command = [sys.executable, 'query_service.py', '--port', '0', '--json', json_path,
+               '--cache-size', str(cache_size)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if 'listening on http://' in line:
+            url = urlsplit(line.strip().rsplit(' ', 1)[-1])
+            return process, url.hostname, url.port
+    raise RuntimeError('query service exited before listening')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='test an already running service instead of starting one')
+    parser.add_argument('--services', type=int, help='serve an N-row synthetic registry')
+    parser.add_argument('--scenarios', nargs='+', default=['nearest', 'radius', 'filter', 'search'])
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per scenario')
+    parser.add_argument('--uncached', action='store_true',
+                        help='distinct request per query, so the response cache never hits')
+    parser.add_argument('--no-gzip', action='store_true')
+    args = parser.parse_args()
+
+    process = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port
+    else:
+        json_path = synthetic_registry(args.services) if args.services else 'data/all_services_geocoded_complete.json'
+        process, host, port = start_service(json_path, 0 if args.uncached else 4096)
+
+    print(f"🔥 Load test: {args.concurrency} connections, {args.duration:g}s per scenario, "
+          f"{'uncached' if args.uncached else 'cache-friendly'} requests"
+          + (f", {args.services:,} synthetic services" if args.services else ""))
+    print("=" * 86)
+    print(f"{'scenario':>10} {'requests':>10} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'KB/req':>7}  statuses")
+    print("-" * 86)
+    try:
+        for name in args.scenarios:
+            targets = scenario_targets(name, 20000, args.uncached)
+            latencies, statuses, received, elapsed = asyncio.run(
+                run_scenario(host, port, targets, args.concurrency, args.duration, not args.no_gzip))
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+            print(f"{name:>10} {len(latencies):>10,} {len(latencies) / elapsed:>9,.0f} "
+                  f"{p50:>8.2f} {p90:>8.2f} {p99:>8.2f} {latencies.max():>8.1f} "
+                  f"{received / len(latencies) / 1024:>7.1f}  "
+                  + ', '.join(f'{s}: {c:,}' for s, c in sorted(statuses.items())))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print("-" * 86)
+    print("Latency is measured at the client, per request, including queueing behind the "
+          "other connections")
+
+
+if __name__ == '__main__':
+    main()
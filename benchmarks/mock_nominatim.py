@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Nominatim geocoding server
+Answers /search?q=...&format=json like Nominatim does (and /api?q=... like
+Photon does), with deterministic coordinates near the capital of the state
+named in the query, so the pipeline can be benchmarked without touching the
+public services. Latency, tail latency, error rate, not-found rate and
+quota (HTTP 429) behaviour are configurable.
+
+Run from the project root: python -m benchmarks.mock_nominatim --port 8080
+then point the pipeline at it with
+GEOCODER_PROVIDER=nominatim_local NOMINATIM_LOCAL_DOMAIN=localhost:8080
+(and PHOTON_DOMAIN=localhost:8081 PHOTON_SCHEME=http for a second mock
+standing in for Photon). The geocode cache keys results by endpoint, so mock
+coordinates never answer lookups against the public providers.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from benchmarks.synthetic import CITIES
+
+# Queries Nominatim cannot resolve in the real registry
+UNRESOLVABLE = ('multiple locations', 'various', 'online', 'statewide')
+
+STATE_CENTRES = {state: (lat, lon) for _, state, lat, lon, _ in CITIES}
+AUSTRALIA_CENTRE = (-25.2744, 133.7751)
+
+
+def _unit_hash(text, salt=''):
+    """Deterministic pseudo-random number in [0, 1) for a string"""
+    digest = hashlib.blake2b((salt + text).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+def mock_feature(query, spread_deg=0.3):
+    """The same place as a Photon GeoJSON feature"""
+    place = mock_place(query, spread_deg)
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [float(place['lon']), float(place['lat'])]},
+        'properties': {'osm_id': place['place_id'], 'type': 'house', 'name': query}
+    }
+
+
+def mock_place(query, spread_deg=0.3):
+    """Nominatim-style place dict for a query (the same query always gives the same point)"""
+    tokens = query.replace(',', ' ').split()
+    centre = next((STATE_CENTRES[t] for t in tokens if t in STATE_CENTRES), AUSTRALIA_CENTRE)
+    lat = centre[0] + (_unit_hash(query, 'lat') - 0.5) * 2 * spread_deg
+    lon = centre[1] + (_unit_hash(query, 'lon') - 0.5) * 2 * spread_deg
+    return {
+        'place_id': int(_unit_hash(query, 'id') * 1e9),
+        'licence': 'Mock data for local benchmarking',
+        'lat': f'{lat:.7f}',
+        'lon': f'{lon:.7f}',
+        'class': 'place',
+        'type': 'house',
+        'importance': 0.5,
+        'display_name': query
+    }
+
+
+class MockNominatimServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the mock's configuration and counters
+    quota_rps limits accepted requests per second (token bucket, excess
+    requests get 429); quota_total rejects everything after that many
+    accepted requests, like an exhausted daily allowance; slow_rate of the
+    requests take slow_ms instead of latency_ms (a latency tail)
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 not_found_rate=0.0, quota_rps=None, quota_total=None, seed=0,
+                 slow_rate=0.0, slow_ms=0.0):
+        super().__init__(address, MockNominatimHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.quota_rps = quota_rps
+        self.quota_total = quota_total
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = float(quota_rps or 0)
+        self.refilled = time.monotonic()
+        self.counts = {'requests': 0, 'ok': 0, 'not_found': 0, 'errors': 0, 'throttled': 0,
+                       'slow': 0}
+
+    @property
+    def domain(self):
+        host, port = self.server_address[:2]
+        return f'{host}:{port}'
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def admit(self):
+        """Apply the quotas; False means the request should get a 429"""
+        with self.lock:
+            self.counts['requests'] += 1
+            if self.quota_total is not None and self.counts['ok'] + self.counts['not_found'] >= self.quota_total:
+                return False
+            if self.quota_rps:
+                now = time.monotonic()
+                self.tokens = min(self.quota_rps, self.tokens + (now - self.refilled) * self.quota_rps)
+                self.refilled = now
+                if self.tokens < 1:
+                    return False
+                self.tokens -= 1
+            return True
+
+    def draw(self):
+        with self.lock:
+            return self.random.random(), self.random.gauss(0, 1), self.random.random()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+class MockNominatimHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # one line per request would dominate the benchmark
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == '/stats':
+            self.send_json(200, server.stats())
+            return
+        photon = url.path == '/api'
+        if url.path not in ('/search', '/search.php', '/api'):
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        if not server.admit():
+            server.count('throttled')
+            self.send_json(429, {'error': 'Too Many Requests'}, {'Retry-After': '1'})
+            return
+
+        roll, noise, tail = server.draw()
+        delay = max(0.0, server.latency_ms + noise * server.jitter_ms) / 1000
+        if tail < server.slow_rate:
+            server.count('slow')
+            delay = server.slow_ms / 1000
+        if delay:
+            time.sleep(delay)
+
+        if roll < server.error_rate:
+            server.count('errors')
+            self.send_json(503, {'error': 'Service Unavailable'})
+            return
+
+        query = parse_qs(url.query).get('q', [''])[0]
+        lowered = query.lower()
+        if (not query or any(term in lowered for term in UNRESOLVABLE)
+                or _unit_hash(query, 'found') < server.not_found_rate):
+            server.count('not_found')
+            self.send_json(200, {'type': 'FeatureCollection', 'features': []} if photon else [])
+            return
+
+        server.count('ok')
+        if photon:
+            self.send_json(200, {'type': 'FeatureCollection', 'features': [mock_feature(query)]})
+        else:
+            self.send_json(200, [mock_place(query)])
+
+
+def start_server(host='127.0.0.1', port=0, **config):
+    """Start the mock in a background thread; port=0 picks a free port"""
+    server = MockNominatimServer((host, port), **config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_arguments(parser):
+    """Mock behaviour options, shared with the pipeline benchmark"""
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='mean response latency')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='latency standard deviation')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with 503')
+    parser.add_argument('--not-found-rate', type=float, default=0.0,
+                        help='fraction of queries that return no match')
+    parser.add_argument('--quota-rps', type=float, default=None,
+                        help='requests per second before answering 429')
+    parser.add_argument('--quota-total', type=int, default=None,
+                        help='total requests served before answering 429')
+    parser.add_argument('--slow-rate', type=float, default=0.0,
+                        help='fraction of requests that take --slow-ms (a latency tail)')
+    parser.add_argument('--slow-ms', type=float, default=0.0, help='latency of the slow requests')
+
+
+def server_config(args):
+    return {
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'error_rate': args.error_rate,
+        'not_found_rate': args.not_found_rate,
+        'quota_rps': args.quota_rps,
+        'quota_total': args.quota_total,
+        'slow_rate': args.slow_rate,
+        'slow_ms': args.slow_ms
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockNominatimServer((args.host, args.port), **server_config(args))
+    print(f"🧪 Mock Nominatim listening on http://{server.domain}/search", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"   {server.stats()}")
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
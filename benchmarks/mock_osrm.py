@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an OSRM routing server
+Answers /table/v1/<profile>/<lon,lat;...>?sources=..&destinations=.. like
+osrm-routed does, with durations and distances derived from the great-circle
+distance (times a detour factor) at a fixed speed per profile, so the
+routing cache can be tested and benchmarked without the public demo server.
+Tasmania is only reachable from Tasmania (null entries, as OSRM returns for
+unroutable pairs). Latency (fixed plus per table cell), table size limit and
+quota (HTTP 429) behaviour are configurable.
+
+Run from the project root: python -m benchmarks.mock_osrm --port 5000
+then point the routing tools at it with
+ROUTING_PROVIDER=osrm_local OSRM_LOCAL_URL=http://localhost:5000
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from service_index import haversine_km
+
+# Average door-to-door speed (km/h) and fixed overhead (s: parking, waiting)
+PROFILE_SPEEDS = {'driving': (40.0, 60.0), 'car': (40.0, 60.0),
+                  'walking': (4.8, 0.0), 'foot': (4.8, 0.0),
+                  'cycling': (15.0, 0.0), 'bike': (15.0, 0.0)}
+DETOUR = 1.3
+BASS_STRAIT_LAT = -39.5
+
+
+def _rows(values, routable):
+    return [[round(float(v), 1) if ok else None for v, ok in zip(row, mask)]
+            for row, mask in zip(values, routable)]
+
+
+def mock_table(lat, lon, sources, destinations, profile):
+    """(durations s, distances m) lists for a table request, None where unroutable"""
+    speed, overhead = PROFILE_SPEEDS[profile]
+    km = haversine_km(lat[sources][:, None], lon[sources][:, None],
+                      lat[destinations][None, :], lon[destinations][None, :]) * DETOUR
+    durations = km / speed * 3600 + np.where(km > 0, overhead, 0.0)
+    island = lat < BASS_STRAIT_LAT
+    routable = island[sources][:, None] == island[destinations][None, :]
+    return _rows(durations, routable), _rows(km * 1000, routable)
+
+
+class MockOSRMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the mock's configuration and counters
+    Each table takes latency_ms plus cell_us per source/destination pair;
+    max_coordinates rejects larger tables (TooBig) and quota_rps answers
+    requests over the rate with 429
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, latency_ms=0.0, cell_us=0.0, max_coordinates=500, quota_rps=None):
+        super().__init__(address, MockOSRMHandler)
+        self.latency_ms = latency_ms
+        self.cell_us = cell_us
+        self.max_coordinates = max_coordinates
+        self.quota_rps = quota_rps
+        self.lock = threading.Lock()
+        self.tokens = float(quota_rps or 0)
+        self.refilled = time.monotonic()
+        self.counts = {'requests': 0, 'ok': 0, 'pairs': 0, 'rejected': 0, 'throttled': 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def admit(self):
+        """Apply the quota; False means the request should get a 429"""
+        with self.lock:
+            self.counts['requests'] += 1
+            if self.quota_rps:
+                now = time.monotonic()
+                self.tokens = min(self.quota_rps, self.tokens + (now - self.refilled) * self.quota_rps)
+                self.refilled = now
+                if self.tokens < 1:
+                    return False
+                self.tokens -= 1
+            return True
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+class MockOSRMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # one line per request would dominate the benchmark
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reject(self, status, code, message):
+        self.server.count('rejected')
+        self.send_json(status, {'code': code, 'message': message})
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        if url.path == '/stats':
+            self.send_json(200, server.stats())
+            return
+        parts = url.path.split('/')
+        if len(parts) != 5 or parts[1] != 'table' or parts[2] != 'v1':
+            self.reject(400, 'InvalidUrl', 'URL string malformed')
+            return
+        profile = parts[3]
+        if profile not in PROFILE_SPEEDS:
+            self.reject(400, 'InvalidService', f'unknown profile {profile}')
+            return
+        try:
+            coords = np.array([[float(v) for v in pair.split(',')] for pair in parts[4].split(';')])
+            params = parse_qs(url.query)
+            everything = list(range(len(coords)))
+            sources = [int(i) for i in params['sources'][0].split(';')] if 'sources' in params else everything
+            destinations = ([int(i) for i in params['destinations'][0].split(';')]
+                            if 'destinations' in params else everything)
+        except (ValueError, IndexError):
+            self.reject(400, 'InvalidQuery', 'Query string malformed')
+            return
+        if len(coords) > server.max_coordinates:
+            self.reject(400, 'TooBig', 'Too many table coordinates')
+            return
+        if max(sources + destinations) >= len(coords):
+            self.reject(400, 'InvalidQuery', 'Index out of range')
+            return
+
+        if not server.admit():
+            server.count('throttled')
+            self.send_json(429, {'code': 'TooManyRequests', 'message': 'Too Many Requests'})
+            return
+
+        pairs = len(sources) * len(destinations)
+        delay = server.latency_ms / 1000 + pairs * server.cell_us / 1e6
+        if delay:
+            time.sleep(delay)
+        durations, distances = mock_table(coords[:, 1], coords[:, 0], np.array(sources),
+                                          np.array(destinations), profile)
+        server.count('ok')
+        server.count('pairs', pairs)
+        annotations = params.get('annotations', ['duration'])[0].split(',')
+        payload = {'code': 'Ok', 'durations': durations}
+        if 'distance' in annotations:
+            payload['distances'] = distances
+        self.send_json(200, payload)
+
+
+def start_server(host='127.0.0.1', port=0, **config):
+    """Start the mock in a background thread; port=0 picks a free port"""
+    server = MockOSRMServer((host, port), **config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_arguments(parser):
+    """Mock behaviour options, shared with the routing benchmark"""
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='fixed latency per table')
+    parser.add_argument('--cell-us', type=float, default=2.0,
+                        help='extra latency per source/destination pair')
+    parser.add_argument('--max-coordinates', type=int, default=500, help='table size limit')
+    parser.add_argument('--quota-rps', type=float, default=None,
+                        help='requests per second before answering 429')
+
+
+def server_config(args):
+    return {
+        'latency_ms': args.latency_ms,
+        'cell_us': args.cell_us,
+        'max_coordinates': args.max_coordinates,
+        'quota_rps': args.quota_rps
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockOSRMServer((args.host, args.port), **server_config(args))
+    print(f"🧪 Mock OSRM listening on {server.url}/table/v1/driving/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"   {server.stats()}")
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
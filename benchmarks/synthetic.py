@@ -0,0 +1,77 @@
+"""
+Synthetic registry generator for benchmarks
+Produces frames with the same columns as the geocoded registry, scattered
+around the seven capital cities, at any size
+"""
+
+import numpy as np
+import pandas as pd
+
+# (City_Sheet, State, latitude, longitude, first postcode of metro area)
+CITIES = [
+    ('Adelaid_clean', 'SA', -34.9285, 138.6007, 5000),
+    ('Hobart_clean', 'TAS', -42.8821, 147.3272, 7000),
+    ('Melbourne_clean', 'VIC', -37.8136, 144.9631, 3000),
+    ('Sydney_clean', 'NSW', -33.8688, 151.2093, 2000),
+    ('Brisbane_clean', 'QLD', -27.4698, 153.0251, 4000),
+    ('Perth_clean', 'WA', -31.9505, 115.8605, 6000),
+    ('Darwin_clean', 'NT', -12.4634, 130.8456, 800),
+]
+
+PROVIDER_TYPES = ['NGO/Charity', 'Public Hospital', 'NGO', 'University', 'Government/NGO']
+FACILITY_TYPES = ['Hospital', 'Support Centre', 'Community Centre', 'Clinic', 'Youth Service']
+GROUP_TERMS = ['support_group', 'education', 'yoga', 'meditation', 'exercise', 'art_therapy']
+INDIVIDUAL_TERMS = ['psychology', 'massage', 'acupuncture', 'counselling', 'care_coordination']
+ASSOCIATED_TERMS = ['social_work', 'spiritual_care', 'dietetics', 'allied_health']
+STREETS = ['King William Road', 'Port Road', 'Greenhill Road', 'George Street', 'Collins Street']
+
+
+def _join_terms(rng, terms, n):
+    """Random semicolon-joined subsets of a vocabulary, one per row"""
+    bits = rng.random((n, len(terms))) < 0.35
+    vocab = np.array(terms, dtype=object)
+    return ['; '.join(vocab[row]) for row in bits]
+
+
+def synthetic_services(n, seed=0, geocoded=True, spread_deg=0.4):
+    """Generate n synthetic services; geocoded=False leaves coordinates empty"""
+    rng = np.random.default_rng(seed)
+    city = rng.integers(0, len(CITIES), n)
+    sheets = np.array([c[0] for c in CITIES], dtype=object)
+    states = np.array([c[1] for c in CITIES], dtype=object)
+    lats = np.array([c[2] for c in CITIES])
+    lons = np.array([c[3] for c in CITIES])
+    postcodes = np.array([c[4] for c in CITIES])
+
+    df = pd.DataFrame({
+        'Name': [f'Synthetic Service {i}' for i in range(n)],
+        'Organization': [f'Organisation {i % 997}' for i in range(n)],
+        'Provider Type': np.array(PROVIDER_TYPES, dtype=object)[rng.integers(0, len(PROVIDER_TYPES), n)],
+        'Facility Type': np.array(FACILITY_TYPES, dtype=object)[rng.integers(0, len(FACILITY_TYPES), n)],
+        'Address': [f'{number} {STREETS[number % len(STREETS)]}'
+                    for number in rng.integers(1, 500, n)],
+        'Suburb': [f'Suburb {i % 211}' for i in range(n)],
+        'Postcode': postcodes[city] + rng.integers(0, 200, n),
+        'Phone': '08 0000 0000',
+        'Website': 'https://example.org/',
+        'group_services_standardized': _join_terms(rng, GROUP_TERMS, n),
+        'individual_services_standardized': _join_terms(rng, INDIVIDUAL_TERMS, n),
+        'associated_services_standardized': _join_terms(rng, ASSOCIATED_TERMS, n),
+        'Verification Notes (as of Oct 2025)': 'Synthetic record for benchmarking.',
+        'City_Sheet': sheets[city],
+        'State': states[city],
+    })
+
+    if geocoded:
+        df['latitude'] = lats[city] + rng.normal(0, spread_deg, n)
+        df['longitude'] = lons[city] + rng.normal(0, spread_deg, n)
+        df['geocode_accuracy'] = 'high'
+        df['geocode_source'] = 'Synthetic'
+        df['geocode_display_name'] = df['Address'] + ', ' + df['Suburb']
+    return df
+
+
+def synthetic_origins(n, seed=1):
+    """Random origin points across the Australian mainland bounding box"""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-39.0, -11.0, n), rng.uniform(113.0, 154.0, n)
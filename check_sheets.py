@@ -1,11 +1,11 @@
-import pandas as pd
+from ingest import WORKBOOK_PATH, load_registry
 
-xl = pd.ExcelFile('Data_final_cleaned.xlsx')
-print('Sheet names:', xl.sheet_names)
+df_all, sheet_names, _ = load_registry(WORKBOOK_PATH)
+print('Sheet names:', sheet_names)
 print('\nRecords per sheet:')
 total = 0
-for sheet in xl.sheet_names:
-    df = pd.read_excel('Data_final_cleaned.xlsx', sheet_name=sheet)
+for sheet in sheet_names:
+    df = df_all[df_all['City_Sheet'] == sheet]
     print(f'  {sheet}: {len(df)} records')
     if len(df) > 0:
         print(f'    Sample suburbs: {list(df["Suburb"].unique()[:3]) if "Suburb" in df.columns else "N/A"}')
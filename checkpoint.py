@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Checkpoint journal for long geocoding runs
+Appends one JSON line per completed row, keyed by a fingerprint of the row's
+address fields, so an interrupted run can be resumed without redoing work.
+The same fingerprints are stored with the geocoded output, so an
+incremental run can diff a new workbook against the previous snapshot and
+geocode only the rows that were added or edited.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+FINGERPRINT_FIELDS = ['Address', 'Suburb', 'Postcode', 'State']
+FINGERPRINT_COLUMN = 'row_fingerprint'
+# geocode_accuracy as the online lookup left it, before the gazetteer fallback
+ONLINE_STATUS_COLUMN = 'geocode_online_status'
+# Identifies "the same service" across workbook versions, to tell an edited
+# row from an added one
+IDENTITY_FIELDS = ['City_Sheet', 'Name']
+# Outcomes that are not final: transient provider errors and lookups skipped
+# offline. They are neither journaled nor carried forward, so they are retried
+RETRY_ACCURACIES = ('error', 'offline')
+
+
+def _fingerprint_value(value):
+    """Normalize one field value for fingerprinting"""
+    if pd.isna(value):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().lower()
+
+
+def _hash_key(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def row_fingerprint(row, fields=FINGERPRINT_FIELDS):
+    """Stable hash of the fields that determine a row's geocode"""
+    return _hash_key('\x1f'.join(_fingerprint_value(row.get(field)) for field in fields))
+
+
+def frame_fingerprints(df, fields=FINGERPRINT_FIELDS):
+    """row_fingerprint() for every row of a frame, built column-wise"""
+    keys = None
+    for field in fields:
+        column = (df[field] if field in df.columns else pd.Series(None, index=df.index))
+        column = column.astype(object).map(_fingerprint_value).to_numpy(dtype=object)
+        keys = column if keys is None else keys + '\x1f' + column
+    return pd.Series([_hash_key(key) for key in keys], index=df.index)
+
+
+class CheckpointJournal:
+    """
+    Append-only JSONL journal of completed geocoding results
+    Each line is {"fingerprint": ..., "address": ..., "result": {...}};
+    results with a RETRY_ACCURACIES outcome are not recorded (or restored
+    from journals written before they were skipped)
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.completed = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if resume and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-write can leave a truncated final line
+                        continue
+                    if entry['result'].get('geocode_accuracy') in RETRY_ACCURACIES:
+                        continue
+                    self.completed[entry['fingerprint']] = entry['result']
+
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.completed
+
+    def get(self, fingerprint):
+        return self.completed.get(fingerprint)
+
+    def record(self, fingerprint, address, result):
+        """
+        Append a completed row and flush it to disk immediately
+        Only rows restored from an earlier run are held in memory, so the
+        journal does not grow with the rows a run geocodes itself
+        """
+        if result['geocode_accuracy'] in RETRY_ACCURACIES:
+            return
+        self.file.write(json.dumps({
+            'fingerprint': fingerprint,
+            'address': address,
+            'result': result
+        }, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class PreviousSnapshot:
+    """
+    Geocode results from an earlier run's output, keyed by row fingerprint
+    Incremental runs carry these forward for rows whose address fields are
+    unchanged. Which rows are carried is decided by their online status
+    (ONLINE_STATUS_COLUMN): misses every provider agreed on are carried as
+    plain failures, even when the gazetteer filled them (the fallback
+    re-resolves them offline), and transient errors not at all, so those
+    rows are looked up again. Gazetteer fills in outputs written without
+    the online status are looked up again too.
+    """
+
+    CARRY_SKIP = RETRY_ACCURACIES
+
+    def __init__(self, df, result_columns):
+        fingerprints = (df[FINGERPRINT_COLUMN].astype(str) if FINGERPRINT_COLUMN in df.columns
+                        else frame_fingerprints(df))
+        gazetteer = (df['geocode_source'] == 'Gazetteer').to_numpy()
+        if ONLINE_STATUS_COLUMN in df.columns:
+            keep = ~df[ONLINE_STATUS_COLUMN].isin(self.CARRY_SKIP).to_numpy()
+        else:
+            keep = ~df['geocode_accuracy'].isin(self.CARRY_SKIP).to_numpy() & ~gazetteer
+        # Every previous row counts as known, including those not carried forward
+        self.fingerprints = set(fingerprints)
+        self.results = {}
+        columns = {key: df[column].astype(object).where(df[column].notna(), None).to_numpy()
+                   for column, key in result_columns.items()}
+        for i in np.flatnonzero(keep):
+            if gazetteer[i]:
+                result = {key: None for key in columns}
+                result['geocode_accuracy'] = 'failed'
+                result['geocode_source'] = 'Nominatim'
+            else:
+                result = {key: values[i] for key, values in columns.items()}
+            self.results.setdefault(fingerprints.iat[i], result)
+        self.identities = dict(zip(_identity_keys(df), fingerprints))
+        self.seen = set()
+
+    @classmethod
+    def load(cls, path, result_columns):
+        """Read only the needed columns of a previous CSV output; None if there is none"""
+        if not os.path.exists(path):
+            return None
+        wanted = set([FINGERPRINT_COLUMN, ONLINE_STATUS_COLUMN] + FINGERPRINT_FIELDS + IDENTITY_FIELDS
+                     + list(result_columns))
+        df = pd.read_csv(path, usecols=lambda column: column in wanted, dtype={FINGERPRINT_COLUMN: str})
+        return cls(df, result_columns)
+
+    def __len__(self):
+        return len(self.identities)
+
+    def get(self, fingerprint):
+        result = self.results.get(fingerprint)
+        return None if result is None else dict(result)
+
+    def classify(self, df, fingerprints):
+        """
+        Count a frame's rows as unchanged (fingerprint seen before), changed
+        (same service, edited address) or added
+        """
+        known = pd.Series(fingerprints, index=df.index).isin(self.fingerprints).to_numpy()
+        identities = _identity_keys(df)
+        self.seen.update(identities)
+        existing = np.array([identity in self.identities for identity in identities], dtype=bool)
+        return {
+            'unchanged': int(known.sum()),
+            'changed': int((~known & existing).sum()),
+            'added': int((~known & ~existing).sum())
+        }
+
+    @property
+    def removed(self):
+        """Services in the snapshot not seen in any classified frame so far"""
+        return len(self.identities.keys() - self.seen)
+
+
+def _identity_keys(df):
+    keys = None
+    for field in IDENTITY_FIELDS:
+        column = (df[field] if field in df.columns else pd.Series(None, index=df.index))
+        column = column.astype(object).map(_fingerprint_value).to_numpy(dtype=object)
+        keys = column if keys is None else keys + '\x1f' + column
+    return keys.tolist()
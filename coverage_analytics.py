@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Accessibility and coverage analytics over origin points
+For a set of origins (an equal-area grid over the states, the gazetteer's
+postcode centroids, or any latitude/longitude table) computes, per
+modality, the distance to the nearest service offering it and how many such
+services lie within a radius. Origins are processed in blocks against one
+k-d tree per modality, so millions of origins take seconds to minutes.
+
+From the per-origin results come coverage gaps (origins beyond the radius),
+per-state summaries (share of origins covered, median and 90th percentile
+distance, uncovered area for grid origins) and per-service catchments (the
+origins for which a service is the nearest).
+
+Modalities are standardized terms ('yoga', 'group:yoga'); 'yoga|support_group'
+matches services offering either, and 'all' means every service.
+
+Run with: python coverage_analytics.py [--grid-km 10 | --postcodes | --origins FILE]
+          [--radius-km 20] [--modalities 'yoga|support_group' ...]
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from gazetteer import GAZETTEER_PATH, Gazetteer
+from geocode_validator import load_boundaries, points_in_rings
+from modality_index import MODALITY_PREFIXES
+from service_index import DEFAULT_JSON, EARTH_RADIUS_KM, ServiceIndex, chord_to_km, km_to_chord, to_unit_vectors
+
+ALL = 'all'
+DEFAULT_RADIUS_KM = 20.0
+GRID_KM = 10.0
+
+# Default modalities: the terms of group_services_standardized
+DEFAULT_PREFIX = MODALITY_PREFIXES['group_services_standardized']
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+# Origins per block; bounds the temporary unit-vector and result arrays
+BLOCK_ORIGINS = 1 << 16
+
+# Modalities offered by at most this many services are answered with one
+# matrix product of origin and service unit vectors instead of a k-d tree;
+# most standardized terms are offered by only a handful of services
+BRUTE_FORCE_SERVICES = 128
+
+
+def assign_states(lat, lon, boundaries=None):
+    """
+    State of each point from the state outlines ('' outside all of them)
+    Smaller outlines are tested first, so an enclave such as the ACT wins
+    over the state around it
+    """
+    boundaries = boundaries if boundaries is not None else load_boundaries()
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    rings = [(name, ring) for name, state_rings in boundaries.items() for ring in state_rings]
+    rings.sort(key=lambda item: np.ptp(item[1][:, 0]) * np.ptp(item[1][:, 1]))
+
+    states = np.full(len(lat), '', dtype=object)
+    for name, ring in rings:
+        candidates = np.flatnonzero(
+            (states == '')
+            & (lon >= ring[:, 0].min()) & (lon <= ring[:, 0].max())
+            & (lat >= ring[:, 1].min()) & (lat <= ring[:, 1].max()))
+        inside = points_in_rings(lat[candidates], lon[candidates], [ring])
+        states[candidates[inside]] = name
+    return states
+
+
+def grid_origins(step_km=GRID_KM, boundaries=None):
+    """
+    Equal-area lattice of origins inside the state outlines, step_km apart
+    Longitude spacing widens towards the equator so every origin stands for
+    about step_km² (area_km2), and shares of origins are shares of area
+    """
+    boundaries = boundaries if boundaries is not None else load_boundaries()
+    coords = np.concatenate([ring for state_rings in boundaries.values() for ring in state_rings])
+    step_lat = step_km / KM_PER_DEGREE
+    lat_rows = np.arange(coords[:, 1].min() + step_lat / 2, coords[:, 1].max(), step_lat)
+
+    lat_parts, lon_parts = [], []
+    for lat in lat_rows:
+        step_lon = step_lat / np.cos(np.radians(lat))
+        lons = np.arange(coords[:, 0].min() + step_lon / 2, coords[:, 0].max(), step_lon)
+        lat_parts.append(np.full(len(lons), lat))
+        lon_parts.append(lons)
+    lat = np.concatenate(lat_parts)
+    lon = np.concatenate(lon_parts)
+
+    states = assign_states(lat, lon, boundaries)
+    inside = states != ''
+    return pd.DataFrame({
+        'latitude': lat[inside],
+        'longitude': lon[inside],
+        'state': states[inside],
+        'area_km2': float(step_km) ** 2
+    })
+
+
+def postcode_origins(path=GAZETTEER_PATH):
+    """One origin per gazetteer postcode centroid, with its suburb and state"""
+    table = Gazetteer.load(path).table
+    table = table[table['postcode'] != ''].drop_duplicates('postcode')
+    return pd.DataFrame({
+        'postcode': table['postcode'].to_numpy(),
+        'suburb': table['suburb'].to_numpy(),
+        'state': table['state'].to_numpy(),
+        'latitude': table['latitude'].to_numpy(dtype=np.float64),
+        'longitude': table['longitude'].to_numpy(dtype=np.float64)
+    }).sort_values('postcode', ignore_index=True)
+
+
+def load_origins(path, boundaries=None):
+    """Origins from a CSV or Parquet file with latitude/longitude columns"""
+    df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    df = df[df['latitude'].notna() & df['longitude'].notna()].reset_index(drop=True)
+    if 'state' not in df.columns:
+        df['state'] = assign_states(df['latitude'], df['longitude'], boundaries)
+    return df
+
+
+def modality_terms(index, prefix=None):
+    """
+    Bare standardized terms offered by at least one service, most common first
+    prefix ('group', 'individual', 'associated') limits the terms to one
+    modality column; the bare terms still match the term in any column
+    """
+    terms = {key.split(':', 1)[1] for key in index.modalities.vocabulary
+             if prefix is None or key.startswith(f'{prefix}:')}
+    counts = {term: int(index.modalities.match_any([term]).sum()) for term in terms}
+    return sorted(counts, key=lambda term: (-counts[term], term))
+
+
+def modality_rows(index, modality):
+    """Positions in index.df of the services a modality spec matches"""
+    if modality == ALL:
+        return np.arange(len(index))
+    return np.flatnonzero(index.modalities.match_any(modality.split('|')))
+
+
+def _brute_force(origins, services, min_dot):
+    """Nearest-service chord, position and count of services with dot >= min_dot"""
+    dots = origins @ services.T
+    nearest = dots.argmax(axis=1)
+    best = np.take_along_axis(dots, nearest[:, None], axis=1)[:, 0]
+    return np.sqrt(np.maximum(2 - 2 * best, 0)), nearest, (dots >= min_dot).sum(axis=1)
+
+
+def nearest_by_modality(index, lat, lon, modalities, radius_km=DEFAULT_RADIUS_KM,
+                        block=BLOCK_ORIGINS, workers=-1):
+    """
+    Nearest service and services within radius_km, per modality, per origin
+    Returns {modality: (distance_km, row, within)} arrays: float32 km to the
+    nearest matching service (inf if none offers it), int32 position of
+    that service in index.df (-1 if none) and int32 count within radius_km.
+    workers is passed to the k-d tree queries (-1 uses every core).
+    """
+    lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+    lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+    vectors = to_unit_vectors(index.lat, index.lon)
+    chord = km_to_chord(radius_km)
+    min_dot = 1 - chord ** 2 / 2  # chord <= radius as a dot product of unit vectors
+
+    # Modalities that match the same services share one search
+    searches = {}
+    plan = {}
+    for modality in modalities:
+        rows = modality_rows(index, modality)
+        key = rows.tobytes()
+        if key not in searches:
+            if len(rows) > BRUTE_FORCE_SERVICES:
+                # Services cluster in the cities while most origins are far
+                # from all of them; uncompacted sliding-midpoint nodes answer
+                # those far queries several times faster
+                tree = cKDTree(vectors[rows], balanced_tree=False, compact_nodes=False)
+                searches[key] = (rows, tree, None)
+            else:
+                searches[key] = (rows, None, vectors[rows])
+        plan[modality] = key
+
+    found = {key: (np.full(len(lat), np.inf, dtype=np.float32),
+                   np.full(len(lat), -1, dtype=np.int32),
+                   np.zeros(len(lat), dtype=np.int32)) for key in searches}
+    for start in range(0, len(lat), block):
+        stop = min(start + block, len(lat))
+        origins = to_unit_vectors(lat[start:stop], lon[start:stop])
+        for key, (rows, tree, services) in searches.items():
+            if not len(rows):
+                continue
+            if tree is not None:
+                chords, nearest = tree.query(origins, k=1, workers=workers)
+                within = tree.query_ball_point(origins, chord, workers=workers, return_length=True)
+            else:
+                chords, nearest, within = _brute_force(origins, services, min_dot)
+            distance, row, count = found[key]
+            distance[start:stop] = chord_to_km(chords)
+            row[start:stop] = rows[nearest]
+            count[start:stop] = within
+    return {modality: found[key] for modality, key in plan.items()}
+
+
+def coverage_frame(index, origins, modalities=None, radius_km=DEFAULT_RADIUS_KM,
+                   block=BLOCK_ORIGINS, workers=-1):
+    """
+    Per-origin coverage, one set of columns per modality
+    Returns a copy of origins with <modality>_km, <modality>_service
+    (position in index.df, -1 for none) and <modality>_within columns.
+    modalities defaults to 'all' plus the group program terms.
+    """
+    modalities = list(modalities) if modalities else [ALL] + modality_terms(index, DEFAULT_PREFIX)
+    results = nearest_by_modality(index, origins['latitude'].to_numpy(), origins['longitude'].to_numpy(),
+                                  modalities, radius_km, block=block, workers=workers)
+    columns = {}
+    for modality, (distance, row, within) in results.items():
+        columns[f'{modality}_km'] = distance
+        columns[f'{modality}_service'] = row
+        columns[f'{modality}_within'] = within
+    return pd.concat([origins.reset_index(drop=True), pd.DataFrame(columns)], axis=1)
+
+
+def frame_modalities(frame):
+    """Modalities present in a coverage_frame(), in column order"""
+    return [column[:-len('_km')] for column in frame.columns
+            if column.endswith('_km') and f"{column[:-len('_km')]}_within" in frame.columns]
+
+
+def coverage_gaps(frame, modality=ALL, radius_km=DEFAULT_RADIUS_KM):
+    """Origins farther than radius_km from any service of a modality, farthest first"""
+    gaps = frame[frame[f'{modality}_km'] > radius_km]
+    return gaps.sort_values(f'{modality}_km', ascending=False, kind='stable')
+
+
+def state_summary(frame, modalities=None, radius_km=DEFAULT_RADIUS_KM):
+    """
+    Coverage per state and modality, plus an 'Australia' row per modality
+    Long format: state, modality, origins, covered (within radius_km),
+    covered_pct, median_km, p90_km, mean_within and, for grid origins,
+    gap_area_km2
+    """
+    modalities = modalities or frame_modalities(frame)
+    states = frame['state'].fillna('').astype(str).replace('', 'Unknown')
+    groups = [(state, np.flatnonzero((states == state).to_numpy())) for state in sorted(states.unique())]
+    groups.append(('Australia', np.arange(len(frame))))
+
+    rows = []
+    for modality in modalities:
+        distance = frame[f'{modality}_km'].to_numpy(dtype=np.float64)
+        within = frame[f'{modality}_within'].to_numpy()
+        covered = distance <= radius_km
+        for state, positions in groups:
+            if not len(positions):
+                continue
+            state_distance = distance[positions]
+            median, p90 = np.percentile(state_distance, [50, 90])
+            row = {
+                'state': state,
+                'modality': modality,
+                'origins': len(positions),
+                'covered': int(covered[positions].sum()),
+                'covered_pct': 100.0 * covered[positions].mean(),
+                'median_km': median,
+                'p90_km': p90,
+                'mean_within': within[positions].mean()
+            }
+            if 'area_km2' in frame.columns:
+                row['gap_area_km2'] = float(frame['area_km2'].to_numpy()[positions][~covered[positions]].sum())
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def service_catchments(frame, index, modality=ALL):
+    """
+    Origins for which each service is the nearest of a modality
+    Returns index.df's identifying columns with origins (and area_km2 for
+    grid origins) and median_km to those origins, most origins first
+    """
+    nearest = frame[f'{modality}_service'].to_numpy()
+    assigned = nearest >= 0
+    counts = np.bincount(nearest[assigned], minlength=len(index))
+    result = index.df[['Name', 'Suburb', 'City_Sheet', 'State']].copy()
+    result['origins'] = counts
+    if 'area_km2' in frame.columns:
+        result['area_km2'] = np.bincount(nearest[assigned], weights=frame['area_km2'].to_numpy()[assigned],
+                                         minlength=len(index))
+    medians = (pd.Series(frame[f'{modality}_km'].to_numpy()[assigned]).groupby(nearest[assigned]).median())
+    result['median_km'] = medians.reindex(np.arange(len(index))).to_numpy()
+    result = result[result['origins'] > 0]
+    return result.sort_values('origins', ascending=False, kind='stable')
+
+
+def print_summary(summary, radius_km):
+    """Covered share of origins per modality (rows) and state (columns)"""
+    table = summary.pivot(index='modality', columns='state', values='covered_pct')
+    states = [state for state in table.columns if state != 'Australia'] + ['Australia']
+    table = table.reindex(index=list(dict.fromkeys(summary['modality'])), columns=states)
+    width = max(12, max(len(m) for m in table.index) + 1)
+    print(f"\n% of origins within {radius_km:g} km")
+    print(f"{'modality':<{width}}" + ''.join(f"{state:>10}" for state in states))
+    print("-" * (width + 10 * len(states)))
+    for modality, values in table.iterrows():
+        print(f"{modality:<{width}}" + ''.join(f"{value:>10.1f}" if pd.notna(value) else f"{'-':>10}"
+                                               for value in values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--grid-km', type=float, default=GRID_KM,
+                        help='equal-area grid of origins this far apart (default)')
+    source.add_argument('--postcodes', action='store_true', help='gazetteer postcode centroids as origins')
+    source.add_argument('--origins', help='CSV or Parquet of origins with latitude/longitude columns')
+    parser.add_argument('--radius-km', type=float, default=DEFAULT_RADIUS_KM)
+    parser.add_argument('--modalities', nargs='+',
+                        help="modalities to analyse, e.g. yoga 'yoga|support_group' "
+                             "(default: all services and each group program term)")
+    parser.add_argument('--all-terms', action='store_true',
+                        help='analyse every standardized term (one result column set each)')
+    parser.add_argument('--json', default=DEFAULT_JSON, help='geocoded services')
+    parser.add_argument('--summary-csv', help='write the per-state summary here')
+    parser.add_argument('--gaps-csv', help='write origins outside the radius of any listed modality here')
+    parser.add_argument('--limit', type=int, default=20, help='gaps and catchments to print')
+    args = parser.parse_args()
+
+    index = ServiceIndex.from_json(args.json)
+    if args.postcodes:
+        origins, label = postcode_origins(), 'postcode centroids'
+    elif args.origins:
+        origins, label = load_origins(args.origins), os.path.basename(args.origins)
+    else:
+        origins, label = grid_origins(args.grid_km), f'{args.grid_km:g} km grid origins'
+    print(f"🧭 Coverage of {len(index)} services from {len(origins):,} {label}")
+
+    start = time.perf_counter()
+    modalities = args.modalities or ([ALL] + modality_terms(index) if args.all_terms else None)
+    frame = coverage_frame(index, origins, modalities, args.radius_km)
+    modalities = frame_modalities(frame)
+    seconds = time.perf_counter() - start
+    print(f"   {len(modalities)} modalities in {seconds:.2f}s "
+          f"({len(origins) * len(modalities) / max(seconds, 1e-9):,.0f} origin-modalities/s)")
+
+    summary = state_summary(frame, modalities, args.radius_km)
+    print_summary(summary, args.radius_km)
+
+    first = modalities[0]
+    gaps = coverage_gaps(frame, first, args.radius_km)
+    print(f"\n🕳️  {len(gaps):,} origins more than {args.radius_km:g} km from {first}")
+    label_columns = [column for column in ('postcode', 'suburb', 'state') if column in gaps.columns]
+    for _, row in gaps.head(args.limit).iterrows():
+        place = ' '.join(str(row[column]) for column in label_columns)
+        print(f"   {row[f'{first}_km']:8.1f} km  {place} ({row['latitude']:.3f}, {row['longitude']:.3f})")
+
+    catchments = service_catchments(frame, index, first)
+    print(f"\n🏥 Largest catchments for {first} (origins whose nearest service it is)")
+    for _, row in catchments.head(min(args.limit, 10)).iterrows():
+        print(f"   {row['origins']:>8,}  {row['Name']} ({row['Suburb']}, {row['State']})")
+
+    if args.summary_csv:
+        summary.to_csv(args.summary_csv, index=False)
+        print(f"\n   ✓ Summary: {args.summary_csv}")
+    if args.gaps_csv:
+        outside = np.zeros(len(frame), dtype=bool)
+        for modality in modalities:
+            outside |= frame[f'{modality}_km'].to_numpy() > args.radius_km
+        columns = [c for c in frame.columns if not c.endswith(('_service', '_within'))]
+        frame.loc[outside, columns].to_csv(args.gaps_csv, index=False)
+        print(f"   ✓ Gaps: {args.gaps_csv} ({int(outside.sum()):,} origins)")
+
+
+if __name__ == '__main__':
+    main()
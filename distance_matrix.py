@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Precomputed postcode-to-service distance matrix
+For every postcode centroid in the gazetteer table, keeps the K nearest
+geocoded services (great-circle kilometres) so "sort by distance" and
+"within radius" from a postcode become array lookups instead of per-request
+trigonometry. The arrays are stored as .npy files that are memory-mapped on
+load, with a JSON index naming the postcode of each row and the service of
+each slot.
+
+Rebuilds are incremental: only services that were added, removed or moved
+since the last build have their distances computed against every postcode,
+and only postcode rows that lost one of their K nearest services are
+recomputed in full.
+
+Build with: python distance_matrix.py [--k 50] [--full]
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from checkpoint import frame_fingerprints
+from gazetteer import GAZETTEER_PATH, Gazetteer
+from schema import load_services
+from service_index import DEFAULT_JSON, haversine_km
+
+MATRIX_DIR = 'data/distance_matrix'
+INDEX_FILE = 'index.json'
+DISTANCE_FILE = 'nearest_km.npy'
+SERVICE_FILE = 'nearest_service.npy'
+DEFAULT_K = 50
+
+# Fields that identify a service across rebuilds (coordinates are compared
+# separately, so a re-geocoded service counts as changed)
+SERVICE_KEY_FIELDS = ['Name', 'Address', 'Suburb', 'Postcode', 'City_Sheet']
+
+# Postcode rows per block when computing full rows, bounding the size of the
+# temporary rows x services distance block
+BLOCK_ROWS = 256
+
+
+def postcode_centroids(path=GAZETTEER_PATH):
+    """One (postcode, latitude, longitude) row per postcode, sorted by postcode"""
+    lookup = Gazetteer.load(path).levels['postcode']
+    postcodes = sorted(lookup)
+    return pd.DataFrame({
+        'postcode': postcodes,
+        'latitude': [lookup[p][0] for p in postcodes],
+        'longitude': [lookup[p][1] for p in postcodes]
+    })
+
+
+def service_table(df):
+    """
+    Geocoded services with a stable id per service
+    row is the service's position in df; services that share every key
+    field are told apart by their order of appearance
+    """
+    located = df[df['latitude'].notna() & df['longitude'].notna()]
+    ids = frame_fingerprints(located, SERVICE_KEY_FIELDS)
+    ids = ids + '#' + ids.groupby(ids).cumcount().astype(str)
+    return pd.DataFrame({
+        'id': ids.to_numpy(),
+        'row': np.flatnonzero(df['latitude'].notna() & df['longitude'].notna()),
+        'latitude': located['latitude'].to_numpy(dtype=np.float64),
+        'longitude': located['longitude'].to_numpy(dtype=np.float64)
+    })
+
+
+def _top_k(distances, slots, k):
+    """Row-wise k smallest distances (sorted), padding with inf / -1"""
+    if distances.shape[1] < k:
+        pad = k - distances.shape[1]
+        distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+        slots = np.pad(slots, ((0, 0), (0, pad)), constant_values=-1)
+    if distances.shape[1] > k:
+        keep = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        distances = np.take_along_axis(distances, keep, axis=1)
+        slots = np.take_along_axis(slots, keep, axis=1)
+    order = np.argsort(distances, axis=1, kind='stable')
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(slots, order, axis=1)
+
+
+def _full_rows(postcodes, services, k):
+    """K nearest services for every postcode row, computed against all services"""
+    distances = np.empty((len(postcodes), k), dtype=np.float32)
+    slots = np.empty((len(postcodes), k), dtype=np.int32)
+    lat = services['latitude'].to_numpy()
+    lon = services['longitude'].to_numpy()
+    all_slots = np.arange(len(services), dtype=np.int32)
+    for start in range(0, len(postcodes), BLOCK_ROWS):
+        block = postcodes.iloc[start:start + BLOCK_ROWS]
+        block_km = haversine_km(block['latitude'].to_numpy()[:, None],
+                                block['longitude'].to_numpy()[:, None], lat, lon)
+        block_slots = np.broadcast_to(all_slots, block_km.shape)
+        block_km, block_slots = _top_k(block_km, block_slots, k)
+        distances[start:start + len(block)] = block_km
+        slots[start:start + len(block)] = block_slots
+    return distances, slots
+
+
+class DistanceMatrix:
+    """
+    K nearest services per postcode
+    distances (float32, km) and services (int32 slots into service_ids /
+    service_rows, -1 where there are fewer than K services) are
+    (n_postcodes, K) arrays, sorted nearest first
+    """
+
+    def __init__(self, postcodes, service_ids, service_rows, service_coords, distances, services,
+                 postcode_coords=None):
+        self.postcodes = list(postcodes)
+        self.positions = {postcode: i for i, postcode in enumerate(self.postcodes)}
+        self.service_ids = list(service_ids)
+        self.service_rows = np.asarray(service_rows, dtype=np.int64)
+        self.service_coords = np.asarray(service_coords, dtype=np.float64).reshape(-1, 2)
+        self.distances = distances
+        self.services = services
+        self.postcode_coords = (None if postcode_coords is None
+                                else np.asarray(postcode_coords, dtype=np.float64).reshape(-1, 2))
+
+    @property
+    def k(self):
+        return self.distances.shape[1]
+
+    @classmethod
+    def build(cls, postcodes, services, k=DEFAULT_K, previous=None):
+        """
+        Build from postcode_centroids() and service_table() frames
+        With a previous matrix of the same K, rows and slots that are still
+        valid are reused. Returns (matrix, stats) where stats counts the
+        service columns and postcode rows that had to be computed.
+        """
+        coords = services[['latitude', 'longitude']].to_numpy()
+        current = postcodes[['latitude', 'longitude']].to_numpy()
+        stats = {'postcodes': len(postcodes), 'services': len(services),
+                 'columns_computed': len(services), 'rows_recomputed': len(postcodes)}
+        if previous is None or previous.k != k:
+            distances, slots = _full_rows(postcodes, services, k)
+            return cls(postcodes['postcode'], services['id'], services['row'],
+                       coords, distances, slots, current), stats
+
+        # Map previous service slots to new ones; moved services count as
+        # removed and added
+        new_slot = {service_id: i for i, service_id in enumerate(services['id'])}
+        old_to_new = np.full(len(previous.service_ids) + 1, -1, dtype=np.int32)  # [-1] pads
+        unchanged = np.zeros(len(services), dtype=bool)
+        for old, service_id in enumerate(previous.service_ids):
+            slot = new_slot.get(service_id)
+            if slot is not None and np.array_equal(previous.service_coords[old], coords[slot]):
+                old_to_new[old] = slot
+                unchanged[slot] = True
+        changed = np.flatnonzero(~unchanged).astype(np.int32)
+
+        # Postcode rows carried over from the previous build (same centroid)
+        old_row = np.array([previous.positions.get(p, -1) for p in postcodes['postcode']])
+        known = old_row >= 0
+        if previous.postcode_coords is not None:
+            known[known] = np.all(previous.postcode_coords[old_row[known]] == current[known], axis=1)
+
+        kept_slots = np.full((len(postcodes), k), -1, dtype=np.int32)
+        kept_distances = np.full((len(postcodes), k), np.inf, dtype=np.float32)
+        kept_slots[known] = old_to_new[previous.services[old_row[known]]]
+        kept_distances[known] = previous.distances[old_row[known]]
+        # A row that lost one of its K nearest no longer knows its Kth
+        lost = np.any((previous.services[old_row[known]] >= 0) & (kept_slots[known] < 0), axis=1)
+        dirty = ~known
+        dirty[np.flatnonzero(known)[lost]] = True
+        clean = np.flatnonzero(~dirty)
+
+        distances = np.empty((len(postcodes), k), dtype=np.float32)
+        slots = np.empty((len(postcodes), k), dtype=np.int32)
+        if len(clean):
+            # New K nearest = old K nearest merged with the changed columns
+            rows = postcodes.iloc[clean]
+            changed_km = haversine_km(rows['latitude'].to_numpy()[:, None],
+                                      rows['longitude'].to_numpy()[:, None],
+                                      coords[changed, 0], coords[changed, 1])
+            merged_km = np.concatenate([kept_distances[clean], changed_km], axis=1)
+            merged_slots = np.concatenate(
+                [kept_slots[clean], np.broadcast_to(changed, changed_km.shape)], axis=1)
+            distances[clean], slots[clean] = _top_k(merged_km, merged_slots, k)
+        if dirty.any():
+            distances[dirty], slots[dirty] = _full_rows(postcodes[dirty], services, k)
+
+        stats['columns_computed'] = len(changed)
+        stats['rows_recomputed'] = int(dirty.sum())
+        matrix = cls(postcodes['postcode'], services['id'], services['row'],
+                     coords, distances, slots, current)
+        return matrix, stats
+
+    def save(self, directory=MATRIX_DIR):
+        """Write the arrays as .npy (replacing any previous build) plus the JSON index"""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in ((DISTANCE_FILE, self.distances), (SERVICE_FILE, self.services)):
+            path = os.path.join(directory, name)
+            partial = path + '.partial.npy'
+            out = np.lib.format.open_memmap(partial, mode='w+', dtype=array.dtype, shape=array.shape)
+            out[:] = array
+            out.flush()
+            del out
+            os.replace(partial, path)
+        index = {
+            'k': self.k,
+            'postcodes': self.postcodes,
+            'postcode_coords': None if self.postcode_coords is None else self.postcode_coords.tolist(),
+            'service_ids': self.service_ids,
+            'service_rows': self.service_rows.tolist(),
+            'service_coords': self.service_coords.tolist()
+        }
+        with open(os.path.join(directory, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+
+    @classmethod
+    def load(cls, directory=MATRIX_DIR):
+        """Memory-map a saved build; rows are only paged in when looked up"""
+        with open(os.path.join(directory, INDEX_FILE), encoding='utf-8') as f:
+            index = json.load(f)
+        return cls(index['postcodes'], index['service_ids'], index['service_rows'],
+                   index['service_coords'],
+                   np.load(os.path.join(directory, DISTANCE_FILE), mmap_mode='r'),
+                   np.load(os.path.join(directory, SERVICE_FILE), mmap_mode='r'),
+                   index['postcode_coords'])
+
+    def nearest(self, postcode, k=None, radius_km=None):
+        """
+        Nearest services to a postcode centroid, nearest first
+        Returns a frame of rank, row (position in the geocoded JSON),
+        service_id and distance_km; at most K rows, so radius queries are
+        complete only up to the Kth nearest service
+        """
+        i = self.positions.get(str(postcode))
+        if i is None:
+            raise KeyError(f"Postcode {postcode} is not in the distance matrix")
+        slots = np.asarray(self.services[i, :k])
+        distances = np.asarray(self.distances[i, :k], dtype=np.float64)
+        keep = slots >= 0
+        if radius_km is not None:
+            keep &= distances <= radius_km
+        slots, distances = slots[keep], distances[keep]
+        return pd.DataFrame({
+            'rank': np.arange(len(slots)),
+            'row': self.service_rows[slots],
+            'service_id': [self.service_ids[s] for s in slots],
+            'distance_km': distances
+        })
+
+
+def build_matrix(directory=MATRIX_DIR, geocoded_json=DEFAULT_JSON, gazetteer_path=GAZETTEER_PATH,
+                 k=DEFAULT_K, full=False):
+    """Build (or incrementally update) the saved matrix; returns (matrix, stats)"""
+    postcodes = postcode_centroids(gazetteer_path)
+    services = service_table(load_services(geocoded_json))
+    previous = None
+    if not full and os.path.exists(os.path.join(directory, INDEX_FILE)):
+        previous = DistanceMatrix.load(directory)
+    matrix, stats = DistanceMatrix.build(postcodes, services, k=k, previous=previous)
+    matrix.save(directory)
+    return matrix, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--k', type=int, default=DEFAULT_K, help='nearest services kept per postcode')
+    parser.add_argument('--full', action='store_true', help='ignore the previous build')
+    parser.add_argument('--dir', default=MATRIX_DIR)
+    args = parser.parse_args()
+
+    matrix, stats = build_matrix(args.dir, k=args.k, full=args.full)
+    print(f"📏 Distance matrix: {stats['postcodes']} postcodes x {stats['services']} services, "
+          f"K={matrix.k}")
+    print(f"   Computed {stats['columns_computed']} service columns, "
+          f"recomputed {stats['rows_recomputed']} postcode rows")
+    print(f"   Saved to {args.dir}/")
+
+    # Example: nearest services to Adelaide CBD
+    df = load_services(DEFAULT_JSON)
+    if '5000' in matrix.positions:
+        result = matrix.nearest('5000', k=3)
+        print("\nNearest services to postcode 5000:")
+        for row, distance in zip(result['row'], result['distance_km']):
+            print(f"   {distance:6.1f} km  {df['Name'].iat[row]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Concurrent multi-format export of a geocoded registry
+Every output (CSV, pretty-printed record JSON, xlsx, web payload, ...) is
+written by its own worker from one frozen snapshot of the frame, instead of
+one format after another. On platforms with fork the workers are processes
+that inherit the snapshot copy-on-write, so pure-Python writers (json,
+openpyxl) really run in parallel; elsewhere, or while other threads are
+running in the parent (a child forked then can deadlock on a lock one of
+them held), they fall back to threads.
+
+xlsx files are written in openpyxl's write-only (streaming) mode, and the
+per-city sheets come from a single groupby rather than one boolean filter
+per sheet.
+
+For registries too large to hold in memory, CsvStream, JsonStream and
+XlsxStream write the same files from a sequence of chunks.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from instrumentation import get_metrics
+
+COMBINED_SHEET = 'All_Cities_Combined'
+XLSX_MAX_ROWS = 1048576  # per sheet, including the header
+
+# Same header look as DataFrame.to_excel
+_THIN = Side(style='thin')
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+# Snapshot being exported; set before the worker pool starts so forked
+# workers inherit it instead of receiving a pickled copy
+_snapshot = None
+
+
+def freeze(df):
+    """Immutable-by-convention copy of the frame that all writers read from"""
+    return df.copy(deep=True)
+
+
+def write_csv(df, path):
+    df.to_csv(path, index=False)
+    return path
+
+
+def _json_records(df):
+    """Records with NaN replaced by None, so missing coordinates are written as null"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def write_json(df, path):
+    """Record JSON for the web app (indent=2, as the scripts have always written it)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        # allow_nan=False: the web app's JSON.parse rejects NaN
+        json.dump(_json_records(df), f, indent=2, ensure_ascii=False, allow_nan=False)
+    return path
+
+
+def _header_cells(sheet, columns):
+    cells = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=str(column))
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        cells.append(cell)
+    return cells
+
+
+def _append_rows(sheet, df):
+    """Stream rows into a write-only sheet; missing values become empty cells"""
+    sheet.append(_header_cells(sheet, df.columns))
+    values = df.astype(object).where(df.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        sheet.append(row)
+
+
+def write_xlsx(df, path, split_column=None, sheet_names=None, combined_sheet=COMBINED_SHEET):
+    """
+    Streaming (write-only) xlsx
+    Without split_column the frame is written to a single sheet. With it,
+    a combined sheet comes first, then one sheet per value of split_column
+    (in sheet_names order; sheets with no rows still get a header).
+    """
+    workbook = Workbook(write_only=True)
+    if split_column is None:
+        _append_rows(workbook.create_sheet('Sheet1'), df)
+    else:
+        _append_rows(workbook.create_sheet(combined_sheet), df)
+        groups = dict(tuple(df.groupby(split_column, sort=False)))
+        for sheet_name in sheet_names or list(groups):
+            _append_rows(workbook.create_sheet(sheet_name), groups.get(sheet_name, df.iloc[:0]))
+    workbook.save(path)
+    return path
+
+
+def _run_job(name, writer, args):
+    """Worker entry point: run one writer against the shared snapshot"""
+    start = time.perf_counter()
+    result = writer(_snapshot, *args)
+    return name, time.perf_counter() - start, result
+
+
+def _executor(max_workers):
+    if 'fork' in multiprocessing.get_all_start_methods() and threading.active_count() == 1:
+        return ProcessPoolExecutor(max_workers=max_workers,
+                                   mp_context=multiprocessing.get_context('fork'))
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+def export_all(df, jobs, max_workers=None, frozen=False):
+    """
+    Run every export job concurrently from one snapshot of df
+    jobs maps a format name to (writer, *args); each writer is called as
+    writer(snapshot, *args) and should return the path it wrote (or a
+    report). Returns ({name: result}, {name: seconds}); timings and output
+    sizes also go to the metrics as export.<name> stages.
+    """
+    global _snapshot
+    if not jobs:
+        return {}, {}
+    metrics = get_metrics()
+    _snapshot = df if frozen else freeze(df)
+    for job in jobs.values():
+        path = job[1] if len(job) > 1 and isinstance(job[1], str) else None
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    results = {}
+    timings = {}
+    try:
+        with metrics.timer('export', formats=len(jobs), rows=len(df)):
+            with _executor(max_workers or len(jobs)) as executor:
+                futures = [executor.submit(_run_job, name, job[0], job[1:])
+                           for name, job in jobs.items()]
+                for future in futures:
+                    name, seconds, result = future.result()
+                    metrics.add_stage(f'export.{name}', seconds)
+                    if isinstance(result, str) and os.path.isfile(result):
+                        metrics.count(f'export.{name}.bytes', os.path.getsize(result))
+                    results[name] = result
+                    timings[name] = seconds
+    finally:
+        _snapshot = None
+    return results, timings
+
+
+def standard_jobs(csv_path=None, json_path=None, xlsx_path=None, **xlsx_options):
+    """The CSV / record JSON / xlsx trio every geocoding script writes"""
+    jobs = {}
+    if csv_path:
+        jobs['csv'] = (write_csv, csv_path)
+    if json_path:
+        jobs['json'] = (write_json, json_path)
+    if xlsx_path:
+        jobs['xlsx'] = (write_xlsx, xlsx_path) + tuple(xlsx_options.get(key) for key in
+                                                      ('split_column', 'sheet_names'))
+    return jobs
+
+
+class CsvStream:
+    """CSV written chunk by chunk; the header comes from the first chunk"""
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+        return self.path
+
+
+class JsonStream:
+    """Record JSON array written chunk by chunk, formatted like write_json()"""
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.empty = True
+
+    def write(self, df):
+        if not len(df):
+            return
+        # Strip the '[\n' and '\n]' around this chunk's records
+        text = json.dumps(_json_records(df), indent=2, ensure_ascii=False, allow_nan=False)[2:-2]
+        self.file.write(('[\n' if self.empty else ',\n') + text)
+        self.empty = False
+
+    def close(self):
+        self.file.write('[]' if self.empty else '\n]')
+        self.file.close()
+        return self.path
+
+
+class XlsxStream:
+    """
+    Write-only xlsx fed chunk by chunk, laid out like write_xlsx()
+    The sheets are all created up front, so the combined sheet and the
+    per-city sheets can be appended to in any order. A sheet that reaches
+    Excel's row limit continues in '<name>_2', '<name>_3', ...
+    """
+
+    def __init__(self, path, split_column=None, sheet_names=None, combined_sheet=COMBINED_SHEET):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.split_column = split_column
+        self.combined_sheet = combined_sheet if split_column else 'Sheet1'
+        self.workbook = Workbook(write_only=True)
+        self.columns = None
+        self.sheets = {}  # name -> [current sheet, rows in it, continuation number]
+        for name in [self.combined_sheet] + list(sheet_names or []):
+            self.sheets[name] = [self.workbook.create_sheet(name), 0, 1]
+
+    def _sheet(self, name):
+        entry = self.sheets.get(name)
+        if entry is None:
+            entry = self.sheets[name] = [self.workbook.create_sheet(name), 0, 1]
+        if entry[1] == 0 and self.columns is not None:
+            entry[0].append(_header_cells(entry[0], self.columns))
+            entry[1] = 1
+        elif entry[1] >= XLSX_MAX_ROWS:
+            entry[2] += 1
+            entry[0] = self.workbook.create_sheet(f'{name[:28]}_{entry[2]}')
+            entry[0].append(_header_cells(entry[0], self.columns))
+            entry[1] = 1
+        return entry
+
+    def _append(self, name, df):
+        values = df.astype(object).where(df.notna(), None)
+        entry = self._sheet(name)
+        for row in values.itertuples(index=False, name=None):
+            if entry[1] >= XLSX_MAX_ROWS:
+                entry = self._sheet(name)
+            entry[0].append(row)
+            entry[1] += 1
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+        self._append(self.combined_sheet, df)
+        if self.split_column:
+            for name, group in df.groupby(self.split_column, sort=False):
+                self._append(name, group)
+
+    def close(self):
+        if self.columns is not None:
+            for name in self.sheets:
+                self._sheet(name)  # header for sheets that never got a row
+        self.workbook.save(self.path)
+        return self.path
@@ -4,20 +4,10 @@ Manually fix failed geocoding attempts with more specific addresses
 """
 
 import pandas as pd
-import time
-from geopy.geocoders import Nominatim
-import json
-
-def geocode_address(geolocator, address):
-    """Geocode an address"""
-    time.sleep(1.1)
-    try:
-        location = geolocator.geocode(address, timeout=10)
-        if location:
-            return location.latitude, location.longitude, location.address
-    except:
-        pass
-    return None, None, None
+from exporters import export_all, standard_jobs
+from gazetteer import apply_fallback
+from geocoding import GeocodeCache, geocode_many, make_geolocator
+from instrumentation import start_run
 
 # Manual address corrections for failed geocoding
 MANUAL_FIXES = {
@@ -32,51 +22,53 @@ MANUAL_FIXES = {
 }
 
 def main():
+    metrics = start_run('fix_failed_geocoding')
     print("🔧 Fixing Failed Geocoding Attempts")
     print("=" * 60)
 
     # Initialize geocoder
-    geolocator = Nominatim(
-        user_agent="integrative-oncology-services-research-v1.0",
-        timeout=10
-    )
+    geolocator = make_geolocator("integrative-oncology-services-research-v1.0")
+    cache = GeocodeCache()
 
     # Load geocoded data
-    df = pd.read_csv('data/services_geocoded.csv')
+    with metrics.timer('load'):
+        df = pd.read_csv('data/services_geocoded.csv')
 
     # Find failed geocodes
     failed = df[df['latitude'].isna()]
     print(f"\nFound {len(failed)} services to fix\n")
 
+    # Services sharing a corrected address are geocoded once between them
+    fixes = [(idx, row['Name'], MANUAL_FIXES[row['Name']])
+             for idx, row in failed.iterrows() if row['Name'] in MANUAL_FIXES]
+    with metrics.timer('geocode', rows=len(fixes)):
+        results = geocode_many(geolocator, [address for _, _, address in fixes], cache=cache)
+
     # Fix each one
-    for idx, row in failed.iterrows():
-        service_name = row['Name']
-
-        if service_name in MANUAL_FIXES:
-            corrected_address = MANUAL_FIXES[service_name]
-            print(f"Fixing: {service_name}")
-            print(f"   New address: {corrected_address}")
-
-            lat, lon, display_name = geocode_address(geolocator, corrected_address)
-
-            if lat:
-                df.at[idx, 'latitude'] = lat
-                df.at[idx, 'longitude'] = lon
-                df.at[idx, 'geocode_accuracy'] = 'manual_fix'
-                df.at[idx, 'geocode_source'] = 'Nominatim'
-                df.at[idx, 'geocode_display_name'] = display_name
-                print(f"   ✓ Success: ({lat:.6f}, {lon:.6f})\n")
-            else:
-                print(f"   ✗ Still failed\n")
+    for (idx, service_name, corrected_address), result in zip(fixes, results):
+        print(f"Fixing: {service_name}")
+        print(f"   New address: {corrected_address}")
+
+        if result['latitude']:
+            df.at[idx, 'latitude'] = result['latitude']
+            df.at[idx, 'longitude'] = result['longitude']
+            df.at[idx, 'geocode_accuracy'] = 'manual_fix'
+            df.at[idx, 'geocode_source'] = result['geocode_source']
+            df.at[idx, 'geocode_display_name'] = result['display_name']
+            metrics.count('rows.manual_fix')
+            print(f"   ✓ Success: ({result['latitude']:.6f}, {result['longitude']:.6f})\n")
+        else:
+            print(f"   ✗ Still failed\n")
+
+    # Anything still unresolved gets an offline postcode/suburb centroid
+    with metrics.timer('gazetteer_fallback'):
+        resolved = apply_fallback(df)
+    metrics.count('rows.gazetteer', resolved)
+    print(f"Gazetteer fallback resolved {resolved} remaining services offline\n")
 
     # Save updated data
-    df.to_csv('data/services_geocoded.csv', index=False)
-
-    df_json = df.to_dict('records')
-    with open('data/services_geocoded.json', 'w', encoding='utf-8') as f:
-        json.dump(df_json, f, indent=2, ensure_ascii=False)
-
-    df.to_excel('Data_geocoded.xlsx', index=False, engine='openpyxl')
+    export_all(df, standard_jobs('data/services_geocoded.csv', 'data/services_geocoded.json',
+                                 'Data_geocoded.xlsx'))
 
     # Print final summary
     total = len(df)
@@ -90,6 +82,8 @@ def main():
     print(f"Successfully geocoded: {successful}")
     print(f"Failed to geocode:     {failed}")
     print(f"Success rate:          {(successful / total * 100):.1f}%")
+    cache.print_stats()
+    cache.close()
 
     if failed > 0:
         print("\n⚠️  Still failed:")
@@ -98,6 +92,7 @@ def main():
             print(f"   - {row['Name']}")
 
     print("\n✅ Update complete!")
+    metrics.finish()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Offline gazetteer fallback geocoder
+Resolves addresses that Nominatim could not (e.g. "Multiple locations",
+"Various" postcodes) from a local postcode/suburb centroid table, with no
+network round trip. Results carry a lower geocode_accuracy tier so they can
+be told apart from street-level geocodes.
+
+The table (data/postcode_centroids.csv) holds hand-curated centroids
+(source 'manual'), one representative point per state for rows with no
+usable postcode (source 'state_capital'), and centroids derived from the
+services we have already geocoded (source 'geocoded_services'; refreshed
+with --rebuild). A fuller postcode table with the same columns can be
+dropped in its place.
+"""
+
+import argparse
+import pandas as pd
+from preprocess import coerce_postcodes, state_from_postcode
+from schema import coordinates, load_services
+
+GAZETTEER_PATH = 'data/postcode_centroids.csv'
+GEOCODED_JSON = 'data/all_services_geocoded_complete.json'
+
+# When several rows share a key, earlier sources win
+SOURCE_PRIORITY = ['manual', 'geocoded_services', 'state_capital']
+# Rows derived from the registry's own geocodes, which cannot vouch for them
+DERIVED_SOURCES = ['geocoded_services']
+
+# Lookup levels from most to least specific, with the accuracy tier each
+# level reports
+ACCURACY_TIERS = {
+    'postcode_suburb': 'suburb_centroid',
+    'postcode': 'postcode_centroid',
+    'suburb_state': 'suburb_centroid',
+    'state': 'state_capital'
+}
+
+
+def _suburb_key(values):
+    return pd.Series(values).fillna('').astype(str).str.strip().str.lower()
+
+
+class Gazetteer:
+    """In-memory centroid lookups, built once from the table"""
+
+    def __init__(self, table):
+        table = table.copy()
+        table['postcode'] = coerce_postcodes(table['postcode'])
+        table['suburb_key'] = _suburb_key(table['suburb'])
+        table['state'] = table['state'].fillna('').astype(str)
+        table['priority'] = table['source'].map(
+            {source: i for i, source in enumerate(SOURCE_PRIORITY)}).fillna(len(SOURCE_PRIORITY))
+        self.table = table.sort_values('priority', kind='stable')
+
+        has_postcode = self.table['postcode'] != ''
+        has_suburb = self.table['suburb_key'] != ''
+        self.levels = {
+            'postcode_suburb': self._first(self.table[has_postcode & has_suburb],
+                                           self.table['postcode'] + '|' + self.table['suburb_key']),
+            'postcode': self._first(self.table[has_postcode], self.table['postcode']),
+            'suburb_state': self._first(self.table[has_suburb],
+                                        self.table['suburb_key'] + '|' + self.table['state']),
+            'state': self._first(self.table[~has_postcode & ~has_suburb], self.table['state'])
+        }
+        # Postcode centroids from independent sources only, for validating geocodes
+        independent = has_postcode & ~self.table['source'].isin(DERIVED_SOURCES)
+        self.reference_postcodes = self._first(self.table[independent], self.table['postcode'])
+
+    @staticmethod
+    def _first(rows, keys):
+        """Highest-priority (latitude, longitude, label) per key"""
+        keys = keys.loc[rows.index]
+        rows = rows.assign(key=keys).drop_duplicates('key')
+        labels = (rows['suburb'].fillna('').astype(str) + ' ' + rows['state'] + ' '
+                  + rows['postcode']).str.split().str.join(' ')
+        return dict(zip(rows['key'], zip(rows['latitude'], rows['longitude'], labels)))
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH):
+        return cls(pd.read_csv(path, dtype={'postcode': str}))
+
+    def resolve_frame(self, df):
+        """
+        Resolve every row of a registry frame in one pass
+        Returns a frame aligned with df with latitude, longitude,
+        geocode_accuracy, geocode_source and display_name (None where even
+        the state is unknown)
+        """
+        postcode = coerce_postcodes(df['Postcode'])
+        suburb = _suburb_key(df['Suburb']).set_axis(df.index)
+        state = (df['State'] if 'State' in df.columns else state_from_postcode(postcode))
+        state = state.fillna('').astype(str)
+        keys = {
+            'postcode_suburb': postcode + '|' + suburb,
+            'postcode': postcode,
+            'suburb_state': suburb + '|' + state,
+            'state': state
+        }
+
+        found = pd.Series(None, index=df.index, dtype=object)
+        tier = pd.Series(None, index=df.index, dtype=object)
+        for level, lookup in self.levels.items():
+            missing = found.isna()
+            if not missing.any():
+                break
+            hits = keys[level][missing].map(lookup).dropna()
+            found[hits.index] = hits
+            tier[hits.index] = ACCURACY_TIERS[level]
+
+        resolved = found.notna()
+        result = pd.DataFrame({
+            'latitude': coordinates(found.map(lambda v: v[0] if isinstance(v, tuple) else None)),
+            'longitude': coordinates(found.map(lambda v: v[1] if isinstance(v, tuple) else None)),
+            'geocode_accuracy': tier,
+            'geocode_source': pd.Series('Gazetteer', index=df.index).where(resolved, None),
+            'display_name': found.map(lambda v: v[2] if isinstance(v, tuple) else None)
+                                 + ' (' + tier.str.replace('_', ' ') + ')'
+        }, index=df.index)
+        return result
+
+    def lookup(self, postcode, suburb=None, state=None):
+        """Resolve a single address; returns a geocode result dict or None"""
+        row = pd.DataFrame({'Postcode': [postcode], 'Suburb': [suburb], 'State': [state]})
+        result = self.resolve_frame(row).iloc[0]
+        if pd.isna(result['latitude']):
+            return None
+        return result.to_dict()
+
+
+_gazetteer = None
+
+
+def get_gazetteer(path=GAZETTEER_PATH):
+    """Shared gazetteer, loaded into memory on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.load(path)
+    return _gazetteer
+
+
+def apply_fallback(df, gazetteer=None, accuracies=('failed', 'error', 'offline')):
+    """
+    Fill coordinates for rows whose geocode failed, in place
+    Returns the number of rows resolved from the gazetteer
+    """
+    gazetteer = gazetteer or get_gazetteer()
+    needs = df['latitude'].isna() & (df['geocode_accuracy'].isna()
+                                     | df['geocode_accuracy'].isin(accuracies))
+    if not needs.any():
+        return 0
+    result = gazetteer.resolve_frame(df[needs])
+    result = result[result['latitude'].notna()]
+    for column in ['latitude', 'longitude', 'geocode_accuracy', 'geocode_source']:
+        df.loc[result.index, column] = result[column]
+    df.loc[result.index, 'geocode_display_name'] = result['display_name']
+    return len(result)
+
+
+def rebuild_table(path=GAZETTEER_PATH, geocoded_json=GEOCODED_JSON):
+    """Refresh the derived rows from street-level geocodes, keeping curated rows"""
+    table = pd.read_csv(path, dtype={'postcode': str})
+    table = table[~table['source'].isin(DERIVED_SOURCES)]
+
+    df = load_services(geocoded_json, compact=False)
+    df = df[df['geocode_accuracy'] == 'high']
+    df = df.assign(postcode=coerce_postcodes(df['Postcode']),
+                   suburb=df['Suburb'].astype(str).str.strip())
+    df = df[df['postcode'] != '']
+    derived = (df.groupby(['postcode', 'suburb', 'State'], as_index=False)
+                 [['latitude', 'longitude']].median()
+                 .rename(columns={'State': 'state'})
+                 .round({'latitude': 4, 'longitude': 4})
+                 .assign(source='geocoded_services'))
+
+    table = pd.concat([table, derived], ignore_index=True)
+    table.to_csv(path, index=False)
+    return len(derived)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rebuild', action='store_true',
+                        help='refresh derived centroids from the geocoded JSON')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        derived = rebuild_table()
+        print(f"   ✓ {derived} derived centroids written to {GAZETTEER_PATH}")
+
+    gazetteer = Gazetteer.load()
+    df = load_services(GEOCODED_JSON, compact=False)
+    resolved = apply_fallback(df, gazetteer)
+    print(f"📍 Gazetteer: {len(gazetteer.table)} centroids loaded")
+    print(f"   Resolved {resolved} of {resolved + df['latitude'].isna().sum()} failed geocodes offline")
+    print(df['geocode_accuracy'].value_counts().to_string())
+
+
+if __name__ == '__main__':
+    main()
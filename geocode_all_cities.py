@@ -5,71 +5,12 @@ Processes the complete dataset of 185 services
 """
 
 import pandas as pd
-import time
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-import json
+from exporters import export_all, standard_jobs
+from geocoding import GeocodeCache, geocode_many, make_geolocator
+from preprocess import prepare_addresses, state_from_postcode
+from schema import COORDINATE_COLUMNS
 import os
 
-def geocode_address(geolocator, address, max_retries=3):
-    """Geocode an address with retry logic"""
-    for attempt in range(max_retries):
-        try:
-            time.sleep(1.1)  # Respect rate limits
-            location = geolocator.geocode(address, timeout=10)
-
-            if location:
-                return {
-                    'latitude': location.latitude,
-                    'longitude': location.longitude,
-                    'geocode_accuracy': 'high',
-                    'geocode_source': 'Nominatim',
-                    'display_name': location.address
-                }
-            else:
-                return {
-                    'latitude': None,
-                    'longitude': None,
-                    'geocode_accuracy': 'failed',
-                    'geocode_source': 'Nominatim',
-                    'display_name': None
-                }
-
-        except (GeocoderTimedOut, GeocoderServiceError) as e:
-            print(f"  ⚠️  Attempt {attempt + 1} failed: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(2)
-                continue
-            else:
-                return {
-                    'latitude': None,
-                    'longitude': None,
-                    'geocode_accuracy': 'error',
-                    'geocode_source': 'Nominatim',
-                    'display_name': None
-                }
-
-def detect_state(suburb, postcode):
-    """Detect Australian state from postcode"""
-    postcode = int(postcode) if pd.notna(postcode) else 0
-
-    if 2000 <= postcode < 3000:
-        return 'NSW'
-    elif 3000 <= postcode < 4000:
-        return 'VIC'
-    elif 4000 <= postcode < 5000:
-        return 'QLD'
-    elif 5000 <= postcode < 6000:
-        return 'SA'
-    elif 6000 <= postcode < 7000:
-        return 'WA'
-    elif 7000 <= postcode < 8000:
-        return 'TAS'
-    elif 800 <= postcode < 900:
-        return 'NT'
-    else:
-        return 'Australia'
-
 def main():
     print("🗺️  Geocoding ALL Australian Integrative Oncology Services")
     print("=" * 70)
@@ -117,10 +58,8 @@ def main():
 
     # Initialize geocoder
     print("\n1. Initializing geocoder...")
-    geolocator = Nominatim(
-        user_agent="integrative-oncology-services-australia-v1.0",
-        timeout=10
-    )
+    geolocator = make_geolocator("integrative-oncology-services-australia-v1.0")
+    cache = GeocodeCache()
     print("   ✓ Nominatim geocoder initialized")
 
     # Load data
@@ -139,7 +78,7 @@ def main():
     # Add State column if not present
     if 'State' not in df.columns:
         print("\n3. Adding State information based on postcodes...")
-        df['State'] = df.apply(lambda row: detect_state(row['Suburb'], row['Postcode']), axis=1)
+        df['State'] = state_from_postcode(df['Postcode'])
         print("   ✓ State column added")
 
     # Check for existing geocoded data
@@ -150,36 +89,27 @@ def main():
         to_geocode = df[df['latitude'].isna()]
     else:
         to_geocode = df.copy()
-        df['latitude'] = None
-        df['longitude'] = None
+        for column in COORDINATE_COLUMNS:
+            df[column] = float('nan')
         df['geocode_accuracy'] = None
         df['geocode_source'] = None
         df['geocode_display_name'] = None
 
     total_to_geocode = len(to_geocode)
     print(f"\n4. Starting geocoding for {total_to_geocode} services...")
-    print(f"   Estimated time: ~{total_to_geocode * 1.2 / 60:.1f} minutes")
-    print("   (Respecting 1 request/second rate limit)\n")
-
-    failed_count = 0
+    print(f"   Estimated time: up to ~{total_to_geocode / 60:.1f} minutes (cached addresses are instant)")
+    print("   (Respecting the provider's rate limit)\n")
 
-    for idx, row in to_geocode.iterrows():
-        # Construct full address
-        state = row.get('State', 'Australia')
-        address_parts = [
-            str(row['Address']) if pd.notna(row['Address']) else '',
-            str(row['Suburb']) if pd.notna(row['Suburb']) else '',
-            state,
-            str(int(row['Postcode'])) if pd.notna(row['Postcode']) else '',
-            'Australia'
-        ]
-        full_address = ', '.join([p for p in address_parts if p])
+    # Construct full addresses
+    addresses = prepare_addresses(to_geocode)['full_address'].tolist()
 
-        print(f"   [{idx + 1}/{len(df)}] {row['Name'][:50]}")
-        print(f"       📍 {full_address[:80]}")
+    failed_count = 0
 
-        # Geocode
-        result = geocode_address(geolocator, full_address)
+    def report(i, result):
+        nonlocal failed_count
+        idx = to_geocode.index[i]
+        print(f"   [{idx + 1}/{len(df)}] {df.at[idx, 'Name'][:50]}")
+        print(f"       📍 {addresses[i][:80]}")
 
         if result['latitude']:
             print(f"       ✓ ({result['latitude']:.6f}, {result['longitude']:.6f})")
@@ -195,25 +125,19 @@ def main():
 
         print()
 
+    # Geocode
+    geocode_many(geolocator, addresses, cache=cache, on_result=report)
+
     # Save results
     print("\n5. Saving geocoded data...")
 
-    # CSV
+    # CSV, JSON and Excel, written concurrently
     output_csv = 'data/all_services_geocoded.csv'
-    os.makedirs('data', exist_ok=True)
-    df.to_csv(output_csv, index=False)
-    print(f"   ✓ Saved CSV: {output_csv}")
-
-    # JSON
     output_json = 'data/all_services_geocoded.json'
-    df_json = df.to_dict('records')
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(df_json, f, indent=2, ensure_ascii=False)
-    print(f"   ✓ Saved JSON: {output_json}")
-
-    # Excel
     output_excel = 'All_Services_Geocoded.xlsx'
-    df.to_excel(output_excel, index=False, engine='openpyxl')
+    export_all(df, standard_jobs(output_csv, output_json, output_excel))
+    print(f"   ✓ Saved CSV: {output_csv}")
+    print(f"   ✓ Saved JSON: {output_json}")
     print(f"   ✓ Saved Excel: {output_excel}")
 
     # Summary
@@ -228,6 +152,8 @@ def main():
     print(f"Successfully geocoded: {successful}")
     print(f"Failed to geocode:     {failed}")
     print(f"Success rate:          {(successful / total * 100):.1f}%")
+    cache.print_stats()
+    cache.close()
 
     # Breakdown by city
     if 'Suburb' in df.columns:
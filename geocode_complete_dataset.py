@@ -4,195 +4,395 @@ Geocode ALL 185 Integrative Oncology Services from all 7 Australian cities
 Reads from Data_final_cleaned.xlsx (7 sheets) and geocodes everything
 """
 
+import argparse
+import os
+from collections import Counter
 import pandas as pd
-import time
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-import json
-
-def geocode_address(geolocator, address, max_retries=3):
-    """Geocode an address with retry logic"""
-    for attempt in range(max_retries):
-        try:
-            time.sleep(1.1)  # Respect rate limits
-            location = geolocator.geocode(address, timeout=10)
-
-            if location:
-                return {
-                    'latitude': location.latitude,
-                    'longitude': location.longitude,
-                    'geocode_accuracy': 'high',
-                    'geocode_source': 'Nominatim',
-                    'display_name': location.address
-                }
-            else:
-                return {
-                    'latitude': None,
-                    'longitude': None,
-                    'geocode_accuracy': 'failed',
-                    'geocode_source': 'Nominatim',
-                    'display_name': None
-                }
-
-        except (GeocoderTimedOut, GeocoderServiceError) as e:
-            if attempt < max_retries - 1:
-                time.sleep(2)
-                continue
-            else:
-                return {
-                    'latitude': None,
-                    'longitude': None,
-                    'geocode_accuracy': 'error',
-                    'geocode_source': 'Nominatim',
-                    'display_name': None
-                }
-
-def detect_state(sheet_name):
-    """Detect state from sheet name"""
-    sheet_lower = sheet_name.lower()
-    if 'sydney' in sheet_lower:
-        return 'NSW'
-    elif 'melbourne' in sheet_lower:
-        return 'VIC'
-    elif 'brisbane' in sheet_lower:
-        return 'QLD'
-    elif 'adelaide' in sheet_lower or 'adelaid' in sheet_lower:
-        return 'SA'
-    elif 'perth' in sheet_lower:
-        return 'WA'
-    elif 'hobart' in sheet_lower:
-        return 'TAS'
-    elif 'darwin' in sheet_lower:
-        return 'NT'
-    else:
-        return 'Australia'
-
-def main():
-    print("🗺️  Geocoding ALL Australian Integrative Oncology Services")
-    print("=" * 70)
-    print("Source: Data_final_cleaned.xlsx (7 cities, 185 services)")
-    print("=" * 70)
-
-    # Load all sheets
-    print("\n1. Loading data from all city sheets...")
-    xl = pd.ExcelFile('Data_final_cleaned.xlsx')
-
-    all_dfs = []
-    for sheet_name in xl.sheet_names:
-        df = pd.read_excel('Data_final_cleaned.xlsx', sheet_name=sheet_name)
-        df['City_Sheet'] = sheet_name
-        df['State'] = detect_state(sheet_name)
-        all_dfs.append(df)
-        print(f"   ✓ {sheet_name}: {len(df)} records")
-
-    # Combine all sheets
-    df_all = pd.concat(all_dfs, ignore_index=True)
-    print(f"\n   📊 Total services loaded: {len(df_all)}")
-
-    # Initialize geocoder
-    print("\n2. Initializing geocoder...")
-    geolocator = Nominatim(
-        user_agent="integrative-oncology-australia-research-v1.0",
-        timeout=10
-    )
-    print("   ✓ Nominatim geocoder ready")
-
-    # Add geocoding columns
-    df_all['latitude'] = None
-    df_all['longitude'] = None
-    df_all['geocode_accuracy'] = None
-    df_all['geocode_source'] = None
-    df_all['geocode_display_name'] = None
-
-    # Geocode all services
-    print(f"\n3. Geocoding {len(df_all)} services...")
-    print(f"   ⏱️  Estimated time: ~{len(df_all) * 1.2 / 60:.1f} minutes")
-    print("   (Respecting 1 request/second rate limit)\n")
-
-    failed_count = 0
-    city_stats = {}
-
-    for idx, row in df_all.iterrows():
-        # Track by city
-        city_sheet = row['City_Sheet']
-        if city_sheet not in city_stats:
-            city_stats[city_sheet] = {'total': 0, 'success': 0, 'failed': 0}
-        city_stats[city_sheet]['total'] += 1
-
-        # Construct full address
-        state = row['State']
-
-        # Handle postcode - convert to string, handle non-numeric values
-        postcode_val = ''
-        if pd.notna(row['Postcode']):
-            try:
-                postcode_val = str(int(row['Postcode']))
-            except (ValueError, TypeError):
-                postcode_val = str(row['Postcode']) if str(row['Postcode']).isdigit() else ''
-
-        address_parts = [
-            str(row['Address']) if pd.notna(row['Address']) else '',
-            str(row['Suburb']) if pd.notna(row['Suburb']) else '',
-            state,
-            postcode_val,
-            'Australia'
-        ]
-        full_address = ', '.join([p for p in address_parts if p])
-
-        print(f"   [{idx + 1}/{len(df_all)}] {city_sheet.replace('_clean', '')} - {row['Name'][:45]}")
-        print(f"       📍 {full_address[:70]}")
-
-        # Geocode
-        result = geocode_address(geolocator, full_address)
-
+from checkpoint import (FINGERPRINT_COLUMN, ONLINE_STATUS_COLUMN, CheckpointJournal, PreviousSnapshot,
+                        frame_fingerprints)
+from exporters import CsvStream, JsonStream, XlsxStream, export_all, standard_jobs
+from gazetteer import apply_fallback
+from geocode_validator import apply_validation
+from geocoding import GeocodeCache, ProviderChain, geocode_many
+from ingest import WORKBOOK_PATH, iter_registry, load_registry
+from instrumentation import get_metrics, start_run
+from modality_index import INDEX_PATH, ModalityIndex, previous_vocabulary
+from preprocess import prepare_addresses
+from schema import COORDINATE_COLUMNS, coordinates
+from web_export import WEB_DIR, WebPayloadStream, export_web_payload, print_report
+
+CHECKPOINT_PATH = '.cache/geocode_complete_dataset.checkpoint.jsonl'
+OUTPUT_CSV = 'All_Services_Geocoded_Complete.csv'
+OUTPUT_JSON = 'data/all_services_geocoded_complete.json'
+OUTPUT_EXCEL = 'Data_final_cleaned_geocoded.xlsx'
+
+# Registry column <- geocode result key
+RESULT_COLUMNS = {
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'geocode_accuracy': 'geocode_accuracy',
+    'geocode_source': 'geocode_source',
+    'geocode_display_name': 'display_name'
+}
+
+
+def geocode_registry(df_all, geolocator, cache, journal, provider=None,
+                     use_gazetteer=True, verbose=True, previous=None):
+    """
+    Geocode every row of the combined registry, adding the result columns in place
+    Rows already in the journal are restored instead of looked up again,
+    and with a PreviousSnapshot (incremental runs) rows whose address
+    fingerprint is unchanged carry their earlier result forward.
+    Every located row is then checked by the geocode validator
+    (geocode_flags, geocode_suspect). Returns per-city {'total', 'success',
+    'failed'} counts (before the gazetteer fallback)
+    """
+    metrics = get_metrics()
+
+    # Construct full addresses and row fingerprints column-wise
+    with metrics.timer('address_build', rows=len(df_all)):
+        addresses = prepare_addresses(df_all)['full_address'].tolist()
+        fingerprints = frame_fingerprints(df_all).tolist()
+
+    # Rows completed by a previous (interrupted) run are restored from the
+    # journal; every newly completed row is appended as soon as it finishes
+    results = [journal.get(fingerprint) for fingerprint in fingerprints]
+    restored = sum(result is not None for result in results)
+    metrics.count('rows.restored', restored)
+    if verbose and restored:
+        print(f"   ↻ Resuming: {restored} rows restored from {journal.path}\n")
+
+    # Rows whose address fields are unchanged since the previous output
+    if previous is not None:
+        changes = previous.classify(df_all, fingerprints)
+        results = [result if result is not None else previous.get(fingerprint)
+                   for result, fingerprint in zip(results, fingerprints)]
+        carried = sum(result is not None for result in results) - restored
+        metrics.count('rows.carried_forward', carried)
+        metrics.count('rows.changed', changes['changed'])
+        metrics.count('rows.added', changes['added'])
+        if verbose:
+            print(f"   ↻ Incremental: {carried} rows carried forward, {changes['changed']} changed, "
+                  f"{changes['added']} added\n")
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    def report(i, result):
+        if not verbose:
+            return
+        print(f"   [{i + 1}/{len(df_all)}] {df_all['City_Sheet'].iat[i].replace('_clean', '')} "
+              f"- {df_all['Name'].iat[i][:45]}")
+        print(f"       📍 {addresses[i][:70]}")
         if result['latitude']:
             print(f"       ✓ ({result['latitude']:.6f}, {result['longitude']:.6f})")
-            df_all.at[idx, 'latitude'] = result['latitude']
-            df_all.at[idx, 'longitude'] = result['longitude']
-            df_all.at[idx, 'geocode_accuracy'] = result['geocode_accuracy']
-            df_all.at[idx, 'geocode_source'] = result['geocode_source']
-            df_all.at[idx, 'geocode_display_name'] = result['display_name']
-            city_stats[city_sheet]['success'] += 1
         else:
             print(f"       ✗ Failed")
-            df_all.at[idx, 'geocode_accuracy'] = result['geocode_accuracy']
-            failed_count += 1
-            city_stats[city_sheet]['failed'] += 1
-
         print()
 
-    # Save results
-    print("\n4. Saving geocoded data...")
-
-    # Save comprehensive CSV
-    output_csv = 'All_Services_Geocoded_Complete.csv'
-    df_all.to_csv(output_csv, index=False)
-    print(f"   ✓ CSV: {output_csv}")
+    if previous is None:
+        for i, result in enumerate(results):
+            if result is not None:
+                report(i, result)
+
+    def record(j, result):
+        i = pending[j]
+        results[i] = result
+        journal.record(fingerprints[i], addresses[i], result)
+        report(i, result)
+
+    # Geocode
+    with metrics.timer('geocode', rows=len(pending)):
+        geocode_many(geolocator, [addresses[i] for i in pending],
+                     cache=cache, provider=provider, on_result=record)
+
+    # Failed rows keep only their accuracy tag
+    success = [bool(result['latitude']) for result in results]
+    for column, key in RESULT_COLUMNS.items():
+        values = [result[key] if ok or key == 'geocode_accuracy' else None
+                  for result, ok in zip(results, success)]
+        df_all[column] = (coordinates(values) if column in COORDINATE_COLUMNS
+                          else pd.Series(values, index=df_all.index, dtype=object))
+    df_all[FINGERPRINT_COLUMN] = fingerprints
+    # The fallback overwrites geocode_accuracy; incremental runs need the online outcome
+    df_all[ONLINE_STATUS_COLUMN] = df_all['geocode_accuracy']
+    metrics.count('rows.geocoded', sum(success))
+    metrics.count('rows.failed', len(success) - sum(success))
+
+    counts = pd.Series(success, index=df_all.index).groupby(
+        df_all['City_Sheet'], sort=False).agg(['size', 'sum'])
+    city_stats = {
+        city_sheet: {'total': int(total), 'success': int(ok), 'failed': int(total - ok)}
+        for city_sheet, total, ok in zip(counts.index, counts['size'], counts['sum'])
+    }
+
+    # Fall back to offline postcode/suburb centroids for anything unresolved
+    if use_gazetteer:
+        with metrics.timer('gazetteer_fallback'):
+            resolved = apply_fallback(df_all)
+        metrics.count('rows.gazetteer', resolved)
+        if verbose:
+            print(f"\n   📍 Gazetteer fallback resolved {resolved} rows offline")
+
+    # Flag plausible-but-wrong points for a targeted re-geocode
+    with metrics.timer('validate', rows=len(df_all)):
+        suspect = apply_validation(df_all)
+    metrics.count('rows.suspect', suspect)
+    if verbose and suspect:
+        print(f"   🔎 Validation marked {suspect} suspect rows "
+              f"(python geocode_validator.py --regeocode to re-geocode only those)")
+    return city_stats
+
+
+def save_outputs(df_all, sheet_names, output_dir='.'):
+    """
+    Write the CSV, record JSON, modality index, web payload and Excel outputs
+    The formats are written concurrently from one snapshot of df_all. Paths
+    are relative to output_dir. Returns seconds spent per format.
+    """
+    metrics = get_metrics()
+
+    def path(name):
+        return os.path.join(output_dir, name)
+
+    # Save modality bitmask index alongside the JSON (rows in the same order)
+    with metrics.timer('export.modality_index') as timer:
+        modality_index = ModalityIndex.build(df_all, vocabulary=previous_vocabulary(path(INDEX_PATH)))
+        modality_index.save(path(INDEX_PATH))
+    metrics.count('export.modality_index.bytes', os.path.getsize(path(INDEX_PATH)))
+
+    # CSV, record JSON, slim map index + detail shards, and Excel with a
+    # combined sheet plus one sheet per city
+    jobs = standard_jobs(path(OUTPUT_CSV), path(OUTPUT_JSON), path(OUTPUT_EXCEL),
+                         split_column='City_Sheet', sheet_names=sheet_names)
+    jobs['web'] = (export_web_payload, path(WEB_DIR), modality_index, None)
+    results, timings = export_all(df_all, jobs)
+    timings['modality_index'] = timer.seconds
+
+    print(f"   ✓ CSV: {path(OUTPUT_CSV)}")
+    print(f"   ✓ JSON: {path(OUTPUT_JSON)}")
+    print(f"   ✓ Modality index: {path(INDEX_PATH)} ({len(modality_index.vocabulary)} terms)")
+    report = results['web']
+    report['baseline'] = os.path.getsize(path(OUTPUT_JSON))
+    metrics.count('export.web.bytes', report['map_index']['raw'] + report['details']['raw']
+                  + report['clusters']['raw'] + report['search']['raw'])
+    print_report(report)
+    print(f"   ✓ Excel: {path(OUTPUT_EXCEL)}")
+    return timings
+
+
+def stream_registry(chunks, sheet_names, geolocator, cache, journal, output_dir='.',
+                    provider=None, use_gazetteer=True, previous=None):
+    """
+    Bounded-memory pipeline for registries too large to load at once
+    Each chunk is normalized, geocoded and appended to every output before
+    the next one is read, so memory follows the chunk size. The exceptions
+    grow with the registry: the compact per-row arrays of the modality and
+    map indexes, and the search index's postings (built in full at the end).
+    Writes the same files as save_outputs() and returns a RunSummary.
+    """
+    metrics = get_metrics()
+
+    def path(name):
+        return os.path.join(output_dir, name)
+
+    summary = RunSummary()
+    csv_out = CsvStream(path(OUTPUT_CSV))
+    json_out = JsonStream(path(OUTPUT_JSON))
+    xlsx_out = XlsxStream(path(OUTPUT_EXCEL), 'City_Sheet', sheet_names)
+    web = WebPayloadStream(path(WEB_DIR))
+    vocabulary = previous_vocabulary(path(INDEX_PATH))
+    modality_parts = []
+
+    chunks = iter(chunks)
+    while True:
+        with metrics.timer('load'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        chunk = chunk.reset_index(drop=True)
+        metrics.count('rows.loaded', len(chunk))
+
+        city_stats = geocode_registry(chunk, geolocator, cache, journal, provider=provider,
+                                      use_gazetteer=use_gazetteer, verbose=False, previous=previous)
+        summary.add(chunk, city_stats)
+
+        with metrics.timer('export.csv'):
+            csv_out.write(chunk)
+        with metrics.timer('export.json'):
+            json_out.write(chunk)
+        with metrics.timer('export.modality_index'):
+            part = ModalityIndex.build(chunk, vocabulary=vocabulary)
+            vocabulary = part.vocabulary
+            modality_parts.append(part)
+        with metrics.timer('export.web'):
+            web.add(chunk)
+        with metrics.timer('export.xlsx'):
+            xlsx_out.write(chunk)
+        print(f"   … {summary.total:,} rows geocoded and written", flush=True)
+
+    print("\n4. Finishing output files...")
+    with metrics.timer('export.csv'):
+        csv_out.close()
+    print(f"   ✓ CSV: {path(OUTPUT_CSV)}")
+    with metrics.timer('export.json'):
+        json_out.close()
+    print(f"   ✓ JSON: {path(OUTPUT_JSON)}")
+    with metrics.timer('export.modality_index'):
+        modality_index = ModalityIndex.concat(modality_parts)
+        modality_index.save(path(INDEX_PATH))
+    print(f"   ✓ Modality index: {path(INDEX_PATH)} ({len(modality_index.vocabulary)} terms)")
+    with metrics.timer('export.web'):
+        report = web.close(modality_index, baseline_path=path(OUTPUT_JSON))
+    print_report(report)
+    with metrics.timer('export.xlsx'):
+        xlsx_out.close()
+    print(f"   ✓ Excel: {path(OUTPUT_EXCEL)}")
+    return summary
+
+
+class RunSummary:
+    """Totals for the end-of-run report, accumulated one frame or chunk at a time"""
+
+    MAX_FAILED_LISTED = 100
+
+    def __init__(self):
+        self.total = 0
+        self.successful = 0
+        self.accuracy = Counter()
+        self.city_stats = {}
+        self.failed = []
+
+    def add(self, df, city_stats):
+        resolved = df['latitude'].notna()
+        self.total += len(df)
+        self.successful += int(resolved.sum())
+        self.accuracy.update(df['geocode_accuracy'].value_counts().to_dict())
+        for city_sheet, stats in city_stats.items():
+            totals = self.city_stats.setdefault(city_sheet, {'total': 0, 'success': 0, 'failed': 0})
+            for key, value in stats.items():
+                totals[key] += value
+        room = self.MAX_FAILED_LISTED - len(self.failed)
+        if room > 0:
+            failed_df = df.loc[~resolved, ['City_Sheet', 'Name']].head(room)
+            self.failed.extend(failed_df.itertuples(index=False, name=None))
+
+    @property
+    def failed_count(self):
+        return self.total - self.successful
 
-    # Save JSON for web app
-    output_json = 'data/all_services_geocoded_complete.json'
-    df_json = df_all.to_dict('records')
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(df_json, f, indent=2, ensure_ascii=False)
-    print(f"   ✓ JSON: {output_json}")
 
-    # Save Excel with all geocoded data
-    output_excel = 'Data_final_cleaned_geocoded.xlsx'
-    with pd.ExcelWriter(output_excel, engine='openpyxl') as writer:
-        # Save combined sheet
-        df_all.to_excel(writer, sheet_name='All_Cities_Combined', index=False)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--resume', action='store_true',
+                        help='skip rows already completed in the checkpoint journal')
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help='re-parse the workbook instead of using the cached snapshot')
+    parser.add_argument('--offline', action='store_true',
+                        help='no network: use cached geocodes and the offline gazetteer only')
+    parser.add_argument('--no-gazetteer', action='store_true',
+                        help='leave failed rows empty instead of using gazetteer centroids')
+    parser.add_argument('--stream', action='store_true',
+                        help='process the registry in chunks with bounded memory (for very large registries)')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='rows per chunk in --stream mode')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='geocode shards of the registry in this many processes '
+                             '(provider quotas stay global)')
+    parser.add_argument('--shard-by', choices=['sheet', 'state'], default='sheet',
+                        help='how --workers splits the registry')
+    parser.add_argument('--max-shard-rows', type=int, default=None,
+                        help='split shards larger than this for --workers')
+    parser.add_argument('--incremental', action='store_true',
+                        help='geocode only rows added or edited since the previous output; '
+                             'carry the rest forward')
+    args = parser.parse_args()
+    if args.stream and args.workers > 1:
+        parser.error('--workers and --stream cannot be combined')
+    metrics = start_run('geocode_complete_dataset')
 
-        # Save individual city sheets
-        for city_sheet in xl.sheet_names:
-            city_df = df_all[df_all['City_Sheet'] == city_sheet]
-            city_df.to_excel(writer, sheet_name=city_sheet, index=False)
+    print("🗺️  Geocoding ALL Australian Integrative Oncology Services")
+    print("=" * 70)
+    print("Source: Data_final_cleaned.xlsx (7 cities, 185 services)")
+    print("=" * 70)
 
-    print(f"   ✓ Excel: {output_excel}")
+    # Initialize geocoder
+    # Hedged provider chain (GEOCODER_CHAIN, GEOCODER_HEDGE_MS); the gazetteer
+    # fallback is its offline last tier
+    geolocator = None if args.offline else ProviderChain("integrative-oncology-australia-research-v1.0")
+    cache = GeocodeCache()
+    journal = CheckpointJournal(CHECKPOINT_PATH, resume=args.resume)
+    previous = None
+    if args.incremental:
+        # Read before any output is rewritten
+        with metrics.timer('load_previous'):
+            previous = PreviousSnapshot.load(OUTPUT_CSV, RESULT_COLUMNS)
+        if previous is None:
+            print(f"   ⚠️  No previous output at {OUTPUT_CSV} - geocoding everything")
+        else:
+            print(f"   ↻ Incremental run against {OUTPUT_CSV} ({len(previous)} services)")
+
+    if args.stream:
+        print(f"\n1. Streaming all city sheets in chunks of {args.chunk_size:,} rows...")
+        sheet_names, chunks, from_snapshot = iter_registry(
+            WORKBOOK_PATH, args.chunk_size, use_snapshot=not args.no_snapshot)
+        metrics.count('load.from_snapshot', int(from_snapshot))
+        print(f"   ✓ {len(sheet_names)} sheets: {', '.join(sheet_names)}")
+        print("\n2. Geocoder ready: " + ("offline, cache + gazetteer only" if args.offline
+                                         else f"{geolocator.name} → gazetteer"))
+        print("\n3. Geocoding and writing chunk by chunk...\n")
+        summary = stream_registry(chunks, sheet_names, geolocator, cache, journal,
+                                  use_gazetteer=not args.no_gazetteer, previous=previous)
+        journal.close()
+    else:
+        # Load all sheets
+        print("\n1. Loading data from all city sheets...")
+        with metrics.timer('load'):
+            df_all, sheet_names, from_snapshot = load_registry(WORKBOOK_PATH, use_snapshot=not args.no_snapshot,
+                                                               workers=args.workers)
+        metrics.count('rows.loaded', len(df_all))
+        metrics.count('load.from_snapshot', int(from_snapshot))
+        if from_snapshot:
+            print("   ↻ Workbook unchanged - loaded cached snapshot")
+
+        sheet_counts = df_all.groupby('City_Sheet', sort=False).size()
+        for sheet_name in sheet_names:
+            print(f"   ✓ {sheet_name}: {sheet_counts.get(sheet_name, 0)} records")
+
+        print(f"\n   📊 Total services loaded: {len(df_all)}")
+
+        print("\n2. Initializing geocoder...")
+        print("   ✓ Offline mode: cache + gazetteer only" if args.offline
+              else f"   ✓ Geocoder chain ready: {geolocator.name} → gazetteer "
+                   f"(hedged after {geolocator.hedge_after:g}s)")
+
+        # Geocode all services
+        print(f"\n3. Geocoding {len(df_all)} services...")
+        print(f"   ⏱️  Estimated time: up to ~{len(df_all) / 60:.1f} minutes (cached addresses are instant)")
+        print("   (Respecting the provider's rate limit)\n")
+
+        if args.workers > 1:
+            from parallel_pipeline import geocode_parallel
+            print(f"   🔀 {args.workers} worker processes, sharded by {args.shard_by}\n")
+            city_stats = geocode_parallel(df_all, args.workers, offline=args.offline,
+                                          use_gazetteer=not args.no_gazetteer, previous=previous,
+                                          resume=args.resume, shard_by=args.shard_by,
+                                          max_rows=args.max_shard_rows)
+        else:
+            city_stats = geocode_registry(df_all, geolocator, cache, journal,
+                                          use_gazetteer=not args.no_gazetteer, previous=previous)
+        journal.close()
+        if geolocator is not None:
+            geolocator.close()  # the exporters fork only once no request threads are left
+
+        # Save results
+        print("\n4. Saving geocoded data...")
+        save_outputs(df_all, sheet_names)
+        summary = RunSummary()
+        summary.add(df_all, city_stats)
 
     # Summary
-    total = len(df_all)
-    successful = len(df_all[df_all['latitude'].notna()])
-    failed = len(df_all[df_all['latitude'].isna()])
+    total = summary.total
+    successful = summary.successful
+    failed = summary.failed_count
 
     print("\n" + "=" * 70)
     print("📊 GEOCODING SUMMARY")
@@ -200,26 +400,41 @@ def main():
     print(f"Total services:        {total}")
     print(f"Successfully geocoded: {successful}")
     print(f"Failed to geocode:     {failed}")
-    print(f"Success rate:          {(successful / total * 100):.1f}%")
+    print(f"Success rate:          {(successful / total * 100 if total else 0):.1f}%")
+    for accuracy, count in summary.accuracy.most_common():
+        print(f"   {accuracy:20s} {count}")
+    if args.workers <= 1:
+        cache.print_stats()  # worker processes report theirs through the metrics
+    cache.close()
+    if geolocator is not None:
+        geolocator.close()
 
     # City breakdown
     print("\n📍 Results by city:")
-    for city_sheet, stats in city_stats.items():
+    for city_sheet, stats in summary.city_stats.items():
         city_name = city_sheet.replace('_clean', '')
         success_rate = (stats['success'] / stats['total'] * 100) if stats['total'] > 0 else 0
         print(f"   {city_name:15s} {stats['success']:3d}/{stats['total']:3d} geocoded ({success_rate:.0f}%)")
 
+    if previous is not None:
+        metrics.count('rows.removed', previous.removed)
+        print(f"\n↻ Incremental: {previous.removed} services removed since the previous output")
+
     if failed > 0:
         print(f"\n⚠️  {failed} addresses failed - may need manual review")
-        failed_df = df_all[df_all['latitude'].isna()]
-        for idx, row in failed_df.iterrows():
-            print(f"   - [{row['City_Sheet'].replace('_clean', '')}] {row['Name']}")
+        for city_sheet, name in summary.failed:
+            print(f"   - [{city_sheet.replace('_clean', '')}] {name}")
+        if failed > len(summary.failed):
+            print(f"   ... and {failed - len(summary.failed)} more")
 
     print("\n✅ Geocoding complete!")
     print(f"\n📁 Output files:")
-    print(f"   - {output_csv} (185 records, ready for analysis)")
-    print(f"   - {output_json} (for web application)")
-    print(f"   - {output_excel} (with all sheets + combined)")
+    print(f"   - {OUTPUT_CSV} (185 records, ready for analysis)")
+    print(f"   - {OUTPUT_JSON} (for web application)")
+    print(f"   - {INDEX_PATH} (modality filters for the web application)")
+    print(f"   - {WEB_DIR}/ (compact map index + detail shards, gzip/brotli)")
+    print(f"   - {OUTPUT_EXCEL} (with all sheets + combined)")
+    metrics.finish()
 
 if __name__ == '__main__':
     main()
@@ -5,104 +5,56 @@ Adds latitude and longitude coordinates to all service addresses
 """
 
 import pandas as pd
-import time
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-import json
-
-def geocode_address(geolocator, address, max_retries=3):
-    """
-    Geocode an address with retry logic
-    """
-    for attempt in range(max_retries):
-        try:
-            # Add delay to respect rate limits (1 request per second)
-            time.sleep(1.1)
-
-            location = geolocator.geocode(address, timeout=10)
-
-            if location:
-                return {
-                    'latitude': location.latitude,
-                    'longitude': location.longitude,
-                    'geocode_accuracy': 'high',
-                    'geocode_source': 'Nominatim',
-                    'display_name': location.address
-                }
-            else:
-                return {
-                    'latitude': None,
-                    'longitude': None,
-                    'geocode_accuracy': 'failed',
-                    'geocode_source': 'Nominatim',
-                    'display_name': None
-                }
-
-        except (GeocoderTimedOut, GeocoderServiceError) as e:
-            print(f"  ⚠️  Attempt {attempt + 1} failed: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(2)  # Wait before retry
-                continue
-            else:
-                return {
-                    'latitude': None,
-                    'longitude': None,
-                    'geocode_accuracy': 'error',
-                    'geocode_source': 'Nominatim',
-                    'display_name': None
-                }
+from exporters import export_all, standard_jobs
+from geocoding import GeocodeCache, geocode_many, make_geolocator
+from instrumentation import start_run
+from preprocess import prepare_addresses
 
 def main():
+    metrics = start_run('geocode_services')
     print("🗺️  Integrative Oncology Services Geocoding")
     print("=" * 60)
 
     # Initialize geocoder
     print("\n1. Initializing geocoder...")
-    geolocator = Nominatim(
-        user_agent="integrative-oncology-services-research-v1.0",
-        timeout=10
-    )
+    geolocator = make_geolocator("integrative-oncology-services-research-v1.0")
+    cache = GeocodeCache()
     print("   ✓ Nominatim geocoder initialized")
 
     # Load data
     print("\n2. Loading service data...")
-    df = pd.read_csv('data/integrative_oncology_services.csv')
+    with metrics.timer('load'):
+        df = pd.read_csv('data/integrative_oncology_services.csv')
+    metrics.count('rows.loaded', len(df))
     print(f"   ✓ Loaded {len(df)} services")
 
     # Prepare geocoding
     print("\n3. Starting geocoding process...")
-    print("   Note: This will take ~25 seconds (respecting 1 req/sec rate limit)")
+    print("   Note: Uncached addresses take ~1 second each (1 req/sec rate limit)")
     print()
 
-    geocoded_results = []
-    failed_count = 0
-
-    for idx, row in df.iterrows():
-        # Construct full address
-        address_parts = [
-            str(row['Address']) if pd.notna(row['Address']) else '',
-            str(row['Suburb']) if pd.notna(row['Suburb']) else '',
-            'SA' if pd.notna(row['Suburb']) else '',  # Assuming South Australia for now
-            str(int(row['Postcode'])) if pd.notna(row['Postcode']) else '',
-            'Australia'
-        ]
-        full_address = ', '.join([p for p in address_parts if p])
-
-        print(f"   [{idx + 1}/{len(df)}] Geocoding: {row['Name'][:40]}...")
-        print(f"       Address: {full_address[:70]}")
+    # Construct full addresses (assuming South Australia for now)
+    with metrics.timer('address_build', rows=len(df)):
+        state = pd.Series('SA', index=df.index).where(df['Suburb'].notna(), '')
+        addresses = prepare_addresses(df, state=state)['full_address'].tolist()
 
-        # Geocode
-        geocode_result = geocode_address(geolocator, full_address)
+    failed_count = 0
 
+    def report(i, geocode_result):
+        nonlocal failed_count
+        print(f"   [{i + 1}/{len(df)}] Geocoding: {df['Name'].iloc[i][:40]}...")
+        print(f"       Address: {addresses[i][:70]}")
         if geocode_result['latitude']:
             print(f"       ✓ Success: ({geocode_result['latitude']:.6f}, {geocode_result['longitude']:.6f})")
         else:
             print(f"       ✗ Failed to geocode")
             failed_count += 1
-
-        geocoded_results.append(geocode_result)
         print()
 
+    # Geocode
+    with metrics.timer('geocode', rows=len(addresses)):
+        geocoded_results = geocode_many(geolocator, addresses, cache=cache, on_result=report)
+
     # Add geocoding results to dataframe
     print("\n4. Adding coordinates to dataset...")
     df['latitude'] = [r['latitude'] for r in geocoded_results]
@@ -114,21 +66,13 @@ def main():
     # Save geocoded data
     print("\n5. Saving geocoded data...")
 
-    # Save as CSV
+    # CSV, JSON for the web application and Excel, written concurrently
     output_csv = 'data/services_geocoded.csv'
-    df.to_csv(output_csv, index=False)
-    print(f"   ✓ Saved CSV: {output_csv}")
-
-    # Save as JSON for web application
     output_json = 'data/services_geocoded.json'
-    df_json = df.to_dict('records')
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(df_json, f, indent=2, ensure_ascii=False)
-    print(f"   ✓ Saved JSON: {output_json}")
-
-    # Save Excel with geocoded data
     output_excel = 'Data_geocoded.xlsx'
-    df.to_excel(output_excel, index=False, engine='openpyxl')
+    export_all(df, standard_jobs(output_csv, output_json, output_excel))
+    print(f"   ✓ Saved CSV: {output_csv}")
+    print(f"   ✓ Saved JSON: {output_json}")
     print(f"   ✓ Saved Excel: {output_excel}")
 
     # Print summary
@@ -139,6 +83,8 @@ def main():
     print(f"Successfully geocoded: {len(df) - failed_count}")
     print(f"Failed to geocode:     {failed_count}")
     print(f"Success rate:          {((len(df) - failed_count) / len(df) * 100):.1f}%")
+    cache.print_stats()
+    cache.close()
 
     if failed_count > 0:
         print("\n⚠️  Failed addresses:")
@@ -153,6 +99,7 @@ def main():
     print(f"   - {output_json}")
     print(f"   - {output_excel}")
     print("\n🚀 Ready to build the application!")
+    metrics.finish()
 
 if __name__ == '__main__':
     main()
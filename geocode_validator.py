@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Batch quality checks for geocoded coordinates
+Nominatim often returns a plausible but wrong point (e.g. "Port Road,
+Adelaide 5000" resolves to Port Road, Hindmarsh 5007). After geocoding,
+every row is checked column-wise against:
+  - the outline of its declared state (data/state_boundaries.json; a fuller
+    boundary file with the same GeoJSON layout can be dropped in its place)
+  - its distance from the declared postcode's gazetteer centroid (only
+    centroids from independent sources; those derived from the registry's
+    own geocodes would partly be built from the point under test)
+  - the postcode and suburb named in geocode_display_name
+Findings are written to geocode_flags and rows that are probably wrong are
+marked with geocode_suspect, so only those are re-geocoded (--regeocode)
+instead of re-running the whole job.
+"""
+
+import argparse
+import json
+import numpy as np
+import pandas as pd
+from gazetteer import get_gazetteer
+from preprocess import coerce_postcodes
+from schema import load_services
+from service_index import haversine_km
+
+BOUNDARIES_PATH = 'data/state_boundaries.json'
+GEOCODED_JSON = 'data/all_services_geocoded_complete.json'
+
+# Points this close to their state's outline still count as inside it; the
+# outlines are simplified, so border towns would otherwise be flagged
+BOUNDARY_TOLERANCE_KM = 5.0
+# Beyond this distance from the declared postcode's centroid a point is suspect
+MAX_CENTROID_KM = 25.0
+# A display name in a different postcode is only suspect this far from the
+# declared centroid; neighbouring postcodes often share a street
+MISMATCH_CENTROID_KM = 2.0
+
+FLAGS = ['outside_state', 'far_from_postcode', 'postcode_mismatch', 'suburb_mismatch']
+
+SUBURB_ABBREVIATIONS = {r'\bmt\b': 'mount', r'\bst\b': 'saint', r'\bnth\b': 'north',
+                        r'\bsth\b': 'south'}
+
+
+def load_boundaries(path=BOUNDARIES_PATH):
+    """{state: [ring arrays of (lon, lat)]} from a GeoJSON FeatureCollection"""
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+    boundaries = {}
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        polygons = (geometry['coordinates'] if geometry['type'] == 'MultiPolygon'
+                    else [geometry['coordinates']])
+        rings = boundaries.setdefault(feature['properties']['state'], [])
+        rings.extend(np.asarray(polygon[0], dtype=np.float64) for polygon in polygons)
+    return boundaries
+
+
+def points_in_rings(lat, lon, rings):
+    """Even-odd point-in-polygon test of every point against any of the rings"""
+    inside = np.zeros(len(lat), dtype=bool)
+    for ring in rings:
+        x0, y0 = ring[:-1, 0], ring[:-1, 1]
+        x1, y1 = ring[1:, 0], ring[1:, 1]
+        crossings = np.zeros(len(lat), dtype=bool)
+        for ax, ay, bx, by in zip(x0, y0, x1, y1):
+            if ay == by:
+                continue
+            straddles = (ay > lat) != (by > lat)
+            x_cross = ax + (lat - ay) * (bx - ax) / (by - ay)
+            crossings ^= straddles & (lon < x_cross)
+        inside |= crossings
+    return inside
+
+
+def distance_to_rings_km(lat, lon, rings):
+    """Approximate distance from each point to the nearest ring edge (km)"""
+    best = np.full(len(lat), np.inf)
+    scale = np.cos(np.radians(lat))  # local equirectangular projection
+    for ring in rings:
+        ax, ay = ring[:-1, 0][:, None], ring[:-1, 1][:, None]
+        dx, dy = (ring[1:, 0] - ring[:-1, 0])[:, None], (ring[1:, 1] - ring[:-1, 1])[:, None]
+        px = (lon[None, :] - ax) * scale
+        py = lat[None, :] - ay
+        ex = dx * scale
+        t = np.clip((px * ex + py * dy) / np.maximum(ex ** 2 + dy ** 2, 1e-12), 0, 1)
+        gap = np.hypot(px - t * ex, py - t * dy).min(axis=0) * 111.2
+        best = np.minimum(best, gap)
+    return best
+
+
+def _postcode4(values):
+    postcodes = coerce_postcodes(values)
+    return postcodes.where(postcodes == '', postcodes.str.zfill(4))
+
+
+def _normalize_place(values):
+    text = pd.Series(values).fillna('').astype(str).str.lower()
+    for pattern, replacement in SUBURB_ABBREVIATIONS.items():
+        text = text.str.replace(pattern, replacement, regex=True)
+    return text.str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+
+
+def validate_frame(df, gazetteer=None, boundaries=None, max_centroid_km=MAX_CENTROID_KM,
+                   mismatch_centroid_km=MISMATCH_CENTROID_KM, tolerance_km=BOUNDARY_TOLERANCE_KM):
+    """
+    Check every geocoded row of a registry frame in one pass
+    Returns a frame aligned with df with one boolean column per flag,
+    centroid_km (NaN where the postcode has no independent centroid),
+    flags (the ';'-joined flag names) and suspect. Rows without
+    coordinates are not flagged.
+    """
+    gazetteer = gazetteer or get_gazetteer()
+    boundaries = boundaries if boundaries is not None else load_boundaries()
+    lat = pd.to_numeric(df['latitude'], errors='coerce').to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df['longitude'], errors='coerce').to_numpy(dtype=np.float64)
+    located = ~(np.isnan(lat) | np.isnan(lon))
+    state = df['State'].fillna('').astype(str).to_numpy()
+
+    # State outline, with a tolerance band for the simplified borders
+    outside = np.zeros(len(df), dtype=bool)
+    for name in np.unique(state[located]):
+        rows = np.flatnonzero(located & (state == name))
+        if name not in boundaries:
+            continue
+        missed = rows[~points_in_rings(lat[rows], lon[rows], boundaries[name])]
+        if len(missed):
+            far = distance_to_rings_km(lat[missed], lon[missed], boundaries[name]) > tolerance_km
+            outside[missed[far]] = True
+
+    # Distance from the declared postcode's centroid; postcodes without an
+    # independent centroid are not checked
+    postcode = _postcode4(df['Postcode'])
+    centroids = coerce_postcodes(df['Postcode']).map(gazetteer.reference_postcodes)
+    known = centroids.notna().to_numpy()
+    centroid_km = np.full(len(df), np.nan)
+    if known.any():
+        c_lat, c_lon = np.array([value[:2] for value in centroids[known]], dtype=np.float64).T
+        centroid_km[known] = haversine_km(lat[known], lon[known], c_lat, c_lon)
+    far_from_postcode = located & (centroid_km > max_centroid_km)
+
+    # Postcode and suburb named by the geocoder
+    display = df['geocode_display_name'].fillna('').astype(str)
+    display_postcode = display.str.findall(r'\b(\d{4})\b').str[-1].fillna('').to_numpy()
+    postcode = postcode.to_numpy()
+    postcode_mismatch = located & (postcode != '') & (display_postcode != '') & (display_postcode != postcode)
+    suburb = _normalize_place(df['Suburb']).to_numpy().astype(str)
+    display_text = (' ' + _normalize_place(display) + ' ').to_numpy().astype(str)
+    suburb_mismatch = (located & (suburb != '') & (display != '').to_numpy()
+                       & (np.char.find(display_text, np.char.add(np.char.add(' ', suburb), ' ')) < 0))
+
+    # A different postcode alone is common near boundaries; it is suspect when
+    # the point is also away from the declared centroid or in another suburb
+    suspect = (outside | far_from_postcode
+               | (postcode_mismatch & ((np.nan_to_num(centroid_km) > mismatch_centroid_km)
+                                       | suburb_mismatch)))
+
+    result = pd.DataFrame({
+        'outside_state': outside,
+        'far_from_postcode': far_from_postcode,
+        'postcode_mismatch': postcode_mismatch,
+        'suburb_mismatch': suburb_mismatch,
+        'centroid_km': centroid_km
+    }, index=df.index)
+    flags = np.full(len(df), '', dtype=object)
+    for flag in FLAGS:
+        flags = flags + np.where(result[flag].to_numpy(), flag + ';', '')
+    result['flags'] = pd.Series(flags, index=df.index).str.rstrip(';')
+    result['suspect'] = suspect
+    return result
+
+
+def apply_validation(df, gazetteer=None, boundaries=None):
+    """
+    Add geocode_flags and geocode_suspect to a registry frame, in place
+    Returns the number of suspect rows
+    """
+    result = validate_frame(df, gazetteer, boundaries)
+    df['geocode_flags'] = result['flags']
+    df['geocode_suspect'] = result['suspect']
+    return int(result['suspect'].sum())
+
+
+def targeted_queries(df):
+    """
+    Alternative address strings for re-geocoding suspect rows, most specific
+    first: the organisation (or the name in brackets) in the declared
+    suburb, then the street within the declared postcode
+    """
+    postcode = _postcode4(df['Postcode'])
+    place = (df['Suburb'].fillna('').astype(str).str.strip() + ' ' + df['State'].fillna('').astype(str)
+             + ' ' + postcode).str.split().str.join(' ')
+    organization = df['Organization'].fillna('').astype(str).str.strip()
+    bracketed = df['Name'].fillna('').astype(str).str.extract(r'\(([^)]+)\)', expand=False).fillna('')
+    venue = organization.where(organization != '', bracketed)
+    street = df['Address'].fillna('').astype(str).str.strip()
+    return pd.DataFrame({
+        'venue': (venue + ', ' + place + ', Australia').where(venue != '', None),
+        'street': (street + ', ' + place + ', Australia').where(street != '', None)
+    }, index=df.index)
+
+
+def regeocode_suspects(df, geolocator, cache, gazetteer=None, boundaries=None):
+    """
+    Re-geocode only the suspect rows with targeted queries, in place
+    A candidate replaces the row's point only if it passes validation;
+    accepted rows get geocode_accuracy 'targeted'. Returns the number of
+    rows fixed.
+    """
+    from geocoding import geocode_many
+    gazetteer = gazetteer or get_gazetteer()
+    boundaries = boundaries if boundaries is not None else load_boundaries()
+    fixed = 0
+    for column in ['venue', 'street']:
+        suspects = df[df['geocode_suspect'].astype(bool)]
+        if suspects.empty:
+            break
+        queries = targeted_queries(suspects)[column].dropna()
+        if queries.empty:
+            continue
+        results = geocode_many(geolocator, queries.tolist(), cache=cache)
+        candidates = suspects.loc[queries.index].copy()
+        candidates['latitude'] = [result['latitude'] for result in results]
+        candidates['longitude'] = [result['longitude'] for result in results]
+        candidates['geocode_display_name'] = [result['display_name'] for result in results]
+        candidates['geocode_source'] = [result['geocode_source'] for result in results]
+        checked = validate_frame(candidates, gazetteer, boundaries)
+        accepted = candidates.index[candidates['latitude'].notna() & ~checked['suspect']]
+        for column_name in ['latitude', 'longitude', 'geocode_source', 'geocode_display_name']:
+            df.loc[accepted, column_name] = candidates.loc[accepted, column_name]
+        df.loc[accepted, 'geocode_accuracy'] = 'targeted'
+        df.loc[accepted, 'geocode_flags'] = checked.loc[accepted, 'flags']
+        df.loc[accepted, 'geocode_suspect'] = False
+        fixed += len(accepted)
+    return fixed
+
+
+def print_report(df, limit=50):
+    """Print the flagged rows, suspect ones first"""
+    flagged = df[df['geocode_flags'].fillna('') != '']
+    flagged = flagged.sort_values('geocode_suspect', ascending=False, kind='stable')
+    for _, row in flagged.head(limit).iterrows():
+        marker = '⚠️ ' if row['geocode_suspect'] else '  ·'
+        print(f"   {marker} {str(row['Name'])[:45]:45s} {row['geocode_flags']}")
+        print(f"        declared {row['Suburb']} {row['State']} {row['Postcode']} → "
+              f"{str(row['geocode_display_name'])[:70]}")
+    if len(flagged) > limit:
+        print(f"   ... and {len(flagged) - limit} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', default=GEOCODED_JSON, help='geocoded registry to check')
+    parser.add_argument('--regeocode', action='store_true',
+                        help='re-geocode the suspect rows with targeted queries and rewrite the outputs')
+    args = parser.parse_args()
+
+    print("🔎 Validating geocoded coordinates")
+    df = load_services(args.json, compact=False)
+    suspect = apply_validation(df)
+    flagged = int((df['geocode_flags'] != '').sum())
+    print(f"   {df['latitude'].notna().sum()} located rows: {flagged} flagged, {suspect} suspect")
+    print_report(df)
+
+    if args.regeocode and suspect:
+        from geocode_complete_dataset import save_outputs
+        from geocoding import GeocodeCache, ProviderChain
+        from instrumentation import start_run
+        metrics = start_run('geocode_validator')
+        print(f"\n🔧 Re-geocoding {suspect} suspect rows with targeted queries")
+        cache = GeocodeCache()
+        with metrics.timer('geocode', rows=suspect):
+            chain = ProviderChain("integrative-oncology-australia-research-v1.0")
+            fixed = regeocode_suspects(df, chain, cache)
+            chain.close()
+        metrics.count('rows.targeted', fixed)
+        print(f"   ✓ {fixed} of {suspect} suspect rows replaced by validated points")
+        cache.print_stats()
+        cache.close()
+        if fixed:
+            save_outputs(df, list(dict.fromkeys(df['City_Sheet'])))
+        metrics.finish()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+"""
+Shared geocoding helpers for the integrative oncology services scripts
+Wraps Nominatim lookups with a persistent on-disk cache so re-runs only
+hit the network for addresses that have not been resolved before (cached
+per provider endpoint, so a local or mock server never answers for the
+public one), and a
+per-provider token-bucket rate limiter so lookups run concurrently when
+the provider allows it. Batches are deduplicated first, so services that
+share an address cost one lookup between them.
+
+A ProviderChain tries several providers in order (e.g. Nominatim, then
+Photon), each behind its own rate limiter, and hedges: a request the
+primary has not answered within the hedge budget is also sent to the next
+provider and the first match wins, so slow lookups cost the budget rather
+than the full timeout and its retries
+"""
+
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from multiprocessing import current_process
+from multiprocessing.managers import BaseManager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+from geopy.geocoders import Nominatim, Photon
+from instrumentation import get_metrics
+
+CACHE_PATH = '.cache/geocode_cache.sqlite'
+
+# Resolved addresses rarely move; unresolved ones are retried sooner in case
+# the upstream data (or our address string) has been fixed since.
+POSITIVE_TTL = 180 * 24 * 3600
+NEGATIVE_TTL = 7 * 24 * 3600
+
+# Per-provider quotas. The public Nominatim usage policy allows at most one
+# request per second; a self-hosted instance can take many more in parallel.
+# Select one with the GEOCODER_PROVIDER environment variable. 'geocoder'
+# picks the API (default 'nominatim').
+PROVIDERS = {
+    'nominatim': {
+        'domain': 'nominatim.openstreetmap.org',
+        'scheme': 'https',
+        'rate_per_sec': 1.0,
+        'burst': 1,
+        'max_workers': 1
+    },
+    'nominatim_local': {
+        'domain': os.environ.get('NOMINATIM_LOCAL_DOMAIN', 'localhost:8080'),
+        'scheme': 'http',
+        'rate_per_sec': 25.0,
+        'burst': 25,
+        'max_workers': 8
+    },
+    'photon': {
+        'geocoder': 'photon',
+        'domain': os.environ.get('PHOTON_DOMAIN', 'photon.komoot.io'),
+        'scheme': os.environ.get('PHOTON_SCHEME', 'https'),
+        'rate_per_sec': 1.0,
+        'burst': 1,
+        'max_workers': 1
+    }
+}
+DEFAULT_PROVIDER = os.environ.get('GEOCODER_PROVIDER', 'nominatim')
+
+# geopy class and the geocode_source label for each API
+GEOCODERS = {
+    'nominatim': (Nominatim, 'Nominatim'),
+    'photon': (Photon, 'Photon')
+}
+
+# Provider chain (comma-separated, most preferred first) and how long a
+# sent request may go unanswered before it is hedged to the next provider
+DEFAULT_CHAIN = os.environ.get('GEOCODER_CHAIN', f'{DEFAULT_PROVIDER},photon').split(',')
+HEDGE_AFTER = float(os.environ.get('GEOCODER_HEDGE_MS', 2000)) / 1000
+REQUEST_TIMEOUT = 10
+
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 16.0
+
+
+def normalize_address(address):
+    """Normalize an address string into a cache key"""
+    key = str(address).lower().strip()
+    key = re.sub(r'\s*,\s*', ', ', key)
+    key = re.sub(r'\s+', ' ', key)
+    return key.strip(', ')
+
+
+def provider_endpoint(provider=None):
+    """Base URL of a configured provider"""
+    config = PROVIDERS[provider or DEFAULT_PROVIDER]
+    return f"{config['scheme']}://{config['domain']}"
+
+
+def geolocator_endpoint(geolocator):
+    """Base URL a geopy geolocator sends its requests to"""
+    return f'{geolocator.scheme}://{geolocator.domain}'
+
+
+def empty_result(accuracy, source='Nominatim'):
+    """Result dict for an address that could not be geocoded"""
+    return {
+        'latitude': None,
+        'longitude': None,
+        'geocode_accuracy': accuracy,
+        'geocode_source': source,
+        'display_name': None
+    }
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter
+    Callers only wait when the bucket is empty, i.e. the quota is exhausted
+    """
+
+    def __init__(self, rate_per_sec, burst=1):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.acquired = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.acquired += 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def reserve(self):
+        """
+        Take the next token even if it is not available yet and return the
+        seconds the caller must wait before using it; for callers in other
+        processes, which sleep on their own side
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            self.acquired += 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class SharedTokenBucket:
+    """
+    Client for a TokenBucket held by a LimiterService in another process
+    Every process using the service draws from the same bucket, so a
+    provider's quota holds across a process pool; acquired counts this
+    process's requests only
+    """
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.acquired = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        wait = self.proxy.reserve()
+        with self.lock:
+            self.acquired += 1
+        if wait > 0:
+            time.sleep(wait)
+
+
+class LimiterService(BaseManager):
+    """Serves the rate limiters of the process that started it to other processes"""
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_limiter_service = None  # connected LimiterService in worker processes
+
+
+def get_rate_limiter(provider=None):
+    """Return the shared rate limiter for a provider"""
+    provider = provider or DEFAULT_PROVIDER
+    with _limiters_lock:
+        if provider not in _limiters:
+            if _limiter_service is not None:
+                _limiters[provider] = SharedTokenBucket(_limiter_service.limiter(provider))
+            else:
+                config = PROVIDERS[provider]
+                _limiters[provider] = TokenBucket(config['rate_per_sec'], config['burst'])
+        return _limiters[provider]
+
+
+LimiterService.register('limiter', callable=get_rate_limiter, exposed=('reserve',))
+
+
+def start_limiter_service():
+    """
+    Start a LimiterService process holding one token bucket per provider
+    Returns (service, address, authkey); pass the last two to
+    use_limiter_service() in each worker and call service.shutdown() when done
+    """
+    authkey = bytes(current_process().authkey)
+    service = LimiterService(authkey=authkey)
+    service.start()
+    return service, service.address, authkey
+
+
+def use_limiter_service(address, authkey):
+    """Route this process's rate limiters through a running LimiterService"""
+    global _limiter_service
+    service = LimiterService(address=address, authkey=authkey)
+    service.connect()
+    with _limiters_lock:
+        _limiter_service = service
+        _limiters.clear()
+
+
+def make_geolocator(user_agent, provider=None):
+    """Create a geopy geolocator for the configured provider"""
+    config = PROVIDERS[provider or DEFAULT_PROVIDER]
+    geocoder, _ = GEOCODERS[config.get('geocoder', 'nominatim')]
+    return geocoder(
+        user_agent=user_agent,
+        domain=config['domain'],
+        scheme=config['scheme'],
+        timeout=REQUEST_TIMEOUT
+    )
+
+
+def provider_label(provider=None):
+    """geocode_source value for results from a provider"""
+    return GEOCODERS[PROVIDERS[provider or DEFAULT_PROVIDER].get('geocoder', 'nominatim')][1]
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff delay for a retry attempt"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+class GeocodeCache:
+    """
+    Persistent SQLite cache of geocoding results keyed by provider endpoint
+    and normalized address
+    Stores both positive and negative (not found) results with separate TTLs.
+    Lookups pass the endpoint that would answer them (for a chain, its
+    primary provider); offline lookups use `endpoint`, by default the
+    configured chain's primary. Entries from before endpoints were part of
+    the key are never matched.
+    """
+
+    def __init__(self, path=CACHE_PATH, positive_ttl=POSITIVE_TTL,
+                 negative_ttl=NEGATIVE_TTL, endpoint=None):
+        self.path = path
+        self.endpoint = endpoint or provider_endpoint(DEFAULT_CHAIN[0])
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        # Worker processes of a parallel run share the file; wait out their writes
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS geocode_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' address TEXT,'
+            ' found INTEGER,'
+            ' result TEXT,'
+            ' created_at REAL)'
+        )
+        self.conn.commit()
+
+    def key(self, address, endpoint=None):
+        return f'{endpoint or self.endpoint} {normalize_address(address)}'
+
+    def get(self, address, endpoint=None):
+        """Return the cached result for an address, or None on a miss"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT found, result, created_at FROM geocode_cache WHERE key = ?',
+                (self.key(address, endpoint),)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            found, result, created_at = row
+            ttl = self.positive_ttl if found else self.negative_ttl
+            if time.time() - created_at > ttl:
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return json.loads(result)
+
+    def put(self, address, result, endpoint=None):
+        """Store a geocoding result; transient errors are never cached"""
+        if result['geocode_accuracy'] == 'error':
+            return
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?)',
+                (self.key(address, endpoint), address,
+                 1 if result['latitude'] is not None else 0,
+                 json.dumps(result), time.time())
+            )
+            self.conn.commit()
+            self.writes += 1
+
+    def stats(self):
+        """Hit/miss statistics for this session"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'writes': self.writes,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def print_stats(self):
+        """Print a one-line cache summary"""
+        s = self.stats()
+        print(f"   Geocode cache: {s['hits']} hits, {s['misses']} misses "
+              f"({s['hit_rate'] * 100:.0f}% hit rate), {s['expired']} expired")
+
+    def close(self):
+        self.conn.close()
+
+
+def _query(geolocator, address, source='Nominatim'):
+    """
+    One request to a provider; returns a found or 'failed' result
+    Provider errors (timeouts, 429/5xx) are raised to the caller
+    """
+    metrics = get_metrics()
+    metrics.count('geocode.requests')
+    start = time.perf_counter()
+    try:
+        location = geolocator.geocode(address, timeout=REQUEST_TIMEOUT)
+    finally:
+        metrics.observe('geocode.request_ms', (time.perf_counter() - start) * 1000)
+    if not location:
+        return empty_result('failed', source)
+    return {
+        'latitude': location.latitude,
+        'longitude': location.longitude,
+        'geocode_accuracy': 'high',
+        'geocode_source': source,
+        'display_name': location.address
+    }
+
+
+def _record_error(address, attempt, error):
+    metrics = get_metrics()
+    metrics.count(f'geocode.error.{type(error).__name__}')
+    metrics.emit('geocode_error', address=address, attempt=attempt,
+                 error=type(error).__name__, message=str(error))
+
+
+def geocode_address(geolocator, address, max_retries=3, cache=None, limiter=None,
+                    source='Nominatim'):
+    """
+    Geocode an address with retry logic
+    Checks the cache first; network requests wait on the provider's rate
+    limiter only when its quota is exhausted, and retries back off with jitter.
+    With geolocator=None (offline) only cached results are returned.
+    """
+    metrics = get_metrics()
+    endpoint = geolocator_endpoint(geolocator) if geolocator is not None else None
+    if cache is not None:
+        cached = cache.get(address, endpoint)
+        if cached is not None:
+            metrics.count('geocode.cache_hit')
+            return cached
+        metrics.count('geocode.cache_miss')
+    if geolocator is None:
+        metrics.count('geocode.offline')
+        return empty_result('offline')
+
+    limiter = limiter or get_rate_limiter()
+    result = empty_result('error', source)
+    for attempt in range(max_retries):
+        try:
+            start = time.perf_counter()
+            limiter.acquire()
+            metrics.observe('geocode.rate_wait_ms', (time.perf_counter() - start) * 1000)
+            result = _query(geolocator, address, source)
+            break
+
+        except (GeocoderTimedOut, GeocoderServiceError) as e:
+            print(f"  ⚠️  Attempt {attempt + 1} failed: {str(e)}")
+            _record_error(address, attempt + 1, e)
+            if attempt < max_retries - 1:
+                metrics.count('geocode.retries')
+                time.sleep(backoff_delay(attempt))
+
+    metrics.count('geocode.result.' + result['geocode_accuracy'])
+    if cache is not None:
+        cache.put(address, result, endpoint)
+    return result
+
+
+class ProviderChain:
+    """
+    Geocode through an ordered chain of providers, hedging slow requests
+    Each provider keeps its own rate limiter. A lookup is sent to the first
+    provider; if it is still unanswered hedge_after seconds after it was
+    sent (time spent waiting on our own quota does not count), the same
+    address also goes to the next provider and the first match wins.
+    Providers that answer 'not found' or fail hand over to the next one
+    straight away (the only fallback with hedge_after=None). Rows no
+    provider resolves are left to the offline gazetteer fallback, which
+    runs over the whole frame afterwards.
+    Pass a chain wherever a geolocator is accepted by geocode_many().
+    """
+
+    POLL_SECONDS = 0.05
+
+    def __init__(self, user_agent, providers=None, hedge_after=HEDGE_AFTER, max_retries=3):
+        self.names = list(providers or DEFAULT_CHAIN)
+        self.providers = [(name, make_geolocator(user_agent, name), get_rate_limiter(name))
+                          for name in self.names]
+        self.hedge_after = hedge_after
+        self.max_retries = max_retries
+        self.max_workers = sum(PROVIDERS[name]['max_workers'] for name in self.names)
+        # Requests overtaken by a hedge keep running until they answer or time
+        # out, so the pool has headroom beyond the lookups in flight
+        self.executor = ThreadPoolExecutor(max_workers=4 * self.max_workers + 4)
+
+    @property
+    def name(self):
+        return ' → '.join(self.names)
+
+    @property
+    def endpoint(self):
+        """Cache scope: the primary provider's base URL"""
+        return geolocator_endpoint(self.providers[0][1])
+
+    @property
+    def requests(self):
+        """Rate-limiter tokens taken across every provider so far"""
+        return sum(limiter.acquired for _, _, limiter in self.providers)
+
+    def _call(self, i, address, slot):
+        """One request to provider i; slot['sent'] is set once it leaves the rate limiter"""
+        name, geolocator, limiter = self.providers[i]
+        metrics = get_metrics()
+        start = time.perf_counter()
+        limiter.acquire()
+        slot['sent'] = time.monotonic()
+        metrics.observe('geocode.rate_wait_ms', (time.perf_counter() - start) * 1000)
+        try:
+            return _query(geolocator, address, provider_label(name))
+        except (GeocoderTimedOut, GeocoderServiceError) as e:
+            _record_error(address, i + 1, e)
+            return empty_result('error', provider_label(name))
+
+    def _race(self, address):
+        """
+        Run one round over the chain; returns the first match, else 'failed'
+        when every provider answered not found and 'error' otherwise
+        """
+        metrics = get_metrics()
+        pending = {}
+        launched = []
+
+        def launch():
+            slot = {}
+            future = self.executor.submit(self._call, len(launched), address, slot)
+            pending[future] = len(launched)
+            launched.append(slot)
+
+        launch()
+        outcomes = []
+        while pending:
+            timeout = None
+            if self.hedge_after is not None and len(launched) < len(self.providers):
+                sent = launched[-1].get('sent')
+                timeout = (self.POLL_SECONDS if sent is None
+                           else max(0.0, sent + self.hedge_after - time.monotonic()))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                sent = launched[-1].get('sent')
+                if sent is not None and time.monotonic() >= sent + self.hedge_after:
+                    metrics.count('geocode.hedged')
+                    launch()
+                continue
+            for future in done:
+                i = pending.pop(future)
+                result = future.result()
+                if result['latitude'] is not None:
+                    metrics.count(f'geocode.provider.{self.names[i]}')
+                    return result
+                outcomes.append(result['geocode_accuracy'])
+            if not pending and len(launched) < len(self.providers):
+                metrics.count('geocode.fallback')
+                launch()
+        # A provider that errored may still know the address: only a miss
+        # every provider agrees on is final (and cached as a negative)
+        agreed = len(outcomes) == len(self.providers) and all(o == 'failed' for o in outcomes)
+        return empty_result('failed' if agreed else 'error', provider_label(self.names[0]))
+
+    def geocode(self, address, cache=None):
+        """
+        Geocode one address through the chain, checking the cache first
+        Rounds where every provider failed with an error are retried with
+        backoff; misses every provider agrees on are cached as negatives
+        """
+        metrics = get_metrics()
+        if cache is not None:
+            cached = cache.get(address, self.endpoint)
+            if cached is not None:
+                metrics.count('geocode.cache_hit')
+                return cached
+            metrics.count('geocode.cache_miss')
+
+        start = time.perf_counter()
+        for attempt in range(self.max_retries):
+            result = self._race(address)
+            if result['geocode_accuracy'] != 'error':
+                break
+            if attempt < self.max_retries - 1:
+                metrics.count('geocode.retries')
+                time.sleep(backoff_delay(attempt))
+        metrics.observe('geocode.lookup_ms', (time.perf_counter() - start) * 1000)
+        metrics.count('geocode.result.' + result['geocode_accuracy'])
+        if cache is not None:
+            cache.put(address, result, self.endpoint)
+        return result
+
+    def close(self):
+        """
+        Shut down the request pool, waiting (at most REQUEST_TIMEOUT) for
+        requests a hedge overtook, so no request threads outlive the chain
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def plan_lookups(addresses):
+    """
+    Collapse addresses that normalize to the same key
+    Returns {key: [indices into addresses]} in first-seen order; the first
+    address of each group is the one sent to the geocoder
+    """
+    plan = {}
+    for i, address in enumerate(addresses):
+        plan.setdefault(normalize_address(address), []).append(i)
+    return plan
+
+
+def geocode_many(geolocator, addresses, cache=None, provider=None,
+                 max_workers=None, on_result=None):
+    """
+    Geocode a list of addresses concurrently
+    Duplicate addresses (after normalization) are looked up once and the
+    result is fanned out to every index that uses it. Runs up to the
+    provider's max_workers lookups in parallel, all sharing the provider's
+    rate limiter; with a ProviderChain as the geolocator, up to the chain's
+    combined workers, each provider behind its own limiter.
+    on_result(i, result) is called from the calling thread for every input
+    index as its lookup completes. Returns results in input order.
+    """
+    if isinstance(geolocator, ProviderChain):
+        chain = geolocator
+        provider = chain.name
+        max_workers = max_workers or chain.max_workers
+
+        def lookup(address):
+            return chain.geocode(address, cache=cache)
+
+        def requests_made():
+            return chain.requests
+    else:
+        provider = provider or DEFAULT_PROVIDER
+        limiter = get_rate_limiter(provider)
+        source = provider_label(provider)
+        max_workers = max_workers or PROVIDERS[provider]['max_workers']
+
+        def lookup(address):
+            return geocode_address(geolocator, address, cache=cache, limiter=limiter, source=source)
+
+        def requests_made():
+            return limiter.acquired
+
+    plan = plan_lookups(addresses)
+    coalesced = len(addresses) - len(plan)
+    metrics = get_metrics()
+    metrics.count('geocode.coalesced', coalesced)
+
+    results = [None] * len(addresses)
+    requests_before = requests_made()
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(lookup, addresses[indices[0]]): indices
+            for indices in plan.values()
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            for n, i in enumerate(futures[future]):
+                # Each row gets its own dict so callers can edit results in place
+                results[i] = result if n == 0 else dict(result)
+                if on_result is not None:
+                    on_result(i, results[i])
+
+    elapsed = time.monotonic() - start
+    requests = requests_made() - requests_before
+    metrics.emit('geocode_batch', provider=provider, workers=max_workers,
+                 addresses=len(addresses), unique_addresses=len(plan),
+                 coalesced=coalesced, requests=requests,
+                 seconds=round(elapsed, 3),
+                 requests_per_sec=round(requests / elapsed, 2) if elapsed else 0.0)
+    print(f"   Geocoded {len(addresses)} addresses in {elapsed:.1f}s "
+          f"({len(addresses) / elapsed if elapsed else 0:.1f} addresses/s, "
+          f"{requests} network requests at {requests / elapsed if elapsed else 0:.2f} req/s, "
+          f"{max_workers} workers, provider '{provider}')")
+    if coalesced:
+        print(f"   {len(plan)} unique addresses: {coalesced} duplicate lookups coalesced")
+    return results
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Single-pass workbook ingestion with a cached columnar snapshot
+Parses every city sheet of Data_final_cleaned.xlsx in one pass, tags rows
+with City_Sheet and State, and stores the result as a Parquet snapshot keyed
+by the workbook's content hash. Later runs memory-map the snapshot instead
+of re-parsing the xlsx, until the workbook changes.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import openpyxl
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq  # Parquet engine for the snapshot
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+WORKBOOK_PATH = 'Data_final_cleaned.xlsx'
+SNAPSHOT_DIR = '.cache/snapshots'
+
+# Columns that mix numbers and text (e.g. Postcode 5000 vs 'Various') are
+# split into a numeric and a text part so Parquet can store them losslessly
+NUMERIC_PART = '__num__'
+TEXT_PART = '__text__'
+
+
+def state_from_sheet(sheet_name):
+    """Detect state from sheet name"""
+    sheet_lower = sheet_name.lower()
+    if 'sydney' in sheet_lower:
+        return 'NSW'
+    elif 'melbourne' in sheet_lower:
+        return 'VIC'
+    elif 'brisbane' in sheet_lower:
+        return 'QLD'
+    elif 'adelaide' in sheet_lower or 'adelaid' in sheet_lower:
+        return 'SA'
+    elif 'perth' in sheet_lower:
+        return 'WA'
+    elif 'hobart' in sheet_lower:
+        return 'TAS'
+    elif 'darwin' in sheet_lower:
+        return 'NT'
+    else:
+        return 'Australia'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_sheet(path, sheet_name):
+    df = pd.read_excel(path, sheet_name=sheet_name)
+    df['City_Sheet'] = sheet_name
+    df['State'] = state_from_sheet(sheet_name)
+    return df
+
+
+def read_workbook(path=WORKBOOK_PATH, workers=None):
+    """
+    Parse all sheets and combine them
+    Returns (df_all, sheet_names); rows are tagged with City_Sheet and State.
+    With workers > 1 (and fork available) each sheet is parsed in its own
+    process; otherwise all sheets are parsed in one pass.
+    """
+    if workers and workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        sheet_names = list(workbook.sheetnames)
+        workbook.close()
+        with ProcessPoolExecutor(max_workers=min(workers, len(sheet_names)),
+                                 mp_context=multiprocessing.get_context('fork')) as executor:
+            frames = list(executor.map(_read_sheet, [path] * len(sheet_names), sheet_names))
+        return pd.concat(frames, ignore_index=True), sheet_names
+
+    sheets = pd.read_excel(path, sheet_name=None)
+    frames = []
+    for sheet_name, df in sheets.items():
+        df['City_Sheet'] = sheet_name
+        df['State'] = state_from_sheet(sheet_name)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True), list(sheets)
+
+
+def _mixed_columns(df):
+    """Object columns holding both numbers and strings"""
+    mixed = []
+    for column in df.columns:
+        if df[column].dtype == object:
+            kind = pd.api.types.infer_dtype(df[column], skipna=True)
+            if kind.startswith('mixed'):
+                mixed.append(column)
+    return mixed
+
+
+def _split_mixed(df, mixed):
+    df = df.copy()
+    for column in mixed:
+        values = df.pop(column)
+        is_number = values.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))
+        df[NUMERIC_PART + column] = pd.to_numeric(values.where(is_number), errors='coerce').astype('Int64')
+        df[TEXT_PART + column] = values.where(~is_number & values.notna()).astype(object)
+    return df
+
+
+def _join_mixed(df, mixed, columns):
+    for column in mixed:
+        numbers = df.pop(NUMERIC_PART + column).astype(object)
+        text = df.pop(TEXT_PART + column).astype(object)
+        df[column] = numbers.where(numbers.notna(), text).where(
+            numbers.notna() | text.notna(), np.nan).astype(object)
+    return df[columns]
+
+
+def snapshot_paths(digest, snapshot_dir=SNAPSHOT_DIR):
+    base = os.path.join(snapshot_dir, f'workbook-{digest[:16]}')
+    return base + '.parquet', base + '.json'
+
+
+def write_snapshot(df, sheet_names, digest, snapshot_dir=SNAPSHOT_DIR):
+    """Store the combined frame as Parquet plus a small JSON sidecar"""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    parquet_path, meta_path = snapshot_paths(digest, snapshot_dir)
+    mixed = _mixed_columns(df)
+    _split_mixed(df, mixed).to_parquet(parquet_path, index=False)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'sha256': digest,
+            'sheet_names': sheet_names,
+            'columns': list(df.columns),
+            'mixed_columns': mixed
+        }, f, indent=2)
+
+
+def read_snapshot(digest, snapshot_dir=SNAPSHOT_DIR):
+    """Load a snapshot (memory-mapped), or return None if there is none"""
+    parquet_path, meta_path = snapshot_paths(digest, snapshot_dir)
+    if not (os.path.exists(parquet_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    df = pd.read_parquet(parquet_path, memory_map=True)
+    return _join_mixed(df, meta['mixed_columns'], meta['columns']), meta['sheet_names']
+
+
+def _sheet_frame(rows, header, sheet_name):
+    df = pd.DataFrame(rows, columns=header)
+    df['City_Sheet'] = sheet_name
+    df['State'] = state_from_sheet(sheet_name)
+    return df
+
+
+def iter_workbook(path=WORKBOOK_PATH, chunk_size=10000):
+    """
+    Stream the city sheets in row chunks without loading the workbook
+    Returns (sheet_names, chunks); each chunk is tagged like read_workbook().
+    Cells are converted the way read_excel converts them (integral floats
+    become ints, blank header cells 'Unnamed: <i>'); fully blank rows are
+    skipped. Column dtypes are inferred per chunk.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    sheet_names = list(workbook.sheetnames)
+
+    def chunks():
+        try:
+            for sheet_name in sheet_names:
+                sheet = workbook[sheet_name]
+                sheet.reset_dimensions()  # saved dimensions can be wrong
+                rows = sheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+                header = [name if name is not None else f'Unnamed: {i}'
+                          for i, name in enumerate(header)]
+                batch = []
+                for row in rows:
+                    if all(value is None for value in row):
+                        continue
+                    batch.append([int(value) if isinstance(value, float) and value.is_integer()
+                                  else value for value in row])
+                    if len(batch) == chunk_size:
+                        yield _sheet_frame(batch, header, sheet_name)
+                        batch = []
+                if batch:
+                    yield _sheet_frame(batch, header, sheet_name)
+        finally:
+            workbook.close()
+
+    return sheet_names, chunks()
+
+
+def iter_snapshot(digest, chunk_size=10000, snapshot_dir=SNAPSHOT_DIR):
+    """Stream a snapshot in record batches, or return None if there is none"""
+    parquet_path, meta_path = snapshot_paths(digest, snapshot_dir)
+    if not (os.path.exists(parquet_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+
+    def chunks():
+        for batch in pq.ParquetFile(parquet_path, memory_map=True).iter_batches(batch_size=chunk_size):
+            yield _join_mixed(batch.to_pandas(), meta['mixed_columns'], meta['columns'])
+
+    return meta['sheet_names'], chunks()
+
+
+def iter_registry(path=WORKBOOK_PATH, chunk_size=10000, use_snapshot=True, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Stream all city sheets in chunks of at most chunk_size rows
+    Reads the snapshot when the workbook is unchanged, otherwise the xlsx
+    in read-only mode (no snapshot is written while streaming).
+    Returns (sheet_names, chunks, from_snapshot)
+    """
+    if use_snapshot and HAVE_PYARROW:
+        snapshot = iter_snapshot(file_hash(path), chunk_size, snapshot_dir)
+        if snapshot is not None:
+            return snapshot + (True,)
+    return iter_workbook(path, chunk_size) + (False,)
+
+
+def load_registry(path=WORKBOOK_PATH, use_snapshot=True, snapshot_dir=SNAPSHOT_DIR, workers=None):
+    """
+    Load all city sheets, from the snapshot when the workbook is unchanged
+    workers > 1 parses the sheets in parallel when there is no snapshot.
+    Returns (df_all, sheet_names, from_snapshot)
+    """
+    if not (use_snapshot and HAVE_PYARROW):
+        df, sheet_names = read_workbook(path, workers)
+        return df, sheet_names, False
+
+    digest = file_hash(path)
+    snapshot = read_snapshot(digest, snapshot_dir)
+    if snapshot is not None:
+        df, sheet_names = snapshot
+        return df, sheet_names, True
+
+    df, sheet_names = read_workbook(path, workers)
+    write_snapshot(df, sheet_names, digest, snapshot_dir)
+    return df, sheet_names, False
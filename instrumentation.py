@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Structured per-stage instrumentation for the geocoding pipeline
+Stage timers, counters and latency histograms, emitted as JSON lines (one
+object per event, tagged with the run id and script) plus an end-of-run
+summary table, so runs can be profiled and compared over time without
+scraping the console output.
+
+Library code records into the shared collector from get_metrics(); scripts
+call start_run() first to give it a metrics file and finish() at the end:
+
+    metrics = start_run('geocode_complete_dataset')
+    with metrics.timer('load'):
+        ...
+    metrics.count('geocode.cache_hit')
+    metrics.observe('geocode.request_ms', 12.5)
+    metrics.finish()
+
+Summarize earlier runs with: python instrumentation.py [path]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+
+METRICS_PATH = 'logs/pipeline_metrics.jsonl'
+
+# Histogram bucket upper bounds (milliseconds); the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+class Timer:
+    """Result of a timed block; seconds is set when the block exits"""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = None
+
+
+class Histogram:
+    """Latency samples kept exactly (8 bytes each) plus fixed buckets for the JSON summary"""
+
+    def __init__(self):
+        self.values = array('d')
+
+    def add(self, value):
+        self.values.append(value)
+
+    def summary(self):
+        values = np.frombuffer(self.values, dtype=np.float64) if self.values else np.zeros(0)
+        if not len(values):
+            return {'count': 0}
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        buckets = np.bincount(np.searchsorted(HISTOGRAM_BOUNDS_MS, values),
+                              minlength=len(HISTOGRAM_BOUNDS_MS) + 1)
+        return {
+            'count': len(values),
+            'mean': float(values.mean()),
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'max': float(values.max()),
+            'buckets': dict(zip([f'le_{b}' for b in HISTOGRAM_BOUNDS_MS] + ['gt_max'],
+                                buckets.tolist()))
+        }
+
+
+class Metrics:
+    """
+    Thread-safe collector for one run
+    With path=None nothing is written; stages, counters and histograms are
+    still collected for the summary
+    """
+
+    def __init__(self, script=None, path=None, run_id=None):
+        self.script = script
+        self.path = path
+        self.run_id = run_id or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S') + f'-{os.getpid()}'
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.file = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, event, **fields):
+        """Append one JSON-lines event to the metrics file"""
+        if self.file is None:
+            return
+        line = json.dumps({
+            'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'run_id': self.run_id,
+            'script': self.script,
+            'event': event,
+            **fields
+        }, default=str, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    @contextmanager
+    def timer(self, stage, **fields):
+        """Time a block as a pipeline stage; repeated stages accumulate"""
+        record = Timer(stage)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            self.add_stage(stage, record.seconds, **fields)
+
+    def add_stage(self, stage, seconds, **fields):
+        """Record a stage timed elsewhere (e.g. in a worker process)"""
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.emit('stage', stage=stage, seconds=round(seconds, 6), **fields)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        """Add a sample (milliseconds for latencies) to a histogram"""
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].add(value)
+
+    def summary(self):
+        with self.lock:
+            return {
+                'elapsed_seconds': time.perf_counter() - self.started,
+                'stages': dict(self.stages),
+                'counters': dict(self.counters),
+                'histograms': {name: h.summary() for name, h in self.histograms.items()}
+            }
+
+    def export(self, reset=False):
+        """
+        Raw stages, counters and histogram samples, for merge() in another
+        process; reset=True starts afresh, so a long-lived worker can hand
+        over its samples task by task
+        """
+        with self.lock:
+            state = {
+                'stages': dict(self.stages),
+                'counters': dict(self.counters),
+                'histograms': {name: h.values for name, h in self.histograms.items()}
+            }
+            if reset:
+                self.stages = {}
+                self.counters = {}
+                self.histograms = {}
+            return state
+
+    def merge(self, state, stage_prefix=''):
+        """Fold a worker's export() into this run (stages get stage_prefix)"""
+        with self.lock:
+            for stage, seconds in state['stages'].items():
+                stage = stage_prefix + stage
+                self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            for name, value in state['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, values in state['histograms'].items():
+                self.histograms.setdefault(name, Histogram()).values.extend(values)
+
+    def finish(self, print_table=True):
+        """Emit the run summary, print it as a table and close the metrics file"""
+        summary = self.summary()
+        self.emit('summary', **summary)
+        if print_table:
+            print_summary(summary, self.run_id, self.path)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return summary
+
+
+def print_summary(summary, run_id=None, path=None):
+    """End-of-run table of stage times, counters and latency percentiles"""
+    print("\n" + "=" * 70)
+    print(f"📈 RUN METRICS{f' ({run_id})' if run_id else ''}")
+    print("=" * 70)
+    elapsed = summary['elapsed_seconds']
+    for stage, seconds in summary['stages'].items():
+        share = seconds / elapsed * 100 if elapsed else 0
+        print(f"   {stage:32s} {seconds:9.3f}s {share:5.1f}%")
+    print(f"   {'total':32s} {elapsed:9.3f}s")
+
+    if summary['counters']:
+        print()
+        for name, value in sorted(summary['counters'].items()):
+            print(f"   {name:32s} {value:>10,}")
+
+    if summary['histograms']:
+        print(f"\n   {'histogram (ms)':32s} {'count':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+        for name, h in summary['histograms'].items():
+            if h['count']:
+                print(f"   {name:32s} {h['count']:>8,} {h['p50']:>8.1f} {h['p90']:>8.1f} "
+                      f"{h['p99']:>8.1f} {h['max']:>8.1f}")
+    if path:
+        print(f"\n   Metrics: {path}")
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Shared collector that library code records into"""
+    return _metrics
+
+
+def start_run(script, path=METRICS_PATH, run_id=None):
+    """
+    Begin a run: replace the shared collector with one writing to path
+    Worker processes pass their parent's run_id so their events join its run
+    """
+    global _metrics
+    _metrics = Metrics(script, path, run_id)
+    if run_id is None:
+        _metrics.emit('start')
+    return _metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', nargs='?', default=METRICS_PATH)
+    parser.add_argument('--last', type=int, default=10, help='number of runs to list')
+    args = parser.parse_args()
+
+    runs = []
+    with open(args.path, encoding='utf-8') as f:
+        for line in f:
+            event = json.loads(line)
+            if event['event'] == 'summary':
+                runs.append(event)
+
+    print(f"📈 Last {min(args.last, len(runs))} of {len(runs)} runs in {args.path}")
+    for run in runs[-args.last:]:
+        stages = ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in run['stages'].items())
+        print(f"   {run['run_id']}  {run['script']:28s} {run['elapsed_seconds']:8.1f}s  {stages}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Server-side marker clustering for the service map
+Clusters the geocoded points on a hierarchical grid for zoom levels 3-18
+and writes one static JSON file per map tile (clusters/{z}/{x}/{y}.json),
+so the map only fetches the clusters in its viewport instead of clustering
+the whole point list in the browser.
+
+At zoom z each 256 px tile is split into 64 px cells and the points in a
+cell form one cluster, placed at their mean position. A cell at zoom z is
+exactly four cells at z + 1, so clusters nest from one zoom to the next and
+are computed for every zoom in one vectorized pass.
+
+Tiles whose cells are all single points are marked "leaf": nothing in them
+clusters at higher zooms, so their child tiles are not written and the map
+keeps using the leaf tile (climbing to the nearest parent when a tile is
+missing).
+"""
+
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from schema import load_services
+
+CLUSTER_DIR = 'clusters'  # under the web payload directory
+MIN_ZOOM = 3
+MAX_ZOOM = 18
+TILE_SIZE = 256
+CELL_SIZE = 64  # px; 4 x 4 cells per tile
+CELL_SHIFT = 2  # log2(TILE_SIZE // CELL_SIZE)
+COORD_DECIMALS = 5
+MAX_LATITUDE = 85.05112878  # Web Mercator limit
+
+
+def to_mercator(lat, lon):
+    """Degrees to Web Mercator x, y in [0, 1) (y grows southwards)"""
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lon, dtype=np.float64) + 180) / 360
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2
+    return np.clip(x, 0, np.nextafter(1, 0)), np.clip(y, 0, np.nextafter(1, 0))
+
+
+def from_mercator(x, y):
+    """Web Mercator x, y back to degrees latitude, longitude"""
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y)))))
+    return lat, np.asarray(x) * 360 - 180
+
+
+class ZoomLevel:
+    """Clusters at one zoom: one entry per occupied cell"""
+
+    def __init__(self, zoom, keys, cell_x, cell_y, counts, lat, lon, members):
+        self.zoom = zoom
+        self.keys = keys  # sorted cell keys
+        self.cell_x = cell_x
+        self.cell_y = cell_y
+        self.counts = counts
+        self.lat = lat
+        self.lon = lon
+        self.members = members  # service id of single-point cells, -1 for clusters
+        self.expansion_zoom = np.full(len(keys), -1, dtype=np.int64)
+
+    @property
+    def tile_x(self):
+        return self.cell_x >> CELL_SHIFT
+
+    @property
+    def tile_y(self):
+        return self.cell_y >> CELL_SHIFT
+
+
+def cluster_levels(lat, lon, ids=None, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Grid clusters for every zoom from min_zoom to max_zoom
+    Points with missing coordinates are skipped; ids default to row
+    positions (the service ids of the web payload). Returns {zoom: ZoomLevel}.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    ids = np.arange(len(lat)) if ids is None else np.asarray(ids)
+    known = ~(np.isnan(lat) | np.isnan(lon))
+    x, y = to_mercator(lat[known], lon[known])
+    ids = ids[known]
+
+    levels = {}
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        cells = 1 << (zoom + CELL_SHIFT)
+        cell_x = (x * cells).astype(np.int64)
+        cell_y = (y * cells).astype(np.int64)
+        keys, first, inverse, counts = np.unique(cell_x * cells + cell_y, return_index=True,
+                                                 return_inverse=True, return_counts=True)
+        mean_x = np.bincount(inverse, weights=x) / counts
+        mean_y = np.bincount(inverse, weights=y) / counts
+        cluster_lat, cluster_lon = from_mercator(mean_x, mean_y)
+        level = ZoomLevel(zoom, keys, keys // cells, keys % cells, counts,
+                          cluster_lat, cluster_lon, np.where(counts == 1, ids[first], -1))
+
+        # A cluster expands at the first zoom where its cell splits in two or more
+        child = levels.get(zoom + 1)
+        if child is not None:
+            parent = np.searchsorted(keys, (child.cell_x >> 1) * cells + (child.cell_y >> 1))
+            children = np.bincount(parent, minlength=len(keys))
+            single_child = np.full(len(keys), -1, dtype=np.int64)
+            single_child[parent] = np.arange(len(parent))
+            level.expansion_zoom = np.where(
+                children > 1, zoom + 1, child.expansion_zoom[single_child])
+        level.expansion_zoom[counts == 1] = -1
+        levels[zoom] = level
+    return levels
+
+
+def _tile_payload(level, rows, leaf):
+    clusters = []
+    points = []
+    for i in rows:
+        lat = round(float(level.lat[i]), COORD_DECIMALS)
+        lon = round(float(level.lon[i]), COORD_DECIMALS)
+        if level.counts[i] == 1:
+            points.append([lat, lon, int(level.members[i])])
+        else:
+            expansion = int(level.expansion_zoom[i])
+            clusters.append([lat, lon, int(level.counts[i]), expansion if expansion >= 0 else None])
+    payload = {'clusters': clusters, 'points': points}
+    if leaf:
+        payload['leaf'] = True
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def write_cluster_tiles(lat, lon, web_dir, ids=None, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Write clusters/{z}/{x}/{y}.json for every occupied tile plus
+    clusters/index.json; returns a report of tiles and bytes written
+    Cluster rows are [lat, lon, count, expansion_zoom], point rows
+    [lat, lon, service id]
+    """
+    out_dir = os.path.join(web_dir, CLUSTER_DIR)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)  # drop tiles from an earlier, different registry
+    levels = cluster_levels(lat, lon, ids, min_zoom, max_zoom)
+
+    report = {'tiles': 0, 'raw': 0, 'points': 0, 'tiles_per_zoom': {}}
+    covered = None  # tile keys (at the previous zoom) under a leaf tile
+    for zoom in range(min_zoom, max_zoom + 1):
+        level = levels[zoom]
+        report['points'] = max(report['points'], int(level.counts.sum()))
+        tiles = 1 << zoom
+        tile_keys = level.tile_x * tiles + level.tile_y
+        parent_keys = (level.tile_x >> 1) * (tiles >> 1) + (level.tile_y >> 1)
+        skip = np.isin(parent_keys, covered) if covered is not None else np.zeros(len(tile_keys), bool)
+
+        frame = pd.DataFrame({'tile': tile_keys[~skip], 'row': np.flatnonzero(~skip)})
+        leaves = []
+        written = 0
+        for tile, rows in frame.groupby('tile', sort=True)['row']:
+            rows = rows.to_numpy()
+            leaf = bool(np.all(level.counts[rows] == 1)) and zoom < max_zoom
+            if leaf:
+                leaves.append(tile)
+            path = os.path.join(out_dir, str(zoom), str(tile // tiles), f'{tile % tiles}.json')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            payload = _tile_payload(level, rows, leaf)
+            with open(path, 'wb') as f:
+                f.write(payload)
+            report['raw'] += len(payload)
+            written += 1
+        report['tiles'] += written
+        report['tiles_per_zoom'][zoom] = written
+        covered = np.unique(np.concatenate([tile_keys[skip], np.asarray(leaves, dtype=np.int64)]))
+
+    index = {
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+        'tile_size': TILE_SIZE,
+        'cell_size': CELL_SIZE,
+        'points': report['points'],
+        'tiles_per_zoom': report['tiles_per_zoom'],
+        'cluster_row': ['lat', 'lon', 'count', 'expansion_zoom'],
+        'point_row': ['lat', 'lon', 'id']
+    }
+    with open(os.path.join(out_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    return report
+
+
+def main():
+    from web_export import SOURCE_JSON, WEB_DIR
+    print("🗺️  Building map cluster tiles")
+    df = load_services(SOURCE_JSON)
+    report = write_cluster_tiles(df['latitude'], df['longitude'], WEB_DIR)
+    print(f"   ✓ {report['points']} points → {report['tiles']} tiles, {report['raw']:,} B "
+          f"(zooms {MIN_ZOOM}-{MAX_ZOOM})")
+
+
+if __name__ == '__main__':
+    main()
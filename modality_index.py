@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Inverted index and bitmasks over the standardized modality columns
+Tokenizes the semicolon-joined *_standardized columns once into a fixed
+vocabulary, gives every service a bitmask, and exports both next to the
+geocoded JSON so multi-select AND/OR filters become bitwise operations
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+
+INDEX_PATH = 'data/modality_index.json'
+
+# Vocabulary entries are qualified by column, e.g. 'group:yoga', because the
+# same term can mean a group program in one column and a one-on-one service
+# in another. Bare terms in queries match the term in any column.
+MODALITY_PREFIXES = {
+    'group_services_standardized': 'group',
+    'individual_services_standardized': 'individual',
+    'associated_services_standardized': 'associated'
+}
+
+# Bitmasks are stored as 32-bit words so the static site can apply them with
+# JavaScript's 32-bit bitwise operators
+WORD_BITS = 32
+
+
+def tokenize(value):
+    """Split a semicolon-joined standardized string into terms"""
+    if pd.isna(value):
+        return []
+    terms = (term.strip() for term in str(value).split(';'))
+    return [term for term in terms if term and term != 'none']
+
+
+class ModalityIndex:
+    """
+    Fixed-vocabulary modality index
+    masks is an (n_services, n_words) uint32 array; bit i of a service's mask
+    is set when it offers vocabulary[i]
+    """
+
+    def __init__(self, vocabulary, masks):
+        self.vocabulary = list(vocabulary)
+        self.positions = {term: i for i, term in enumerate(self.vocabulary)}
+        self.masks = masks
+
+    @classmethod
+    def build(cls, df, vocabulary=None):
+        """
+        Tokenize the modality columns of a registry
+        Passing the previous vocabulary keeps existing bit positions stable;
+        new terms are appended to the end
+        """
+        vocabulary = list(vocabulary or [])
+        positions = {term: i for i, term in enumerate(vocabulary)}
+
+        # Registries repeat a small number of distinct modality strings, so
+        # each distinct string is tokenized once and its bits fanned out by code
+        columns = []
+        for column, prefix in MODALITY_PREFIXES.items():
+            if column not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[column])
+            distinct_bits = []
+            for value in uniques:
+                bits = []
+                for term in tokenize(value):
+                    key = f'{prefix}:{term}'
+                    if key not in positions:
+                        positions[key] = len(vocabulary)
+                        vocabulary.append(key)
+                    bits.append(positions[key])
+                distinct_bits.append(bits)
+            columns.append((codes, distinct_bits))
+
+        n_words = max(1, -(-len(vocabulary) // WORD_BITS))
+        masks = np.zeros((len(df), n_words), dtype=np.uint32)
+        for codes, distinct_bits in columns:
+            # The extra final row is all zeros, for missing values (code -1)
+            distinct_masks = np.zeros((len(distinct_bits) + 1, n_words), dtype=np.uint32)
+            for i, bits in enumerate(distinct_bits):
+                for bit in bits:
+                    distinct_masks[i, bit // WORD_BITS] |= np.uint32(1 << (bit % WORD_BITS))
+            masks |= distinct_masks[codes]
+        return cls(vocabulary, masks)
+
+    def __len__(self):
+        return len(self.masks)
+
+    @staticmethod
+    def _keys(term):
+        return [term] if ':' in term else [f'{prefix}:{term}' for prefix in MODALITY_PREFIXES.values()]
+
+    def knows(self, term):
+        """Whether a query term (bare or 'group:yoga' style) is in the vocabulary"""
+        return any(key in self.positions for key in self._keys(term))
+
+    def term_mask(self, term):
+        """Query mask for a term; a bare term covers every column it appears in"""
+        mask = np.zeros(self.masks.shape[1], dtype=np.uint32)
+        for key in self._keys(term):
+            if key in self.positions:
+                bit = self.positions[key]
+                mask[bit // WORD_BITS] |= np.uint32(1) << np.uint32(bit % WORD_BITS)
+        return mask
+
+    def postings(self, term):
+        """Row positions of services offering a term (the inverted index)"""
+        return np.flatnonzero(self.match_any([term]))
+
+    def match_all(self, terms):
+        """Boolean mask of services offering every term (AND)"""
+        result = np.ones(len(self.masks), dtype=bool)
+        for term in terms:
+            result &= (self.masks & self.term_mask(term)).any(axis=1)
+        return result
+
+    def match_any(self, terms):
+        """Boolean mask of services offering at least one term (OR)"""
+        query = np.zeros(self.masks.shape[1], dtype=np.uint32)
+        for term in terms:
+            query |= self.term_mask(term)
+        return (self.masks & query).any(axis=1)
+
+    def query(self, all_of=None, any_of=None):
+        """Combine AND and OR term lists into one boolean mask"""
+        result = np.ones(len(self.masks), dtype=bool)
+        if all_of:
+            result &= self.match_all(all_of)
+        if any_of:
+            result &= self.match_any(any_of)
+        return result
+
+    def to_dict(self):
+        """JSON-ready form: vocabulary, per-service mask words and postings"""
+        return {
+            'word_bits': WORD_BITS,
+            'vocabulary': self.vocabulary,
+            'masks': self.masks.tolist(),
+            'postings': {
+                term: np.flatnonzero(
+                    self.masks[:, i // WORD_BITS] & np.uint32(1 << (i % WORD_BITS))
+                ).tolist()
+                for i, term in enumerate(self.vocabulary)
+            }
+        }
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        Stack indexes built chunk by chunk, each from the previous one's
+        vocabulary (so the last vocabulary covers them all)
+        """
+        vocabulary = parts[-1].vocabulary if parts else []
+        n_words = max(1, -(-len(vocabulary) // WORD_BITS))
+        masks = np.zeros((sum(len(part) for part in parts), n_words), dtype=np.uint32)
+        start = 0
+        for part in parts:
+            masks[start:start + len(part), :part.masks.shape[1]] = part.masks
+            start += len(part)
+        return cls(vocabulary, masks)
+
+    def save(self, path=INDEX_PATH, block=65536):
+        """Write to_dict() as compact JSON, serializing the masks in blocks of rows"""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'{{"word_bits":{WORD_BITS},'
+                    f'"vocabulary":{json.dumps(self.vocabulary, separators=(",", ":"))},"masks":[')
+            for start in range(0, len(self.masks), block):
+                if start:
+                    f.write(',')
+                f.write(json.dumps(self.masks[start:start + block].tolist(), separators=(',', ':'))[1:-1])
+            f.write('],"postings":{')
+            for i, term in enumerate(self.vocabulary):
+                postings = np.flatnonzero(self.masks[:, i // WORD_BITS] & np.uint32(1 << (i % WORD_BITS)))
+                f.write(f'{"," if i else ""}{json.dumps(term)}:'
+                        f'{json.dumps(postings.tolist(), separators=(",", ":"))}')
+            f.write('}}')
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        masks = np.asarray(data['masks'], dtype=np.uint32).reshape(len(data['masks']), -1)
+        return cls(data['vocabulary'], masks)
+
+
+def previous_vocabulary(path=INDEX_PATH):
+    """Vocabulary of an existing export, so rebuilds keep bit positions"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['vocabulary']
+
+
+def main():
+    print("🧘 Building modality index")
+    from schema import load_services
+    df = load_services()
+    index = ModalityIndex.build(df, vocabulary=previous_vocabulary())
+    index.save()
+    print(f"   ✓ {len(index.vocabulary)} terms, {len(index)} services → {INDEX_PATH}")
+
+    # Example: yoga AND meditation in VIC
+    match = index.match_all(['yoga', 'meditation/mindfulness']) & (df['State'] == 'VIC').to_numpy()
+    print(f"   yoga AND meditation/mindfulness in VIC: {match.sum()} services")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Process-parallel geocoding of a registry, one shard per process
+The city sheets (or states) are independent until the final export, so
+each shard is normalized, geocoded, gazetteer-filled and validated by
+geocode_registry() in its own worker process, and the result columns are
+merged back into the registry for one combined export. Shards larger than
+max_rows are split further, so a large national import spreads over every
+core.
+
+Network quotas stay global: the parent runs a LimiterService holding one
+token bucket per provider and every worker draws its requests from it.
+Workers fork from the parent, so the registry and the incremental snapshot
+are inherited rather than pickled; each worker opens its own geocode cache
+connection and checkpoint journal (one journal file per shard).
+"""
+
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from checkpoint import CheckpointJournal
+from geocode_complete_dataset import CHECKPOINT_PATH, RESULT_COLUMNS, geocode_registry
+from geocoding import GeocodeCache, ProviderChain, start_limiter_service, use_limiter_service
+from instrumentation import get_metrics, start_run
+
+SHARD_COLUMNS = {'sheet': 'City_Sheet', 'state': 'State'}
+
+# Inherited by the forked workers
+_job = {}
+
+
+def plan_shards(df, shard_by='sheet', max_rows=None):
+    """
+    Split a registry into shards of row positions
+    Returns [(name, positions)] in registry order; groups larger than
+    max_rows become name#1, name#2, ...
+    """
+    keys = df[SHARD_COLUMNS[shard_by]].fillna('').astype(str)
+    shards = []
+    for key, positions in pd.Series(np.arange(len(df)), index=keys).groupby(level=0, sort=False):
+        positions = positions.to_numpy()
+        if max_rows and len(positions) > max_rows:
+            for part, start in enumerate(range(0, len(positions), max_rows), 1):
+                shards.append((f'{key}#{part}', positions[start:start + max_rows]))
+        else:
+            shards.append((key, positions))
+    return shards
+
+
+def shard_journal_path(name, path=CHECKPOINT_PATH):
+    """Checkpoint journal of one shard, next to the single-process journal"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}{ext}"
+
+
+def _init_worker(address, authkey, script, metrics_path, run_id):
+    # Worker events go to the parent's metrics file under its run id
+    use_limiter_service(address, authkey)
+    start_run(script, metrics_path, run_id)
+
+
+def _geocode_shard(name, positions):
+    """
+    Worker: geocode one shard; returns its result columns, city stats,
+    metrics and a report (with the snapshot identities it saw, if incremental)
+    """
+    started = time.perf_counter()
+    df_all = _job['df']
+    shard = df_all.iloc[positions].copy()
+    base_columns = set(shard.columns)
+    geolocator = None if _job['offline'] else ProviderChain(_job['user_agent'])
+    cache = GeocodeCache()
+    journal = CheckpointJournal(shard_journal_path(name), resume=_job['resume'])
+    try:
+        city_stats = geocode_registry(shard, geolocator, cache, journal,
+                                      use_gazetteer=_job['use_gazetteer'], verbose=False,
+                                      previous=_job['previous'])
+    finally:
+        journal.close()
+        cache.close()
+        if geolocator is not None:
+            geolocator.close()
+
+    added = [column for column in shard.columns
+             if column not in base_columns or column in _job['result_columns']]
+    report = {
+        'name': name,
+        'rows': len(shard),
+        'geocoded': int(shard['latitude'].notna().sum()),
+        'seconds': time.perf_counter() - started,
+        'pid': os.getpid()
+    }
+    if _job['previous'] is not None:
+        # The parent's snapshot never sees this shard's classify(); send back
+        # the services it saw so removals are counted against the whole registry
+        report['seen'] = _job['previous'].seen
+    return shard[added], city_stats, get_metrics().export(reset=True), report
+
+
+def geocode_parallel(df_all, workers, offline=False, use_gazetteer=True, previous=None,
+                     resume=False, shard_by='sheet', max_rows=None,
+                     user_agent="integrative-oncology-australia-research-v1.0"):
+    """
+    geocode_registry() over shards of df_all in a process pool, in place
+    Returns per-city {'total', 'success', 'failed'} counts, like
+    geocode_registry(). Worker stage times are added to the run as
+    shard.<stage> (summed over workers, so they can exceed the wall time).
+    """
+    metrics = get_metrics()
+    shards = plan_shards(df_all, shard_by, max_rows)
+    workers = max(1, min(workers, len(shards)))
+
+    _job.update(df=df_all, offline=offline, use_gazetteer=use_gazetteer, previous=previous,
+                resume=resume, user_agent=user_agent, result_columns=set(RESULT_COLUMNS))
+    service, address, authkey = start_limiter_service()
+    parts = []
+    city_stats = {}
+    try:
+        with metrics.timer('shards', shards=len(shards), workers=workers):
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                     initializer=_init_worker,
+                                     initargs=(address, authkey, metrics.script, metrics.path,
+                                               metrics.run_id)) as executor:
+                futures = {executor.submit(_geocode_shard, name, positions): positions
+                           for name, positions in shards}
+                for future in as_completed(futures):
+                    columns, stats, state, report = future.result()
+                    metrics.merge(state, stage_prefix='shard.')
+                    parts.append(columns)
+                    if previous is not None:
+                        previous.seen.update(report['seen'])
+                    for city_sheet, counts in stats.items():
+                        totals = city_stats.setdefault(city_sheet, {'total': 0, 'success': 0, 'failed': 0})
+                        for key, value in counts.items():
+                            totals[key] += value
+                    print(f"   ✓ {report['name']}: {report['geocoded']}/{report['rows']} located "
+                          f"in {report['seconds']:.1f}s (pid {report['pid']})", flush=True)
+    finally:
+        service.shutdown()
+        _job.clear()
+
+    with metrics.timer('merge'):
+        merged = pd.concat(parts)
+        for column in merged.columns:
+            df_all[column] = merged[column].reindex(df_all.index)
+    metrics.count('shards', len(shards))
+
+    # Keep the sheets' order for the per-city report
+    order = list(dict.fromkeys(df_all['City_Sheet']))
+    return {city_sheet: city_stats[city_sheet] for city_sheet in order if city_sheet in city_stats}
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Vectorized address preprocessing for the geocoding scripts
+Coerces postcodes, detects states and assembles full address strings on
+whole columns at once, so it runs once before geocoding instead of inside
+every row loop
+"""
+
+import numpy as np
+import pandas as pd
+
+# Postcode range lower bounds and the state each range maps to; anything
+# outside the listed ranges falls back to 'Australia'
+POSTCODE_EDGES = np.array([800, 900, 2000, 3000, 4000, 5000, 6000, 7000, 8000])
+POSTCODE_STATES = np.array(['Australia', 'NT', 'Australia', 'NSW', 'VIC', 'QLD',
+                            'SA', 'WA', 'TAS', 'Australia'], dtype=object)
+
+
+def _text(values):
+    """Object array of strings with missing values as ''"""
+    values = pd.Series(values)
+    if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+        values = values.astype(object).where(values.isna(), values.astype(str))
+    return values.fillna('').to_numpy(dtype=object)
+
+
+def coerce_postcodes(values):
+    """
+    Coerce a postcode column to strings
+    Numbers and numeric strings (5000, 5000.0, '5000') become '5000'; missing
+    or non-numeric values (e.g. 'Various') become ''
+    """
+    values = pd.Series(values)
+    numeric = pd.to_numeric(values, errors='coerce')
+    valid = numeric.notna() & (numeric >= 0)
+    result = pd.Series('', index=values.index, dtype=object)
+    result[valid] = numeric[valid].astype(np.int64).astype(str)
+    return result
+
+
+def state_from_postcode(postcodes):
+    """Map postcodes to state abbreviations with a binned range lookup"""
+    postcodes = pd.Series(postcodes)
+    numeric = pd.to_numeric(postcodes, errors='coerce').fillna(0).to_numpy()
+    bins = np.searchsorted(POSTCODE_EDGES, numeric, side='right')
+    return pd.Series(POSTCODE_STATES[bins], index=postcodes.index)
+
+
+def build_full_address(address, suburb, state, postcode, country='Australia'):
+    """
+    Join address parts column-wise as 'Address, Suburb, State, Postcode, Australia'
+    Empty parts are skipped, matching ', '.join([p for p in parts if p])
+    """
+    index = pd.Series(address).index
+    # Works on object arrays: numpy string concatenation is several times
+    # faster than pandas string ops on millions of rows
+    full = np.full(len(index), '', dtype=object)
+    for part in (address, suburb, state, postcode):
+        part = _text(part)
+        full = full + np.where(part != '', part + ', ', '')
+    full = pd.Series(full + (country or ''), index=index)
+    return full if country else full.str.removesuffix(', ')
+
+
+def prepare_addresses(df, state=None):
+    """
+    Build the geocoding frame for a registry
+    Returns a frame aligned with df holding the cleaned 'postcode', the
+    'state' used in the address and the 'full_address' to geocode. state may
+    be a scalar or column; by default the State column is used when present,
+    otherwise the state is detected from the postcode.
+    """
+    postcode = coerce_postcodes(df['Postcode'])
+    if state is None:
+        state = df['State'] if 'State' in df.columns else state_from_postcode(postcode)
+    if np.isscalar(state):
+        state = pd.Series(state, index=df.index, dtype=object)
+
+    return pd.DataFrame({
+        'postcode': postcode,
+        'state': state,
+        'full_address': build_full_address(df['Address'], df['Suburb'], state, postcode)
+    }, index=df.index)
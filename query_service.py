@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Local asyncio HTTP query service over the geocoded registry
+Loads the registry once into the in-memory indexes (k-d tree, modality
+bitmasks, search index, and the postcode distance matrix when it matches the
+registry) and answers JSON queries over keep-alive HTTP/1.1 connections,
+with an LRU response cache, ETag / If-None-Match revalidation and gzip.
+
+Endpoints (GET; filters are provider_type, facility_type, state,
+city_sheet and modality, comma-separated for several values):
+
+    /nearest?lat=-34.93&lon=138.60&k=5      or ?postcode=5000
+    /radius?lat=-34.93&lon=138.60&km=10     or ?postcode=5000
+    /filter?state=SA&modality=yoga,meditation
+    /search?q=wellnes+centre&limit=10
+    /services/<id>
+    /stats
+
+Run: python query_service.py [--port 8000]
+Load test: python -m benchmarks.load_test_service
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+from distance_matrix import MATRIX_DIR, DistanceMatrix, service_table
+from instrumentation import get_metrics
+from schema import compact_frame
+from search_index import SearchIndex
+from service_index import DEFAULT_JSON, FILTER_COLUMNS, ServiceIndex
+
+DEFAULT_PORT = 8000
+RESPONSE_CACHE_SIZE = 4096
+GZIP_MIN_BYTES = 1024
+MAX_RESULTS = 200
+MAX_REQUEST_BYTES = 16384
+CACHE_CONTROL = 'public, max-age=60'
+
+# Fields returned for each service (the detail shards carry the rest)
+RESULT_FIELDS = ['id', 'Name', 'Organization', 'Provider Type', 'Facility Type', 'Address',
+                 'Suburb', 'Postcode', 'State', 'Phone', 'Website', 'latitude', 'longitude']
+
+FILTER_PARAMS = ['provider_type', 'facility_type', 'state', 'city_sheet']
+
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class QueryError(Exception):
+    """Bad query parameters (answered with 400)"""
+
+
+def _encode_records(df):
+    """
+    JSON for every service's result record, without the closing brace, so
+    per-query fields (distance_km, score) can be appended
+    """
+    df = df[[c for c in RESULT_FIELDS if c in df.columns]]
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    return [json.dumps(record, separators=(',', ':'), ensure_ascii=False,
+                       default=str)[:-1].encode('utf-8') for record in records]
+
+
+def _param(params, name, cast=str, default=None):
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise QueryError(f"missing parameter '{name}'")
+        return default
+    try:
+        return cast(values[0])
+    except ValueError:
+        raise QueryError(f"invalid value for '{name}': {values[0]!r}")
+
+
+class ServiceRegistry:
+    """The geocoded registry and its indexes; service ids are row positions in the JSON"""
+
+    def __init__(self, df, matrix=None):
+        self.df = df.reset_index(drop=True)
+        self.df.insert(0, 'id', np.arange(len(self.df)))
+        self.index = ServiceIndex(self.df)
+        self.search_index = SearchIndex.build(self.df)
+        self.records = _encode_records(self.df)
+        # Filter values are checked against these before any sub-index is built
+        self.filter_values = {name: set(self.index.df[FILTER_COLUMNS[name]].dropna().astype(str))
+                              for name in FILTER_PARAMS}
+        self.matrix = matrix
+        self.version = None
+
+    @classmethod
+    def load(cls, path=DEFAULT_JSON, matrix_dir=MATRIX_DIR):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        df = compact_frame(pd.read_json(io.BytesIO(raw)))
+        matrix = None
+        if matrix_dir and os.path.exists(os.path.join(matrix_dir, 'index.json')):
+            matrix = DistanceMatrix.load(matrix_dir)
+            # Only usable if it was built from this registry
+            if matrix.service_ids != service_table(df)['id'].tolist():
+                matrix = None
+        registry = cls(df, matrix)
+        registry.version = hashlib.blake2b(raw, digest_size=8).hexdigest()
+        return registry
+
+    def results(self, count, ids, field=None, values=None):
+        """Response body listing the records of ids, each with an optional extra field"""
+        if field is None:
+            parts = [self.records[i] + b'}' for i in ids]
+        else:
+            parts = [self.records[i] + f',"{field}":{value:.3f}}}'.encode('ascii')
+                     for i, value in zip(ids, values)]
+        return b'{"count":%d,"results":[%b]}' % (count, b','.join(parts))
+
+    def _filters(self, params):
+        filters = {name: params[name][0].split(',') for name in FILTER_PARAMS if name in params}
+        modalities = params['modality'][0].split(',') if 'modality' in params else None
+        for name, values in filters.items():
+            unknown = [value for value in values if value not in self.filter_values[name]]
+            if unknown:
+                raise QueryError(f"unknown {name} {unknown[0]!r}")
+        for term in modalities or []:
+            if not self.index.modalities.knows(term):
+                raise QueryError(f"unknown modality {term!r}")
+        return modalities, filters
+
+    def _origin(self, params):
+        if 'postcode' in params:
+            postcode = params['postcode'][0]
+            if self.matrix is None or postcode not in self.matrix.positions:
+                raise QueryError(f"unknown postcode {postcode!r}")
+            lat, lon = self.matrix.postcode_coords[self.matrix.positions[postcode]]
+            return lat, lon
+        return _param(params, 'lat', float), _param(params, 'lon', float)
+
+    def nearest(self, params):
+        k = min(_param(params, 'k', int, 5), MAX_RESULTS)
+        if k < 1:
+            raise QueryError("'k' must be at least 1")
+        modalities, filters = self._filters(params)
+        if ('postcode' in params and self.matrix is not None and not filters
+                and not modalities and k <= self.matrix.k):
+            # Precomputed: a row lookup instead of a tree query
+            postcode = params['postcode'][0]
+            if postcode not in self.matrix.positions:
+                raise QueryError(f"unknown postcode {postcode!r}")
+            found = self.matrix.nearest(postcode, k=k)
+            ids, distances = found['row'].to_numpy(), found['distance_km'].to_numpy()
+        else:
+            lat, lon = self._origin(params)
+            index, _, rows, distances, _ = self.index.nearest_rows(
+                lat, lon, k=k, modalities=modalities, **filters)
+            ids = index.df['id'].to_numpy()[rows]
+        return self.results(len(ids), ids, 'distance_km', distances)
+
+    def radius(self, params):
+        km = _param(params, 'km', float)
+        limit = min(_param(params, 'limit', int, MAX_RESULTS), MAX_RESULTS)
+        modalities, filters = self._filters(params)
+        lat, lon = self._origin(params)
+        index, _, rows, distances, _ = self.index.within_radius_rows(
+            lat, lon, km, modalities=modalities, **filters)
+        ids = index.df['id'].to_numpy()[rows[:limit]]
+        return self.results(len(rows), ids, 'distance_km', distances[:limit])
+
+    def filter(self, params):
+        limit = min(_param(params, 'limit', int, MAX_RESULTS), MAX_RESULTS)
+        offset = _param(params, 'offset', int, 0)
+        modalities, filters = self._filters(params)
+        ids = self.index.subset(modalities=modalities, **filters).df['id'].to_numpy()
+        return self.results(len(ids), ids[offset:offset + limit])
+
+    def search(self, params):
+        query = _param(params, 'q')
+        limit = min(_param(params, 'limit', int, 10), MAX_RESULTS)
+        found = self.search_index.search(query, limit=limit)
+        return self.results(len(found), found['id'].to_numpy(), 'score', found['score'].to_numpy())
+
+    def service(self, service_id):
+        if not service_id.isdigit() or int(service_id) >= len(self.df):
+            raise KeyError(service_id)
+        row = self.df.iloc[int(service_id)]
+        return row.astype(object).where(row.notna(), None).to_dict()
+
+
+class ResponseCache:
+    """LRU of encoded responses keyed by request target"""
+
+    def __init__(self, size=RESPONSE_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class QueryService:
+    """HTTP/1.1 front end: routing, caching, conditional GET and gzip"""
+
+    def __init__(self, registry, cache_size=RESPONSE_CACHE_SIZE):
+        self.registry = registry
+        self.cache = ResponseCache(cache_size)
+        self.routes = {
+            '/nearest': registry.nearest,
+            '/radius': registry.radius,
+            '/filter': registry.filter,
+            '/search': registry.search
+        }
+        self.started = time.time()
+
+    def stats(self):
+        return {
+            'services': len(self.registry.df),
+            'indexed': len(self.registry.index),
+            'distance_matrix': self.registry.matrix is not None,
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'cache': {'entries': len(self.cache.entries), 'hits': self.cache.hits,
+                      'misses': self.cache.misses}
+        }
+
+    def _render(self, path, params):
+        """(status, payload) for a request; payloads are JSON-ready or an encoded body"""
+        if path == '/stats':
+            return 200, self.stats()
+        if path.startswith('/services/'):
+            try:
+                return 200, self.registry.service(path[len('/services/'):])
+            except KeyError:
+                return 404, {'error': 'no such service'}
+        handler = self.routes.get(path)
+        if handler is None:
+            return 404, {'error': 'not found'}
+        try:
+            return 200, handler(params)
+        except (QueryError, ValueError) as e:
+            return 400, {'error': str(e)}
+
+    def respond(self, target):
+        """Cache entry (status, etag, body, gzipped body or None) for a request target"""
+        entry = self.cache.get(target)
+        if entry is not None:
+            return entry
+        url = urlsplit(target)
+        status, payload = self._render(url.path, parse_qs(url.query))
+        body = payload if isinstance(payload, bytes) else json.dumps(
+            payload, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+        # Errors are neither cached here nor marked cacheable for clients
+        etag = (f'"{self.registry.version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+                if status == 200 else None)
+        compressed = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        entry = (status, etag, body, compressed)
+        if status == 200 and url.path != '/stats':
+            self.cache.put(target, entry)
+        return entry
+
+    def encode(self, method, target, headers):
+        """Full HTTP response bytes for one request"""
+        if method not in ('GET', 'HEAD'):
+            status, etag, body, compressed = 405, None, b'{"error":"method not allowed"}', None
+        else:
+            status, etag, body, compressed = self.respond(target)
+
+        extra = []
+        if etag:
+            extra.append(('ETag', etag))
+            extra.append(('Cache-Control', CACHE_CONTROL))
+            if status == 200 and etag in headers.get('if-none-match', ''):
+                status, body = 304, b''
+        if body and compressed is not None:
+            extra.append(('Vary', 'Accept-Encoding'))
+            if 'gzip' in headers.get('accept-encoding', ''):
+                body = compressed
+                extra.append(('Content-Encoding', 'gzip'))
+
+        lines = [f'HTTP/1.1 {status} {STATUS_TEXT[status]}']
+        if status != 304:
+            lines.append('Content-Type: application/json; charset=utf-8')
+        lines.append(f'Content-Length: {len(body) if status != 304 else 0}')
+        lines += [f'{name}: {value}' for name, value in extra]
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        return status, head + (body if method != 'HEAD' and status != 304 else b'')
+
+    async def handle(self, reader, writer):
+        """Serve one keep-alive connection"""
+        metrics = get_metrics()
+        try:
+            while True:
+                try:
+                    raw = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                start = time.perf_counter()
+                request_line, *header_lines = raw.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = request_line.split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                try:
+                    status, response = self.encode(method, target, headers)
+                except Exception as e:  # keep serving other requests
+                    status, response = 500, self.error_response(e)
+                writer.write(response)
+                await writer.drain()
+                metrics.count(f'service.status.{status}')
+                metrics.observe('service.request_ms', (time.perf_counter() - start) * 1000)
+
+                connection = headers.get('connection', '').lower()
+                if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive'):
+                    break
+        finally:
+            writer.close()
+
+    @staticmethod
+    def error_response(error):
+        body = json.dumps({'error': f'{type(error).__name__}: {error}'}).encode('utf-8')
+        return (f'HTTP/1.1 500 Internal Server Error\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n').encode('latin-1') + body
+
+
+async def serve(service, host='127.0.0.1', port=DEFAULT_PORT):
+    server = await asyncio.start_server(service.handle, host, port, limit=MAX_REQUEST_BYTES,
+                                        backlog=1024)
+    address = server.sockets[0].getsockname()
+    print(f"🩺 Query service listening on http://{address[0]}:{address[1]}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--json', default=DEFAULT_JSON, help='geocoded registry to serve')
+    parser.add_argument('--matrix-dir', default=MATRIX_DIR,
+                        help='postcode distance matrix (used when it matches the registry)')
+    parser.add_argument('--cache-size', type=int, default=RESPONSE_CACHE_SIZE,
+                        help='cached responses (0 disables the cache)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registry = ServiceRegistry.load(args.json, args.matrix_dir)
+    print(f"   Loaded {len(registry.df):,} services ({len(registry.index):,} geocoded) "
+          f"in {time.perf_counter() - start:.1f}s"
+          + (", with distance matrix" if registry.matrix is not None else ""), flush=True)
+    try:
+        asyncio.run(serve(QueryService(registry, args.cache_size), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
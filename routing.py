@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Cached travel-time matrices for the "nearest by drive time" features
+Phase 3 of APP_PLAN.md routes every user/service pair through OSRM, one
+request per route. Router instead asks an OSRM-style /table service for
+many-to-many duration and distance matrices, packing as many origins and
+destinations into each request as the server's table size allows.
+
+Results are cached per (profile, origin cell, destination cell), where a
+cell is the coordinate rounded to CELL_DECIMALS places (about 110 m), and
+routed from the cell centres so a cached entry holds for anyone in the
+cell. The cache is an in-memory LRU in front of a SQLite file: entries
+outlive the process, and the file keeps at most max_rows of them, dropping
+the least recently used. Repeated queries from the same neighbourhood are
+answered without any network request.
+
+Routers are selected with ROUTING_PROVIDER ('osrm', the public demo
+server, or 'osrm_local' at OSRM_LOCAL_URL); for a local stand-in run
+python -m benchmarks.mock_osrm --port 5000
+
+Usage: python routing.py --lat -34.93 --lon 138.60 [--k 5] [--profile driving]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+import numpy as np
+from geocoding import TokenBucket, backoff_delay
+from instrumentation import get_metrics, start_run
+from service_index import ServiceIndex
+
+CACHE_PATH = '.cache/route_cache.sqlite'
+
+# Road networks change slowly; a stale travel time is still a good ranking
+ROUTE_TTL = 90 * 24 * 3600
+MEMORY_ENTRIES = 200_000
+MAX_ROWS = 5_000_000
+# Memory hits whose last-use times are written back at once
+FLUSH_TOUCHED = 10_000
+
+# Cache cells: coordinates rounded to this many decimal places
+CELL_DECIMALS = 3
+CELL_SCALE = 10 ** CELL_DECIMALS
+LON_CELLS = 360 * CELL_SCALE + 1
+# Requests group origins by tiles of this many cells a side (about 55 km),
+# and fetch at most MAX_OVERFETCH table cells per wanted pair
+TILE_CELLS = 500
+MAX_OVERFETCH = 4
+
+PROFILES = ['driving', 'walking', 'cycling']
+
+# Per-router quotas; max_coordinates is the server's table size limit
+# (sources plus destinations in one request; osrm-routed defaults to 100)
+ROUTERS = {
+    'osrm': {
+        'url': os.environ.get('OSRM_URL', 'https://router.project-osrm.org'),
+        'rate_per_sec': 1.0,
+        'burst': 1,
+        'max_workers': 1,
+        'max_coordinates': 100
+    },
+    'osrm_local': {
+        'url': os.environ.get('OSRM_LOCAL_URL', 'http://localhost:5000'),
+        'rate_per_sec': 50.0,
+        'burst': 50,
+        'max_workers': 8,
+        'max_coordinates': 500
+    }
+}
+DEFAULT_ROUTER = os.environ.get('ROUTING_PROVIDER', 'osrm')
+REQUEST_TIMEOUT = 30
+
+# Straight-line candidates ranked by travel time in nearest_by_time()
+DEFAULT_CANDIDATES = 25
+
+
+class RoutingError(Exception):
+    """A table request that failed after its retries, or was rejected"""
+
+
+def cell_ids(lat, lon):
+    """Integer cache cell of each coordinate"""
+    lat = np.rint(np.asarray(lat, dtype=np.float64) * CELL_SCALE).astype(np.int64)
+    lon = np.rint(np.asarray(lon, dtype=np.float64) * CELL_SCALE).astype(np.int64)
+    return (lat + 90 * CELL_SCALE) * LON_CELLS + lon + 180 * CELL_SCALE
+
+
+def cell_coords(cells):
+    """Centre (lat, lon) of each cell"""
+    cells = np.asarray(cells, dtype=np.int64)
+    lat = (cells // LON_CELLS - 90 * CELL_SCALE) / CELL_SCALE
+    lon = (cells % LON_CELLS - 180 * CELL_SCALE) / CELL_SCALE
+    return lat, lon
+
+
+class RouteCache:
+    """
+    Travel times keyed by (profile, origin cell, destination cell)
+    An LRU of memory_entries in front of a SQLite table capped at max_rows.
+    Unroutable pairs are cached too, as NaN. Last-use times of memory hits
+    are written back on flush(), which also trims the file.
+    """
+
+    def __init__(self, path=CACHE_PATH, memory_entries=MEMORY_ENTRIES, max_rows=MAX_ROWS,
+                 ttl=ROUTE_TTL):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.touched = set()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evicted = 0
+
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS route_cache ('
+                ' profile TEXT,'
+                ' origin INTEGER,'
+                ' destination INTEGER,'
+                ' duration REAL,'
+                ' distance REAL,'
+                ' created_at REAL,'
+                ' used_at REAL,'
+                ' PRIMARY KEY (profile, origin, destination))'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS route_cache_used ON route_cache (used_at)')
+            self.conn.commit()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.memory_entries:
+            self.entries.popitem(last=False)
+
+    def get_many(self, profile, origins, destinations):
+        """
+        Cached (duration s, distance m) for aligned origin/destination cells
+        Returns two float arrays and a found mask; missing pairs are NaN
+        """
+        durations = np.full(len(origins), np.nan)
+        distances = np.full(len(origins), np.nan)
+        found = np.zeros(len(origins), dtype=bool)
+        expired_before = time.time() - self.ttl
+        with self.lock:
+            for i, (origin, destination) in enumerate(zip(origins.tolist(), destinations.tolist())):
+                key = (profile, origin, destination)
+                value = self.entries.get(key)
+                if value is not None:
+                    self.entries.move_to_end(key)
+                    self.touched.add(key)
+                    self.memory_hits += 1
+                elif self.conn is not None:
+                    row = self.conn.execute(
+                        'SELECT duration, distance, created_at FROM route_cache'
+                        ' WHERE profile = ? AND origin = ? AND destination = ?', key).fetchone()
+                    if row is not None and row[2] >= expired_before:
+                        value = (np.nan if row[0] is None else row[0],
+                                 np.nan if row[1] is None else row[1])
+                        self._remember(key, value)
+                        self.touched.add(key)
+                        self.disk_hits += 1
+                if value is None:
+                    self.misses += 1
+                    continue
+                durations[i], distances[i] = value
+                found[i] = True
+        return durations, distances, found
+
+    def put_many(self, profile, origins, destinations, durations, distances):
+        """Store aligned arrays of routed pairs"""
+        now = time.time()
+        rows = []
+        with self.lock:
+            for origin, destination, duration, distance in zip(
+                    origins.tolist(), destinations.tolist(), durations.tolist(), distances.tolist()):
+                self._remember((profile, origin, destination), (duration, distance))
+                rows.append((profile, origin, destination,
+                             None if duration != duration else duration,
+                             None if distance != distance else distance, now, now))
+            if self.conn is not None:
+                self.conn.executemany('INSERT OR REPLACE INTO route_cache VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                      rows)
+                self.conn.commit()
+            self.writes += len(rows)
+
+    def flush(self):
+        """Write back last-use times and drop the least recently used rows over max_rows"""
+        if self.conn is None:
+            return
+        with self.lock:
+            now = time.time()
+            self.conn.executemany(
+                'UPDATE route_cache SET used_at = ? WHERE profile = ? AND origin = ? AND destination = ?',
+                [(now,) + key for key in self.touched])
+            self.touched.clear()
+            excess = self.conn.execute('SELECT COUNT(*) FROM route_cache').fetchone()[0] - self.max_rows
+            if excess > 0:
+                self.conn.execute('DELETE FROM route_cache WHERE rowid IN'
+                                  ' (SELECT rowid FROM route_cache ORDER BY used_at LIMIT ?)', (excess,))
+                self.evicted += excess
+            self.conn.commit()
+
+    def stats(self):
+        """Hit/miss statistics for this session"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'evicted': self.evicted,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+    def print_stats(self):
+        """Print a one-line cache summary"""
+        s = self.stats()
+        print(f"   Route cache: {s['memory_hits']} memory + {s['disk_hits']} disk hits, "
+              f"{s['misses']} misses ({s['hit_rate'] * 100:.0f}% hit rate), {s['evicted']} evicted")
+
+    def close(self):
+        if self.conn is not None:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+
+
+def plan_batches(origins, destinations, max_coordinates, max_overfetch=MAX_OVERFETCH):
+    """
+    Group pairs of cells into table requests
+    Returns [(source cells, destination cells)] whose sizes add up to at
+    most max_coordinates and whose products cover every pair. Origins are
+    taken tile by tile (TILE_CELLS square), so neighbouring origins, which
+    tend to share their candidate destinations, land in the same request;
+    an origin joins a request only while the table stays within
+    max_overfetch times the pairs actually wanted.
+    """
+    targets = {}
+    for origin, destination in zip(origins.tolist(), destinations.tolist()):
+        targets.setdefault(origin, set()).add(destination)
+
+    batches = []
+    sources, wanted, pairs = [], set(), 0
+    for origin in sorted(targets, key=lambda cell: (cell // LON_CELLS // TILE_CELLS,
+                                                     cell % LON_CELLS // TILE_CELLS, cell)):
+        needed = targets[origin]
+        if len(needed) + 1 > max_coordinates:
+            # One origin with more destinations than a request holds
+            needed = sorted(needed)
+            step = max_coordinates - 1
+            batches += [([origin], needed[start:start + step]) for start in range(0, len(needed), step)]
+            continue
+        merged = wanted | needed
+        if sources and (len(sources) + 1 + len(merged) > max_coordinates
+                        or (len(sources) + 1) * len(merged) > max_overfetch * (pairs + len(needed))):
+            batches.append((sources, sorted(wanted)))
+            sources, merged, pairs = [], set(needed), 0
+        sources.append(origin)
+        wanted = merged
+        pairs += len(needed)
+    if sources:
+        batches.append((sources, sorted(wanted)))
+    return batches
+
+
+class Router:
+    """
+    Many-to-many travel times from an OSRM-style table service, through a RouteCache
+    Requests wait on the router's token bucket, run max_workers at a time,
+    and retry transient failures (timeouts, 429 and 5xx) with jittered
+    backoff. Pass cache=None to disable caching.
+    """
+
+    def __init__(self, provider=None, cache=None, max_retries=3,
+                 user_agent='integrative-oncology-australia-research-v1.0'):
+        self.provider = provider or DEFAULT_ROUTER
+        config = ROUTERS[self.provider]
+        self.url = config['url'].rstrip('/')
+        self.max_coordinates = config['max_coordinates']
+        self.max_workers = config['max_workers']
+        self.limiter = TokenBucket(config['rate_per_sec'], config['burst'])
+        self.cache = cache
+        self.max_retries = max_retries
+        self.user_agent = user_agent
+
+    def _request(self, profile, sources, destinations):
+        """One table request; returns (durations, distances) of shape (sources, destinations)"""
+        lat, lon = cell_coords(np.concatenate([sources, destinations]))
+        coords = ';'.join(f'{x:.{CELL_DECIMALS}f},{y:.{CELL_DECIMALS}f}' for x, y in zip(lon, lat))
+        n = len(sources)
+        url = (f"{self.url}/table/v1/{profile}/{coords}"
+               f"?sources={';'.join(map(str, range(n)))}"
+               f"&destinations={';'.join(map(str, range(n, n + len(destinations))))}"
+               f"&annotations=duration,distance")
+        metrics = get_metrics()
+        for attempt in range(self.max_retries):
+            start = time.perf_counter()
+            self.limiter.acquire()
+            metrics.observe('routing.rate_wait_ms', (time.perf_counter() - start) * 1000)
+            metrics.count('routing.requests')
+            start = time.perf_counter()
+            try:
+                request = Request(url, headers={'User-Agent': self.user_agent})
+                with urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                    payload = json.load(response)
+                break
+            except HTTPError as e:
+                if e.code != 429 and e.code < 500:
+                    raise RoutingError(f"{self.provider} rejected a {n}x{len(destinations)} table: "
+                                       f"HTTP {e.code} {e.read()[:200]!r}")
+                error = e
+            except (URLError, TimeoutError, ConnectionError) as e:
+                error = e
+            finally:
+                metrics.observe('routing.request_ms', (time.perf_counter() - start) * 1000)
+            metrics.count(f'routing.error.{type(error).__name__}')
+            if attempt == self.max_retries - 1:
+                raise RoutingError(f"{self.provider} table request failed: {error}")
+            metrics.count('routing.retries')
+            time.sleep(backoff_delay(attempt))
+
+        if payload.get('code') != 'Ok':
+            raise RoutingError(f"{self.provider}: {payload.get('code')} {payload.get('message', '')}")
+        metrics.count('routing.pairs_routed', n * len(destinations))
+        durations = np.array(payload['durations'], dtype=np.float64)
+        distances = np.array(payload.get('distances') or np.full_like(durations, np.nan), dtype=np.float64)
+        return durations, distances
+
+    def _route(self, profile, origins, destinations):
+        """Fetch and cache every pair of origin/destination cells in as few tables as fit"""
+        batches = plan_batches(origins, destinations, self.max_coordinates)
+        get_metrics().count('routing.tables', len(batches))
+
+        def run(batch):
+            sources, targets = (np.asarray(cells, dtype=np.int64) for cells in batch)
+            durations, distances = self._request(profile, sources, targets)
+            if self.cache is not None:
+                self.cache.put_many(profile, np.repeat(sources, len(targets)),
+                                    np.tile(targets, len(sources)),
+                                    durations.ravel(), distances.ravel())
+            return sources, targets, durations, distances
+
+        workers = min(self.max_workers, len(batches))
+        if workers <= 1:
+            return [run(batch) for batch in batches]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, batches))
+
+    def pairs(self, origin_lat, origin_lon, dest_lat, dest_lon, profile='driving'):
+        """
+        Travel times for aligned origin/destination arrays
+        Returns (duration seconds, distance metres) arrays; NaN where a pair
+        is unroutable or has no coordinates
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile '{profile}' (expected one of {PROFILES})")
+        metrics = get_metrics()
+        origin_lat, origin_lon, dest_lat, dest_lon = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(v, dtype=np.float64))
+              for v in (origin_lat, origin_lon, dest_lat, dest_lon)))
+        durations = np.full(origin_lat.shape, np.nan)
+        distances = np.full(origin_lat.shape, np.nan)
+        valid = np.flatnonzero(np.isfinite(origin_lat) & np.isfinite(origin_lon)
+                               & np.isfinite(dest_lat) & np.isfinite(dest_lon))
+        if not len(valid):
+            return durations, distances
+
+        origins = cell_ids(origin_lat[valid], origin_lon[valid])
+        destinations = cell_ids(dest_lat[valid], dest_lon[valid])
+        # Each distinct pair of cells is looked up (and routed) once
+        keys, inverse = np.unique(np.column_stack([origins, destinations]), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        key_durations = np.full(len(keys), np.nan)
+        key_distances = np.full(len(keys), np.nan)
+        found = np.zeros(len(keys), dtype=bool)
+        if self.cache is not None:
+            key_durations, key_distances, found = self.cache.get_many(profile, keys[:, 0], keys[:, 1])
+        metrics.count('routing.cache_hit', int(found.sum()))
+        metrics.count('routing.cache_miss', int((~found).sum()))
+
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            routed = {}
+            for sources, targets, table_durations, table_distances in self._route(
+                    profile, keys[missing, 0], keys[missing, 1]):
+                for i, origin in enumerate(sources.tolist()):
+                    for j, destination in enumerate(targets.tolist()):
+                        routed[origin, destination] = (table_durations[i, j], table_distances[i, j])
+            for i in missing:
+                key_durations[i], key_distances[i] = routed[keys[i, 0], keys[i, 1]]
+
+        if self.cache is not None and len(self.cache.touched) >= FLUSH_TOUCHED:
+            self.cache.flush()
+        durations[valid] = key_durations[inverse]
+        distances[valid] = key_distances[inverse]
+        return durations, distances
+
+    def table(self, origin_lat, origin_lon, dest_lat, dest_lon, profile='driving'):
+        """Full (origins x destinations) duration and distance matrices"""
+        origin_lat, origin_lon = np.atleast_1d(origin_lat), np.atleast_1d(origin_lon)
+        dest_lat, dest_lon = np.atleast_1d(dest_lat), np.atleast_1d(dest_lon)
+        shape = (len(origin_lat), len(dest_lat))
+        durations, distances = self.pairs(np.repeat(origin_lat, shape[1]), np.repeat(origin_lon, shape[1]),
+                                          np.tile(dest_lat, shape[0]), np.tile(dest_lon, shape[0]), profile)
+        return durations.reshape(shape), distances.reshape(shape)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+
+def nearest_by_time(router, index, lat, lon, k=5, profile='driving', candidates=DEFAULT_CANDIDATES,
+                    modalities=None, **filters):
+    """
+    k services with the shortest travel time from one or many origins
+    The `candidates` nearest services by straight-line distance (from the
+    ServiceIndex) are ranked by routed duration; unroutable services sort
+    last. Returns one row per (origin, match) like ServiceIndex.nearest(),
+    with duration_min and route_km added.
+    """
+    sub, origins, rows, durations, route_m, distances, ranks = nearest_by_time_rows(
+        router, index, lat, lon, k, profile, candidates, modalities, **filters)
+    result = sub.df.iloc[rows].reset_index(drop=True)
+    result.insert(0, 'origin', origins)
+    result.insert(1, 'rank', ranks)
+    result.insert(2, 'duration_min', durations / 60)
+    result.insert(3, 'route_km', route_m / 1000)
+    result.insert(4, 'distance_km', distances)
+    return result
+
+
+def nearest_by_time_rows(router, index, lat, lon, k=5, profile='driving', candidates=DEFAULT_CANDIDATES,
+                         modalities=None, **filters):
+    """
+    nearest_by_time() as arrays, without building the result frame
+    Returns (index, origins, rows, duration_s, route_m, distance_km, ranks),
+    where rows are positions in index.df
+    """
+    sub, origins, rows, distances, _ = index.nearest_rows(
+        lat, lon, k=max(k, candidates), modalities=modalities, **filters)
+    lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+    lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+    durations, route_m = router.pairs(lat[origins], lon[origins], sub.lat[rows], sub.lon[rows], profile)
+
+    # Per origin: by duration, unroutable (NaN) last, ties by straight line
+    order = np.lexsort((distances, np.nan_to_num(durations, nan=np.inf), origins))
+    origins = origins[order]
+    ranks = np.arange(len(origins)) - np.searchsorted(origins, origins, side='left')
+    top = ranks < k
+    keep = order[top]
+    return sub, origins[top], rows[keep], durations[keep], route_m[keep], distances[keep], ranks[top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lat', type=float, required=True)
+    parser.add_argument('--lon', type=float, required=True)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--profile', choices=PROFILES, default='driving')
+    parser.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES,
+                        help='straight-line nearest services to route to')
+    parser.add_argument('--modalities', nargs='+', default=None)
+    parser.add_argument('--router', choices=sorted(ROUTERS), default=DEFAULT_ROUTER)
+    parser.add_argument('--cache', default=CACHE_PATH, help="route cache file ('' for none)")
+    args = parser.parse_args()
+
+    metrics = start_run('routing')
+    index = ServiceIndex.from_json()
+    router = Router(args.router, RouteCache(args.cache or None))
+    try:
+        with metrics.timer('nearest_by_time', profile=args.profile):
+            found = nearest_by_time(router, index, args.lat, args.lon, args.k, args.profile,
+                                    args.candidates, args.modalities)
+    except RoutingError as e:
+        print(f"❌ {e}")
+        router.close()
+        raise SystemExit(1)
+
+    print(f"🚗 {args.k} nearest services by {args.profile} time from ({args.lat}, {args.lon})")
+    print("=" * 60)
+    for _, row in found.iterrows():
+        print(f"   {row['duration_min']:>6.1f} min {row['route_km']:>7.1f} km  "
+              f"({row['distance_km']:.1f} km direct)  {row['Name']}, {row['Suburb']}")
+    router.cache.print_stats()
+    router.close()
+    metrics.finish(print_table=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Shared schema and compact in-memory form of the service registry
+Low-cardinality text columns (provider and facility type, state, city
+sheet, geocode accuracy and source, the standardized modality strings)
+become categoricals, coordinates are float64 arrays with NaN for missing
+(never object columns of None), and modalities are available as the
+ModalityIndex bitmasks. Code that iterates rows can use Service, a
+__slots__ record, instead of dicts or pandas rows.
+
+Frames that the geocoding pipeline mutates keep plain text columns (new
+accuracy tags and sources are written into them), so load_services() takes
+compact=False for those tools.
+
+Report memory per 100k records with: python schema.py [--records 100000]
+"""
+
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from modality_index import ModalityIndex
+
+DEFAULT_JSON = 'data/all_services_geocoded_complete.json'
+
+# Repeated strings with few distinct values, stored as categoricals
+CATEGORY_COLUMNS = [
+    'Provider Type',
+    'Facility Type',
+    'City_Sheet',
+    'State',
+    'geocode_accuracy',
+    'geocode_source',
+    'group_services_standardized',
+    'individual_services_standardized',
+    'associated_services_standardized'
+]
+COORDINATE_COLUMNS = ['latitude', 'longitude']
+
+# Service attribute -> registry column
+SERVICE_FIELDS = {
+    'name': 'Name',
+    'organization': 'Organization',
+    'provider_type': 'Provider Type',
+    'facility_type': 'Facility Type',
+    'address': 'Address',
+    'suburb': 'Suburb',
+    'postcode': 'Postcode',
+    'phone': 'Phone',
+    'website': 'Website',
+    'group_services': 'group_services_standardized',
+    'individual_services': 'individual_services_standardized',
+    'associated_services': 'associated_services_standardized',
+    'notes': 'Verification Notes (as of Oct 2025)',
+    'city_sheet': 'City_Sheet',
+    'state': 'State',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'geocode_accuracy': 'geocode_accuracy',
+    'geocode_source': 'geocode_source',
+    'geocode_display_name': 'geocode_display_name'
+}
+
+
+class Service:
+    """
+    One registry row as a slotted record
+    Missing values are None; modalities is the row's modality bitmask as an
+    int (bit i set when it offers ModalityIndex.vocabulary[i]), or 0 when
+    iter_services() was given no index
+    """
+
+    __slots__ = tuple(SERVICE_FIELDS) + ('modalities',)
+
+    def __init__(self, modalities=0, **fields):
+        for name in SERVICE_FIELDS:
+            setattr(self, name, fields.get(name))
+        self.modalities = modalities
+
+    @property
+    def located(self):
+        return self.latitude is not None and self.longitude is not None
+
+    def offers(self, bit):
+        """Whether vocabulary bit is set in the modality mask"""
+        return bool(self.modalities >> bit & 1)
+
+    def to_dict(self):
+        """The record keyed by registry column names"""
+        return {column: getattr(self, name) for name, column in SERVICE_FIELDS.items()}
+
+    def __repr__(self):
+        return f"Service({self.name!r}, {self.suburb!r}, {self.state!r})"
+
+
+def coordinates(values):
+    """Float64 coordinates, NaN where missing or not numeric"""
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').astype(np.float64).to_numpy()
+
+
+def compact_frame(df):
+    """Copy of a registry frame with categorical text and float64 coordinates"""
+    df = df.copy()
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    for column in COORDINATE_COLUMNS:
+        if column in df.columns:
+            df[column] = coordinates(df[column])
+    return df
+
+
+def plain_frame(df):
+    """Inverse of compact_frame(): categoricals back to text columns"""
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(df[column].cat.categories.dtype)
+    return df
+
+
+def load_services(path=DEFAULT_JSON, compact=True):
+    """The geocoded registry JSON; compact=False keeps text columns mutable"""
+    df = pd.read_json(path)
+    if compact:
+        return compact_frame(df)
+    for column in COORDINATE_COLUMNS:
+        if column in df.columns:
+            df[column] = coordinates(df[column])
+    return df
+
+
+def iter_services(df, modality_index=None):
+    """
+    Service records for the rows of a registry frame, in order
+    modality_index (built from the same rows) fills in the bitmasks
+    """
+    columns = []
+    for column in SERVICE_FIELDS.values():
+        if column in df.columns:
+            # Equal values share one object; code -1 (missing) picks the None
+            codes, uniques = pd.factorize(df[column])
+            columns.append(np.append(np.asarray(uniques, dtype=object), None)[codes])
+        else:
+            columns.append([None] * len(df))
+
+    masks = [0] * len(df)
+    if modality_index is not None:
+        words = np.ascontiguousarray(modality_index.masks, dtype='<u4')
+        masks = [int.from_bytes(row.tobytes(), 'little') for row in words]
+
+    names = tuple(SERVICE_FIELDS)
+    for values, mask in zip(zip(*columns), masks):
+        service = Service.__new__(Service)
+        for name, value in zip(names, values):
+            setattr(service, name, value)
+        service.modalities = mask
+        yield service
+
+
+def frame_bytes(df):
+    """Deep memory use of a frame"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _traced_bytes(build):
+    """Python heap allocated by build() and still held by its result"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def memory_report(df, records=100_000):
+    """
+    Memory for `records` rows in each representation; returns [(label, bytes)]
+    The registry is repeated to that length, with a per-record suffix on the
+    free-text columns so only the low-cardinality columns repeat, as they
+    would in a real registry of that size
+    """
+    rows = df.iloc[np.resize(np.arange(len(df)), records)].reset_index(drop=True)
+    suffix = pd.Series(np.arange(records)).astype(str).radd(' #')
+    for column in rows.columns:
+        if column not in CATEGORY_COLUMNS and pd.api.types.is_string_dtype(rows[column]):
+            rows[column] = (rows[column] + suffix).where(rows[column].notna())
+    legacy = rows.astype(object)
+    for column in COORDINATE_COLUMNS:
+        if column in legacy.columns:
+            legacy[column] = legacy[column].where(rows[column].notna(), None)
+    compact = compact_frame(rows)
+    modalities = ModalityIndex.build(compact)
+
+    report = [
+        ('object columns (None coordinates)', frame_bytes(legacy)),
+        ('pandas text columns', frame_bytes(rows)),
+        ('compact frame', frame_bytes(compact)),
+        ('  + modality bitmasks', frame_bytes(compact) + modalities.masks.nbytes)
+    ]
+    dict_bytes, _ = _traced_bytes(lambda: compact.astype(object).where(compact.notna(), None).to_dict('records'))
+    service_bytes, _ = _traced_bytes(lambda: list(iter_services(compact, modalities)))
+    report.append(('row dicts', dict_bytes))
+    report.append(('Service records', service_bytes))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', default=DEFAULT_JSON)
+    parser.add_argument('--records', type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = load_services(args.json, compact=False)
+    print(f"🧱 Registry memory for {args.records:,} records (from {len(df)} registry rows)")
+    print("=" * 60)
+    baseline = None
+    for label, size in memory_report(df, args.records):
+        if label == 'row dicts':
+            print("-" * 60)
+            baseline = None
+        baseline = baseline or size
+        print(f"   {label:<36} {size / 2 ** 20:>8.1f} MB {size / baseline:>7.0%}")
+
+    compact = compact_frame(df)
+    services = list(iter_services(compact, ModalityIndex.build(compact)))
+    print(f"\n   e.g. {services[0]!r}: {bin(services[0].modalities).count('1')} modalities")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Fuzzy full-text search over service names, organizations, places and notes
+Builds a word-level inverted index (term -> services, with a field weight
+per posting) plus a trigram index over the vocabulary, so queries tolerate
+typos and partially typed words without scanning every row. Each query word
+is expanded to the indexed terms whose trigrams overlap it most, and
+services are ranked by field weight x idf x similarity, favouring services
+that match every query word.
+
+The index is exported as one compact JSON file next to the web payload
+(data/web/search_index.json) and loaded from the same file by the Python
+query API:
+
+    index = SearchIndex.load()
+    index.search('onclogy adelade', limit=5)   # -> frame of id, score
+
+Ids are service ids of the web payload (row positions in the geocoded JSON).
+
+Latency grows with the postings a query touches, not with the registry as
+such: queries over the 185-service registry take 0.2-0.4 ms, and so do
+queries on rare words over 200k synthetic services. Words found in a large
+share of services cost more, since every matching posting is scored. On
+200k synthetic services, "king" (in ~20% of them) takes about 0.5-1 ms and
+"king wiliam" 3-5 ms.
+"""
+
+import argparse
+import json
+import re
+import time
+import unicodedata
+import numpy as np
+import pandas as pd
+from schema import load_services
+
+SEARCH_INDEX_PATH = 'data/web/search_index.json'
+GEOCODED_JSON = 'data/all_services_geocoded_complete.json'
+
+# Searchable columns and the weight of a match in each
+SEARCH_FIELDS = {
+    'Name': 4,
+    'Organization': 3,
+    'Suburb': 2,
+    'Postcode': 2,
+    'Address': 1,
+    'Verification Notes (as of Oct 2025)': 1
+}
+
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has in is it of on or that the to was were with'.split())
+
+MIN_SIMILARITY = 0.3  # trigram Jaccard similarity for a fuzzy term match
+PREFIX_SIMILARITY = 0.8  # similarity given to terms the last query word is a prefix of
+MAX_EXPANSIONS = 16  # indexed terms considered per query word
+# Postings are merged in dense per-service arrays once a query touches more
+# than 1/DENSE_FRACTION of the services (cheaper than sorting them)
+DENSE_FRACTION = 16
+COMMON_SHARE = 0.5  # share of services above which a query word is skipped
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def _text(value):
+    if pd.isna(value):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def normalize(text):
+    """Lowercase and strip accents, so 'Café' matches 'cafe'"""
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def tokenize(text):
+    """Words of a query or field value (stop words are kept; see search())"""
+    return _WORD.findall(normalize(_text(text)))
+
+
+def trigrams(term):
+    """Trigrams of a word padded with spaces (' on', 'onc', ..., 'gy ')"""
+    padded = f' {term} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class SearchIndexBuilder:
+    """
+    Accumulates postings chunk by chunk; row i of the registry is service id i
+    Each chunk's postings are kept as compact arrays (int32 codes into a
+    shared term vocabulary, doc ids, int8 weights), so a streamed export
+    holds the index's postings but not the chunks' text.
+    The index still grows with the registry: it is the one part of a
+    --stream run whose memory is not bounded by the chunk size.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = dict(fields or SEARCH_FIELDS)
+        self.count = 0
+        self.vocabulary = {}
+        self.parts = []
+
+    def _codes(self, terms):
+        """Vocabulary codes for an array of terms, adding new terms"""
+        unique, inverse = np.unique(terms, return_inverse=True)
+        codes = np.array([self.vocabulary.setdefault(term, len(self.vocabulary)) for term in unique],
+                         dtype=np.int32)
+        return codes[inverse]
+
+    def add(self, df):
+        frames = []
+        for column, weight in self.fields.items():
+            if column not in df.columns:
+                continue
+            words = (df[column].astype(object).map(_text).str.normalize('NFKD')
+                     .str.encode('ascii', 'ignore').str.decode('ascii').str.lower()
+                     .str.findall(_WORD.pattern))
+            words = words.set_axis(np.arange(self.count, self.count + len(df))).explode().dropna()
+            frames.append(pd.DataFrame({'term': words.to_numpy(dtype=object),
+                                        'doc': words.index.to_numpy(dtype=np.int64),
+                                        'weight': weight}))
+        if frames:
+            postings = pd.concat(frames, ignore_index=True)
+            postings = postings[~postings['term'].isin(STOP_WORDS)]
+            # A term found in several fields of a service keeps its best weight
+            postings = postings.groupby(['term', 'doc'], as_index=False)['weight'].max()
+            self.parts.append((self._codes(postings['term'].to_numpy(dtype=object)),
+                               postings['doc'].to_numpy(dtype=np.int64),
+                               postings['weight'].to_numpy(dtype=np.int8)))
+        self.count += len(df)
+
+    def build(self):
+        # Chunks cover disjoint services, so their postings never collide
+        parts = self.parts or [(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64),
+                                np.zeros(0, dtype=np.int8))]
+        codes, docs, weights = (np.concatenate(arrays) for arrays in zip(*parts))
+        terms = sorted(self.vocabulary)
+        rank = np.zeros(len(self.vocabulary), dtype=np.int32)
+        rank[[self.vocabulary[term] for term in terms]] = np.arange(len(terms), dtype=np.int32)
+        codes = rank[codes]
+        order = np.lexsort((docs, codes))
+        offsets = np.append(0, np.cumsum(np.bincount(codes, minlength=len(terms)))).astype(np.int64)
+        return SearchIndex(terms, offsets, docs[order], weights[order].astype(np.int64),
+                           self.count, self.fields)
+
+
+class SearchIndex:
+    """
+    Inverted index in CSR form: the postings of terms[t] are
+    docs[offsets[t]:offsets[t + 1]] with matching weights
+    """
+
+    def __init__(self, terms, offsets, docs, weights, count, fields=None):
+        self.terms = list(terms)
+        self.positions = {term: i for i, term in enumerate(self.terms)}
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.docs = np.asarray(docs, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.count = count
+        self.fields = dict(fields or SEARCH_FIELDS)
+        document_frequency = np.diff(self.offsets)
+        self.idf = np.log1p(count / np.maximum(document_frequency, 1))
+
+        # Trigram -> terms, also in CSR form
+        grams = {}
+        self.term_grams = np.zeros(len(self.terms), dtype=np.int64)
+        for t, term in enumerate(self.terms):
+            term_grams = set(trigrams(term))
+            self.term_grams[t] = len(term_grams)
+            for gram in term_grams:
+                grams.setdefault(gram, []).append(t)
+        self.gram_ids = {gram: i for i, gram in enumerate(grams)}
+        lists = list(grams.values())
+        self.gram_offsets = np.cumsum([0] + [len(terms) for terms in lists]).astype(np.int64)
+        self.gram_terms = (np.concatenate([np.asarray(terms, dtype=np.int64) for terms in lists])
+                           if lists else np.zeros(0, dtype=np.int64))
+
+    @classmethod
+    def build(cls, df, fields=None):
+        builder = SearchIndexBuilder(fields)
+        builder.add(df.reset_index(drop=True))
+        return builder.build()
+
+    def __len__(self):
+        return self.count
+
+    def _gram_terms(self, grams):
+        ids = [self.gram_ids[gram] for gram in grams if gram in self.gram_ids]
+        if not ids:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.gram_terms[self.gram_offsets[i]:self.gram_offsets[i + 1]]
+                               for i in ids])
+
+    def expand(self, word, prefix=False):
+        """
+        Indexed terms similar to a query word, as (term ids, similarities)
+        With prefix=True, terms that start with the word (a partly typed
+        last word) also match
+        """
+        grams = list(dict.fromkeys(trigrams(word)))
+        candidates, shared = np.unique(self._gram_terms(grams), return_counts=True)
+        similarity = shared / (len(grams) + self.term_grams[candidates] - shared)
+        if prefix and len(word) >= 2:
+            # Terms sharing every trigram of ' word' (all but the last padded
+            # one, so anchored at the start) continue the word
+            leading, counts = np.unique(self._gram_terms(grams[:-1]), return_counts=True)
+            continues = np.isin(candidates, leading[counts == len(grams) - 1])
+            similarity[continues] = np.maximum(similarity[continues], PREFIX_SIMILARITY)
+        keep = similarity >= MIN_SIMILARITY
+        candidates, similarity = candidates[keep], similarity[keep]
+        if len(candidates) > MAX_EXPANSIONS:
+            # Most similar first, shorter terms breaking ties
+            top = np.lexsort((self.term_grams[candidates], -similarity))[:MAX_EXPANSIONS]
+            candidates, similarity = candidates[top], similarity[top]
+        return candidates, similarity
+
+    def search(self, query, limit=10):
+        """
+        Ranked services for a free-text query, best first
+        Returns a frame of id and score; services matching every query word
+        rank above those matching only some
+        """
+        words = tokenize(query)
+        words = [w for w in words if w not in STOP_WORDS] or words
+        expanded = [self.expand(word, prefix=n == len(words) - 1) for n, word in enumerate(words)]
+        # Words found in most services barely change the ranking but cost the
+        # most to score, so they only count when nothing else matched
+        common = [sum(self.offsets[t + 1] - self.offsets[t] for t in term_ids) > self.count * COMMON_SHARE
+                  for term_ids, _ in expanded]
+        if not all(common):
+            expanded = [e for e, is_common in zip(expanded, common) if not is_common]
+        docs = []
+        scores = []
+        for term_ids, similarity in expanded:
+            if not len(term_ids):
+                continue
+            slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+            term_scores = self.idf[term_ids] * similarity
+            if len(term_ids) == 1:
+                word_docs = self.docs[slices[0]]
+                word_scores = self.weights[slices[0]] * term_scores[0]
+            elif sum(s.stop - s.start for s in slices) > self.count // DENSE_FRACTION:
+                # Common terms: keep the best term per service in a dense array
+                best = np.zeros(self.count)
+                for s, term_score in zip(slices, term_scores):
+                    d = self.docs[s]
+                    best[d] = np.maximum(best[d], self.weights[s] * term_score)
+                word_docs = np.flatnonzero(best)
+                word_scores = best[word_docs]
+            else:
+                word_docs = np.concatenate([self.docs[s] for s in slices])
+                word_scores = np.concatenate([self.weights[s] * term_score
+                                              for s, term_score in zip(slices, term_scores)])
+                # Best matching term per service for this word
+                order = np.lexsort((-word_scores, word_docs))
+                word_docs, first = np.unique(word_docs[order], return_index=True)
+                word_scores = word_scores[order][first]
+            docs.append(word_docs)
+            scores.append(word_scores)
+
+        if not docs:
+            return pd.DataFrame({'id': np.zeros(0, dtype=np.int64), 'score': np.zeros(0)})
+        if len(docs) == 1:
+            ids, total, matched = docs[0], scores[0], np.ones(len(docs[0]))
+        elif sum(len(d) for d in docs) > self.count // DENSE_FRACTION:
+            total = sum(np.bincount(d, weights=s, minlength=self.count) for d, s in zip(docs, scores))
+            matched = sum(np.bincount(d, minlength=self.count) for d in docs)
+            ids = np.flatnonzero(matched)
+            total, matched = total[ids], matched[ids]
+        else:
+            ids, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+            total = np.bincount(inverse, weights=np.concatenate(scores))
+            matched = np.bincount(inverse)
+        score = total * (matched / len(expanded)) ** 2
+        if len(ids) > limit:
+            top = np.argpartition(-score, limit - 1)[:limit]
+            ids, score = ids[top], score[top]
+        order = np.lexsort((ids, -score))
+        return pd.DataFrame({'id': ids[order], 'score': score[order]})
+
+    def to_json_bytes(self):
+        """
+        Compact JSON for the static site: terms, CSR offsets, doc ids
+        delta-encoded within each term, and posting weights
+        """
+        deltas = np.diff(self.docs, prepend=0)
+        starts = self.offsets[:-1][np.diff(self.offsets) > 0]
+        deltas[starts] = self.docs[starts]
+        payload = {
+            'count': self.count,
+            'fields': self.fields,
+            'terms': self.terms,
+            'offsets': self.offsets.tolist(),
+            'docs': deltas.tolist(),
+            'weights': self.weights.astype(np.int64).tolist()
+        }
+        return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    @classmethod
+    def load(cls, path=SEARCH_INDEX_PATH):
+        with open(path, encoding='utf-8') as f:
+            payload = json.load(f)
+        offsets = np.asarray(payload['offsets'], dtype=np.int64)
+        # Undo the per-term delta encoding: a running sum, less the sum
+        # reached before each term's first posting
+        running = np.cumsum(np.asarray(payload['docs'], dtype=np.int64))
+        before = np.concatenate([[0], running])[offsets[:-1]]
+        docs = running - np.repeat(before, np.diff(offsets))
+        return cls(payload['terms'], offsets, docs, payload['weights'],
+                   payload['count'], payload['fields'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('query', nargs='*', default=['wellnes', 'centre', 'adelade'])
+    parser.add_argument('--limit', type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = SearchIndex.load()
+    loaded = time.perf_counter() - start
+    print(f"🔎 Search index: {len(index.terms):,} terms over {len(index)} services "
+          f"(loaded in {loaded * 1000:.1f} ms)")
+
+    query = ' '.join(args.query)
+    start = time.perf_counter()
+    result = index.search(query, limit=args.limit)
+    elapsed = time.perf_counter() - start
+    names = load_services(GEOCODED_JSON)['Name']
+    print(f"\n'{query}' ({elapsed * 1000:.2f} ms):")
+    for service_id, score in zip(result['id'], result['score']):
+        print(f"   {score:6.2f}  {names.iat[service_id]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Spatial index and nearest-services queries over the geocoded registry
+Backs the "find nearest services within radius / sort by distance" features
+planned for lib/distance.ts with a k-d tree over unit-sphere vectors, so
+batches of origin points are answered in one vectorized call
+"""
+
+from collections import OrderedDict
+import numpy as np
+from scipy.spatial import cKDTree
+from modality_index import ModalityIndex
+from schema import DEFAULT_JSON, load_services
+
+EARTH_RADIUS_KM = 6371.0088
+# Filtered sub-indexes kept per index, least recently used dropped first
+MAX_SUBINDEXES = 64
+
+# Keyword filters accepted by the query methods, mapped to dataset columns
+FILTER_COLUMNS = {
+    'provider_type': 'Provider Type',
+    'facility_type': 'Facility Type',
+    'state': 'State',
+    'city_sheet': 'City_Sheet'
+}
+
+
+def to_unit_vectors(lat, lon):
+    """Convert degrees latitude/longitude to 3D unit vectors"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in kilometres"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64))
+                              for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def chord_to_km(chord):
+    """Convert unit-sphere chord length to great-circle kilometres"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def km_to_chord(km):
+    """Convert great-circle kilometres to unit-sphere chord length"""
+    return 2 * np.sin(np.minimum(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def _freeze(value):
+    """Hashable form of a filter value, for memoizing sub-indexes"""
+    if value is None or isinstance(value, str):
+        return value
+    return tuple(sorted(value))
+
+
+class ServiceIndex:
+    """
+    Spatial index over geocoded services
+    Rows without coordinates are dropped. Filtered queries build (and memoize,
+    up to MAX_SUBINDEXES) a sub-index over the matching rows, so repeated
+    filters stay fast.
+    """
+
+    def __init__(self, df):
+        df = df[df['latitude'].notna() & df['longitude'].notna()]
+        self.df = df.reset_index(drop=True)
+        self.lat = self.df['latitude'].to_numpy(dtype=np.float64)
+        self.lon = self.df['longitude'].to_numpy(dtype=np.float64)
+        self.tree = cKDTree(to_unit_vectors(self.lat, self.lon))
+        self._modalities = None
+        self._subindexes = OrderedDict()
+
+    @classmethod
+    def from_json(cls, path=DEFAULT_JSON):
+        """Build an index from the geocoded JSON export"""
+        return cls(load_services(path))
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def modalities(self):
+        """Modality bitmask index, built on first use"""
+        if self._modalities is None:
+            self._modalities = ModalityIndex.build(self.df)
+        return self._modalities
+
+    def filter_mask(self, modalities=None, **filters):
+        """
+        Boolean mask of services matching the filters
+        Column filters take a value or list of values; modalities lists
+        standardized terms that must all be offered (bare terms match any
+        modality column, 'group:yoga' style terms only that column)
+        """
+        mask = np.ones(len(self.df), dtype=bool)
+        for key, value in filters.items():
+            if value is None:
+                continue
+            if key not in FILTER_COLUMNS:
+                raise ValueError(f"Unknown filter '{key}' (expected one of {sorted(FILTER_COLUMNS)})")
+            values = [value] if isinstance(value, str) else list(value)
+            mask &= self.df[FILTER_COLUMNS[key]].isin(values).to_numpy()
+        if modalities:
+            if isinstance(modalities, str):
+                modalities = [modalities]
+            mask &= self.modalities.match_all(modalities)
+        return mask
+
+    def subset(self, modalities=None, **filters):
+        """Return the (memoized) index over services matching the filters"""
+        if not modalities and all(v is None for v in filters.values()):
+            return self
+        key = (_freeze(modalities), tuple(sorted((k, _freeze(v)) for k, v in filters.items())))
+        if key in self._subindexes:
+            self._subindexes.move_to_end(key)
+        else:
+            positions = np.flatnonzero(self.filter_mask(modalities=modalities, **filters))
+            sub = ServiceIndex.__new__(ServiceIndex)
+            sub.df = self.df.iloc[positions].reset_index(drop=True)
+            sub.lat = self.lat[positions]
+            sub.lon = self.lon[positions]
+            sub.tree = cKDTree(to_unit_vectors(sub.lat, sub.lon)) if len(positions) else None
+            sub._modalities = None
+            sub._subindexes = OrderedDict()
+            self._subindexes[key] = sub
+            if len(self._subindexes) > MAX_SUBINDEXES:
+                self._subindexes.popitem(last=False)
+        return self._subindexes[key]
+
+    def _results(self, index, origins, service_rows, distances, ranks):
+        """Assemble a long-format result frame"""
+        result = index.df.iloc[service_rows].reset_index(drop=True)
+        result.insert(0, 'origin', origins)
+        result.insert(1, 'rank', ranks)
+        result.insert(2, 'distance_km', distances)
+        return result
+
+    def nearest(self, lat, lon, k=5, modalities=None, **filters):
+        """
+        k nearest services to one or many origin points
+        lat/lon may be scalars or arrays. Returns one row per (origin, match)
+        with origin position, rank (0 = nearest) and distance_km.
+        """
+        return self._results(*self.nearest_rows(lat, lon, k, modalities=modalities, **filters))
+
+    def nearest_rows(self, lat, lon, k=5, modalities=None, **filters):
+        """
+        nearest() as arrays, without building the result frame
+        Returns (index, origins, rows, distances_km, ranks), where rows are
+        positions in index.df
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        index = self.subset(modalities=modalities, **filters)
+        if index.tree is None or len(index) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return index, empty, empty, np.zeros(0), empty
+
+        k = min(k, len(index))
+        chords, rows = index.tree.query(to_unit_vectors(lat, lon), k=k)
+        chords = chords.reshape(len(lat), k)
+        rows = rows.reshape(len(lat), k)
+
+        origins = np.repeat(np.arange(len(lat)), k)
+        ranks = np.tile(np.arange(k), len(lat))
+        return index, origins, rows.ravel(), chord_to_km(chords.ravel()), ranks
+
+    def within_radius(self, lat, lon, radius_km, modalities=None, **filters):
+        """
+        All services within radius_km of one or many origin points
+        Results are sorted by origin, then by distance.
+        """
+        return self._results(*self.within_radius_rows(lat, lon, radius_km,
+                                                      modalities=modalities, **filters))
+
+    def within_radius_rows(self, lat, lon, radius_km, modalities=None, **filters):
+        """within_radius() as arrays, like nearest_rows()"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        index = self.subset(modalities=modalities, **filters)
+        if index.tree is None or len(index) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return index, empty, empty, np.zeros(0), empty
+
+        matches = index.tree.query_ball_point(to_unit_vectors(lat, lon), km_to_chord(radius_km))
+        counts = np.fromiter((len(m) for m in matches), dtype=np.int64, count=len(matches))
+        origins = np.repeat(np.arange(len(lat)), counts)
+        rows = (np.concatenate([np.asarray(m, dtype=np.int64) for m in matches])
+                if counts.sum() else np.empty(0, dtype=np.int64))
+        distances = haversine_km(lat[origins], lon[origins], index.lat[rows], index.lon[rows])
+
+        order = np.lexsort((distances, origins))
+        origins, rows, distances = origins[order], rows[order], distances[order]
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        ranks = np.arange(len(rows)) - np.repeat(starts, counts)
+        return index, origins, rows, distances, ranks
+
+
+def main():
+    index = ServiceIndex.from_json()
+    print(f"🗺️  Indexed {len(index)} geocoded services")
+
+    # Example: three nearest support groups to Melbourne CBD
+    result = index.nearest(-37.8136, 144.9631, k=3, modalities=['support_group'])
+    print("\nNearest support groups to Melbourne CBD:")
+    for _, row in result.iterrows():
+        print(f"   {row['distance_km']:6.1f} km  {row['Name']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Compact web payload export for the service map
+Writes a slim columnar map index (ids, coordinates, category codes and
+modality bitmasks) for first paint, and the full records as small detail
+shards fetched lazily when a service is opened. Every file is also written
+pre-compressed (gzip, plus brotli when available) and the byte savings
+against the indent=2 record JSON are reported. Precomputed marker cluster
+tiles (map_clusters.py) and the search index (search_index.py) are written
+next to them.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from map_clusters import write_cluster_tiles
+from modality_index import ModalityIndex, previous_vocabulary
+from schema import load_services
+from search_index import SearchIndexBuilder
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WEB_DIR = 'data/web'
+SOURCE_JSON = 'data/all_services_geocoded_complete.json'
+DETAIL_SHARD_SIZE = 50
+# Brotli 11 is ~100x slower than 5 for ~15% smaller output: worth it for the
+# few large files, not for the thousands of small detail shards of a big registry
+BROTLI_QUALITY = 11
+SHARD_BROTLI_QUALITY = 5
+COORD_DECIMALS = 5  # ~1 m, plenty for map markers
+
+# Low-cardinality columns sent as small integer codes plus a lookup table
+# (code -1 means the value is missing)
+CATEGORY_COLUMNS = {
+    'provider_type': 'Provider Type',
+    'facility_type': 'Facility Type',
+    'state': 'State',
+    'city': 'City_Sheet',
+    'accuracy': 'geocode_accuracy'
+}
+
+
+def _json_bytes(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _records(df):
+    """Records with NaN replaced by None so the output is valid JSON"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def write_payload(path, payload, brotli_quality=BROTLI_QUALITY):
+    """Write raw, .gz and (if available) .br versions; return their sizes"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sizes = {}
+    with open(path, 'wb') as f:
+        f.write(payload)
+    sizes['raw'] = len(payload)
+
+    compressed = gzip.compress(payload, compresslevel=9, mtime=0)
+    with open(path + '.gz', 'wb') as f:
+        f.write(compressed)
+    sizes['gzip'] = len(compressed)
+
+    if brotli is not None:
+        compressed = brotli.compress(payload, quality=brotli_quality)
+        with open(path + '.br', 'wb') as f:
+            f.write(compressed)
+        sizes['brotli'] = len(compressed)
+    return sizes
+
+
+def _json_array(values, block=65536):
+    """JSON array text for a long sequence, serialized in blocks (NaN becomes null)"""
+    parts = []
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        chunk = chunk.tolist() if hasattr(chunk, 'tolist') else list(chunk)
+        chunk = [None if isinstance(v, float) and v != v else v for v in chunk]
+        parts.append(json.dumps(chunk, separators=(',', ':'), ensure_ascii=False)[1:-1])
+    return '[' + ','.join(parts) + ']'
+
+
+class MapIndexBuilder:
+    """
+    Columnar first-paint payload, accumulated chunk by chunk
+    Only compact per-row arrays are kept (coordinates, category codes), so
+    a registry can be streamed through it; row i of every array is service
+    id i
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.lat = []
+        self.lon = []
+        self.categories = {}  # key -> (value -> provisional code, [code arrays])
+
+    def add(self, df):
+        coords_known = (df['latitude'].notna() & df['longitude'].notna()).to_numpy()
+        for name, target in (('latitude', self.lat), ('longitude', self.lon)):
+            values = pd.to_numeric(df[name], errors='coerce').round(COORD_DECIMALS).to_numpy(dtype=float)
+            target.append(np.where(coords_known, values, np.nan))
+
+        for key, column in CATEGORY_COLUMNS.items():
+            if column not in df.columns:
+                continue
+            if key not in self.categories:
+                # Rows from earlier chunks without this column count as missing
+                self.categories[key] = ({}, [np.full(self.count, -1, dtype=np.int64)])
+            seen, codes = self.categories[key]
+            chunk_codes, uniques = pd.factorize(df[column])
+            provisional = np.array([seen.setdefault(value, len(seen)) for value in uniques] + [-1],
+                                   dtype=np.int64)
+            codes.append(provisional[chunk_codes])
+        self.count += len(df)
+
+    def coordinates(self):
+        """(lat, lon) arrays indexed by service id (NaN where not geocoded)"""
+        return (np.concatenate(self.lat) if self.lat else np.zeros(0),
+                np.concatenate(self.lon) if self.lon else np.zeros(0))
+
+    def to_json_bytes(self, modality_index):
+        """Same JSON as serializing the payload dict, without per-row Python lists"""
+        lat, lon = self.coordinates()
+        categories = []
+        for key, (seen, codes) in self.categories.items():
+            # Recode so values are sorted, like pd.factorize(sort=True)
+            rank, values = pd.factorize(pd.Index(list(seen), dtype=object), sort=True)
+            rank = np.append(rank, -1)
+            codes = np.concatenate(codes)
+            codes = rank[codes] if len(codes) else codes
+            categories.append(f'{json.dumps(key)}:{{"values":{_json_array(list(values))},'
+                              f'"codes":{_json_array(codes)}}}')
+        masks = modality_index.masks
+        text = (f'{{"count":{self.count},"id":{_json_array(range(self.count))},'
+                f'"lat":{_json_array(lat)},"lon":{_json_array(lon)},'
+                f'"categories":{{{",".join(categories)}}},'
+                f'"modalities":{{"vocabulary":{_json_array(modality_index.vocabulary)},'
+                f'"words_per_service":{masks.shape[1]},"masks":{_json_array(masks.ravel())}}},'
+                f'"detail_shard_size":{DETAIL_SHARD_SIZE}}}')
+        return text.encode('utf-8')
+
+
+class DetailShardWriter:
+    """Writes details/<shard>.json (+ compressed copies) as records arrive"""
+
+    def __init__(self, web_dir=WEB_DIR):
+        self.details_dir = os.path.join(web_dir, 'details')
+        if os.path.isdir(self.details_dir):
+            shutil.rmtree(self.details_dir)  # drop shards left over from a larger registry
+        self.sizes = {'raw': 0, 'gzip': 0, 'brotli': 0, 'files': 0}
+        self.next_id = 0
+        self.pending = []
+
+    def _write(self, records):
+        start = self.next_id
+        shard = [dict(id=start + i, **record) for i, record in enumerate(records)]
+        sizes = write_payload(
+            os.path.join(self.details_dir, f'{start // DETAIL_SHARD_SIZE}.json'), _json_bytes(shard),
+            brotli_quality=SHARD_BROTLI_QUALITY)
+        for key, size in sizes.items():
+            self.sizes[key] += size
+        self.sizes['files'] += 1
+        self.next_id += len(records)
+
+    def add(self, df):
+        self.pending.extend(_records(df))
+        while len(self.pending) >= DETAIL_SHARD_SIZE:
+            self._write(self.pending[:DETAIL_SHARD_SIZE])
+            del self.pending[:DETAIL_SHARD_SIZE]
+
+    def close(self):
+        if self.pending:
+            self._write(self.pending)
+            self.pending = []
+        sizes = dict(self.sizes)
+        if brotli is None:
+            del sizes['brotli']
+        return sizes
+
+
+class WebPayloadStream:
+    """Map index + detail shards for a registry fed in chunks"""
+
+    def __init__(self, web_dir=WEB_DIR):
+        self.web_dir = web_dir
+        self.map_index = MapIndexBuilder()
+        self.details = DetailShardWriter(web_dir)
+        self.search = SearchIndexBuilder()
+
+    def add(self, df):
+        self.map_index.add(df)
+        self.details.add(df)
+        self.search.add(df)
+
+    def close(self, modality_index, baseline_path=None):
+        """Write map_index.json, the last shard, cluster tiles and search index; returns the size report"""
+        report = {'map_index': write_payload(
+            os.path.join(self.web_dir, 'map_index.json'),
+            self.map_index.to_json_bytes(modality_index)
+        )}
+        report['details'] = self.details.close()
+        report['clusters'] = write_cluster_tiles(*self.map_index.coordinates(), self.web_dir)
+        report['search'] = write_payload(os.path.join(self.web_dir, 'search_index.json'),
+                                         self.search.build().to_json_bytes())
+        if baseline_path and os.path.exists(baseline_path):
+            report['baseline'] = os.path.getsize(baseline_path)
+        return report
+
+
+def export_web_payload(df, web_dir=WEB_DIR, modality_index=None, baseline_path=SOURCE_JSON):
+    """
+    Write map_index.json and details/<shard>.json (+ compressed copies)
+    Service ids are row positions in df; the detail record for id i is in
+    shard i // DETAIL_SHARD_SIZE. Returns a size report dict.
+    """
+    df = df.reset_index(drop=True)
+    if modality_index is None:
+        modality_index = ModalityIndex.build(df, vocabulary=previous_vocabulary())
+    stream = WebPayloadStream(web_dir)
+    stream.add(df)
+    return stream.close(modality_index, baseline_path)
+
+
+def print_report(report):
+    """Print byte sizes and savings relative to the record JSON"""
+    index = report['map_index']
+    baseline = report.get('baseline')
+    print(f"   ✓ Map index: {index['raw']:,} B raw, {index['gzip']:,} B gzip"
+          + (f", {index['brotli']:,} B brotli" if 'brotli' in index else ''))
+    details = report['details']
+    print(f"   ✓ Details: {details['files']} shards, {details['raw']:,} B raw, {details['gzip']:,} B gzip")
+    clusters = report.get('clusters')
+    if clusters:
+        print(f"   ✓ Clusters: {clusters['tiles']:,} tiles for zooms "
+              f"{min(clusters['tiles_per_zoom'])}-{max(clusters['tiles_per_zoom'])}, {clusters['raw']:,} B")
+    search = report.get('search')
+    if search:
+        print(f"   ✓ Search index: {search['raw']:,} B raw, {search['gzip']:,} B gzip")
+    if baseline:
+        smallest = min(v for k, v in index.items() if k != 'raw')
+        print(f"   First paint: {smallest:,} B vs {baseline:,} B record JSON "
+              f"({(1 - smallest / baseline) * 100:.1f}% smaller)")
+
+
+def main():
+    print("📦 Exporting web payload")
+    df = load_services(SOURCE_JSON)
+    print_report(export_web_payload(df))
+
+
+if __name__ == '__main__':
+    main()